@@ -26,6 +26,16 @@ class AudioManager:
         self._set_volume(new_volume)
         return new_volume
 
+    def preset_after(self, steps):
+        """Returns the preset `steps` presets above (or below, if negative) the current one, without wrapping."""
+        idx = max(0, min(len(self.volume_presets) - 1, self.current_preset_idx + steps))
+        return self.volume_presets[idx]
+
+    def step_volume(self, steps):
+        """Moves `steps` presets up or down, stopping at the lowest and highest."""
+        self.set_volume_by_value(self.preset_after(steps))
+        return self.current_volume
+
     def get_current_volume(self):
         """Returns the current volume percentage."""
         return self.current_volume
@@ -0,0 +1,232 @@
+# command_dispatcher.py
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+
+import metrics
+import tracer
+
+logger = logging.getLogger(__name__)
+
+COMMAND_LATENCY_SECONDS = metrics.histogram('pitv_command_latency_seconds', 'Time from a button/web command being queued to its handler finishing.')
+COMMANDS_COALESCED = metrics.counter('pitv_commands_coalesced_total', 'Commands merged into an identical earlier command.')
+
+class CommandDispatcher:
+    """
+    Serializes player commands onto the single thread that runs the dispatcher.
+    Buttons, web requests and VLC events only submit commands; the handlers
+    (and therefore the VLC player and the player globals) are only ever touched
+    from the dispatcher thread.
+
+    Commands registered with a coalesce window run at once; repeats that arrive
+    while the handler runs or within the window after it are merged into one
+    more call, which receives how many it stands for as `count`. A burst thus
+    costs two calls: five fast-forward presses seek once by one step and once
+    by four, landing where five separate seeks would. The trailing wait never
+    runs past the next timer's deadline.
+
+    The dispatcher is also the application's event loop: it blocks until a
+    command arrives or the next scheduled timer is due, so an idle player
+    doesn't wake up at all.
+    """
+    def __init__(self):
+        self.handlers = {} # name -> (handler, coalesce_window or None)
+        self.queue = queue.Queue() # Commands; None is a bare wake-up
+        self.pending = None # Command pulled from the queue while coalescing, runs next
+        self.running = False
+
+        # Periodic timers, kept in a heap ordered by deadline
+        self.timer_lock = threading.Lock()
+        self.timers = [] # (deadline, id, name, interval)
+        self.timer_ids = {} # name -> id of its live heap entry; replaced/cancelled entries are skipped
+        self.timer_counter = itertools.count()
+
+        # Measurements, read by the web server through get_stats()
+        self.stats_lock = threading.Lock()
+        self.commands_run = 0
+        self.commands_coalesced = 0
+        self.max_queue_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        metrics.gauge('pitv_command_queue_depth', 'Commands waiting for the dispatcher.', self.queue.qsize)
+
+    def register(self, name, handler, coalesce_window=None):
+        """
+        Registers a command handler.
+        coalesce_window: None to run every submission, 0 to merge identical commands
+        already queued, or seconds to also wait that long for more of the same.
+        """
+        self.handlers[name] = (handler, coalesce_window)
+
+    def submit(self, name, *args, origin=None):
+        """
+        Queues a command from any thread. Returns immediately.
+        origin: who issued it (e.g. 'button TR short', 'web'); traces the time until the screen answers.
+        """
+        if name not in self.handlers:
+            logger.warning(f"Dispatcher: Unknown command '{name}'")
+            return
+        if origin:
+            tracer.start_interaction(origin, name)
+        self.queue.put((name, args, time.monotonic()))
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            with self.stats_lock:
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def schedule(self, name, interval, delay=None):
+        """
+        Runs the registered command `name` every `interval` seconds on the dispatcher
+        thread, first after `delay` (defaults to `interval`). Replaces an existing timer
+        of the same name.
+        """
+        with self.timer_lock:
+            timer_id = next(self.timer_counter)
+            deadline = time.monotonic() + (interval if delay is None else delay)
+            heapq.heappush(self.timers, (deadline, timer_id, name, interval))
+            self.timer_ids[name] = timer_id
+        # Wake the loop so it recomputes how long it may sleep
+        self.queue.put(None)
+
+    def cancel(self, name):
+        """Stops the timer `name`, if scheduled."""
+        with self.timer_lock:
+            self.timer_ids.pop(name, None)
+
+    def _time_to_next_timer(self):
+        """Returns seconds until the next live timer is due (0 if overdue), or None if there are none."""
+        with self.timer_lock:
+            live = [deadline for deadline, timer_id, name, _ in self.timers if self.timer_ids.get(name) == timer_id]
+        return max(min(live) - time.monotonic(), 0) if live else None
+
+    def _run_due_timers(self):
+        """Runs every due timer. Returns seconds until the next one, or None if there are none."""
+        while True:
+            with self.timer_lock:
+                if not self.timers:
+                    return None
+                deadline, timer_id, name, interval = self.timers[0]
+                if self.timer_ids.get(name) != timer_id:
+                    heapq.heappop(self.timers) # Cancelled or replaced
+                    continue
+                now = time.monotonic()
+                if deadline > now:
+                    return deadline - now
+                heapq.heappop(self.timers)
+                # Next run keeps the cadence, but never tries to catch up on missed runs
+                heapq.heappush(self.timers, (max(deadline + interval, now), timer_id, name, interval))
+            self._execute(self.handlers[name][0], name, ())
+
+    def _execute(self, handler, name, args, **kwargs):
+        tracer.command_started(name)
+        try:
+            with tracer.span(name, 'command'):
+                handler(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Dispatcher: Error running '{name}': {e}")
+        finally:
+            tracer.command_finished(name)
+
+    def _next_command(self, timeout=None):
+        """Returns the next command, or None on timeout or a bare wake-up."""
+        if self.pending is not None:
+            command, self.pending = self.pending, None
+            return command
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _coalesce(self, name, args, window):
+        """Pulls identical commands off the queue. Returns how many were merged."""
+        if self.pending is not None:
+            return 0 # A different command is already next
+        merged = 0
+        deadline = time.monotonic() + window
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    command = self.queue.get(timeout=remaining)
+                else:
+                    command = self.queue.get_nowait()
+            except queue.Empty:
+                return merged
+            if command is None:
+                continue # Bare wake-up; timers are checked after this command
+            if command[0] == name and command[1] == args:
+                merged += 1
+            else:
+                # A different command ends the burst; keep it so order is preserved
+                self.pending = command
+                return merged
+
+    def run_once(self, timeout=None):
+        """Runs a single command (with its coalesced burst). Returns False on timeout or wake-up."""
+        command = self._next_command(timeout)
+        if command is None:
+            return False
+
+        name, args, submitted_at = command
+        handler, window = self.handlers[name]
+        tracer.record_span(f"queued {name}", submitted_at, time.monotonic(), 'dispatcher')
+        if window is None:
+            self._execute(handler, name, args)
+        else:
+            # Leading edge: the first press (and any repeats already queued) runs without waiting
+            count = self._coalesce(name, args, 0) + 1
+            self._execute(handler, name, args, count=count)
+        latency = time.monotonic() - submitted_at
+        COMMAND_LATENCY_SECONDS.observe(latency)
+        with self.stats_lock:
+            self.commands_run += 1
+            self.total_latency += latency
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+
+        if window is not None:
+            # Trailing edge: repeats during the run or the window after it become one more call
+            while True:
+                next_timer = self._time_to_next_timer()
+                merged = self._coalesce(name, args, window if next_timer is None else min(window, next_timer))
+                if not merged:
+                    break
+                count += merged
+                self._execute(handler, name, args, count=merged)
+            if count > 1:
+                logger.debug(f"Dispatcher: Coalesced {count}x '{name}'")
+                with self.stats_lock:
+                    self.commands_coalesced += count - 1
+                COMMANDS_COALESCED.inc(count - 1)
+        return True
+
+    def run_forever(self):
+        """
+        Runs commands and timers on the calling thread until stop() is called,
+        blocking until the next command or timer.
+        """
+        self.running = True
+        while self.running:
+            self.run_once(timeout=self._run_due_timers())
+
+    def stop(self):
+        """Stops run_forever() after the current command."""
+        self.running = False
+        self.queue.put(None) # Wake the loop so it notices
+
+    def get_stats(self):
+        """Returns queue depth and command latency measurements."""
+        with self.stats_lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'commands_run': self.commands_run,
+                'commands_coalesced': self.commands_coalesced,
+                'avg_latency_ms': (self.total_latency / self.commands_run * 1000) if self.commands_run else 0,
+                'max_latency_ms': self.max_latency * 1000,
+                'last_latency_ms': self.last_latency * 1000,
+            }
@@ -24,3 +24,133 @@ LONG_PRESS_THRESHOLD = 2.0
 # Screen Inactivity Timers (seconds)
 SCREEN_DIM_TIMEOUT = 30  # Time before backlight might dim (not directly supported by ST7789, acts as off)
 SCREEN_OFF_TIMEOUT = 60  # Time before screen backlight turns completely off
+AUDIO_ONLY_TIMEOUT = SCREEN_OFF_TIMEOUT  # Time of unattended playback (no button presses or episode changes) before the screen and video decoding turn off (0 = never); video frames keep the backlight on, so this is what turns it off during playback
+
+# Sleep / Wake
+SLEEP_MODE = 'pause'     # 'pause': the episode stays loaded and paused, so waking resumes at once; 'stop': stop VLC (frees its decoder buffers; waking reopens the file)
+WAKE_REINIT_AFTER = None # Re-initialize the panel on wake after this many seconds asleep (None = only after a failed panel write)
+
+# Display SPI Transfers
+SPI_SPEED_HZ = 62_500_000           # Panel SPI clock
+SPI_FAST_TRANSFERS = True           # Push frames with SpiTransferEngine (False = st7789 package's own display())
+SPI_MAX_TRANSFER_BYTES = 128 * 1024 # Upper limit per transfer; the kernel's spidev bufsiz usually limits it first
+# Raise spidev's 4 KB default by adding `spidev.bufsiz=131072` to /boot/cmdline.txt (one transfer per frame)
+SPI_TILE_SIZE = 16                  # Frames are compared with the panel in tiles this size; unchanged frames and tiles aren't sent (0 = always send full frames)
+SPI_PARTIAL_MAX_FRACTION = 0.6      # Send the whole frame once the changed bands cover more than this share of it
+
+# Frame Presenter Process (multi-core Pi 3/4)
+FRAME_PRESENTER_PROCESS = False # VLC decodes into shared memory; a separate process converts and sends frames to the panel
+PRESENTER_RING_SLOTS = 4        # Frames in the shared-memory ring
+PRESENTER_CPU = None            # Pin the presenter to this CPU core (e.g. 3), or None to let the kernel choose
+
+# Web Server Process
+WEB_SERVER_PROCESS = False               # Run the web server in its own process so web traffic can't stall video frames
+WEB_IPC_ADDRESS = '/tmp/pitv-player.sock' # Unix socket the web process uses to reach the player
+WEB_IPC_EVENT_BACKLOG = 50               # Player events (e.g. new episode) kept for the web process
+WEB_PROCESS_NICE = 10                    # CPU niceness of the web process (higher = lower priority)
+WEB_PROCESS_RESTART_DELAY = 5            # Seconds before restarting a web process that exited
+
+# Web Screen Mirror
+MIRROR_MAX_FPS = 5        # Encoding rate for the /mirror stream (only while someone is watching)
+MIRROR_JPEG_QUALITY = 70  # JPEG quality for mirrored frames
+
+# Browser Streaming (on-the-fly HLS remux)
+REMUX_SEGMENT_SECONDS = 6                   # Target HLS segment length
+REMUX_CACHE_MAX_BYTES = 64 * 1024 * 1024    # Size bound for the in-memory segment cache
+REMUX_LAYOUT_CACHE_ENTRIES = 16             # Files whose probe info and segment boundaries are kept
+REMUX_NICE = 19                             # CPU niceness for ffmpeg/ffprobe, so playback keeps priority
+
+# Menu Navigation
+MENU_REPEAT_DELAY = 0.4       # Seconds A (up) or X (down) must be held in the menu before it starts repeating
+MENU_REPEAT_INTERVAL = 0.15   # Seconds between repeats; each one moves the cursor and redraws once
+# (seconds held, items per repeat): single steps, then pages of 7 (the visible rows), then 5 pages
+MENU_SCROLL_ACCELERATION = [(0, 1), (1.5, 7), (3, 35)]
+
+# Library Search (/search)
+SEARCH_MAX_RESULTS = 50   # Most results returned for a query; ?limit= can ask for fewer
+
+# Duplicate Detection (/library/duplicates, /library/dedupe)
+DEDUP_INDEX_PATH = os.path.join(os.path.expanduser('~'), 'media_player_app', 'dedup_index.json')
+DEDUP_SAMPLE_BLOCKS = 8                   # Blocks read from each file for its fingerprint (start, end and evenly between)
+DEDUP_SAMPLE_BLOCK_BYTES = 64 * 1024      # Size of each sampled block
+DEDUP_LINK_UPLOADS = True                 # Store an upload identical to another library file as a hardlink instead of a copy
+DEDUP_FIRST_USE_WAIT = 2.0                # Low-memory mode: seconds a request waits for the first indexing pass before answering without it
+
+# Logging (/logs)
+LOG_LEVEL = 'INFO'              # Lowest level written to the journal; DEBUG adds buttons, navigation, menu and state saves
+LOG_RING_LEVEL = 'DEBUG'        # Lowest level kept in the in-memory ring served at /logs
+LOG_RING_RECORDS = 2000         # Most recent records kept in memory
+LOG_RATE_LIMIT_BURST = 5        # Records allowed from one line of code per interval; the rest are counted, not logged
+LOG_RATE_LIMIT_INTERVAL = 10    # Seconds
+LOG_FLUSH_INTERVAL = 5          # Seconds between batched journal writes
+LOG_BUFFER_RECORDS = 100        # Write sooner once this many records are waiting
+
+# Latency Tracing (/trace)
+TRACE_ENABLED = True          # Record spans for button/web commands, handlers and screen updates
+TRACE_BUFFER_EVENTS = 5000    # Most recent spans kept in memory
+
+# Command Dispatcher
+COMMAND_COALESCE_WINDOW = 0.15  # A seek/navigation command runs at once; repeats within this many seconds after it are merged into one more call (a burst of 5 seeks = 1 step, then 4 steps)
+CLOCK_REFRESH_INTERVAL = 1      # Seconds between playback clock redraws while the info screen is up
+INACTIVITY_CHECK_INTERVAL = 5   # Seconds between screen inactivity (backlight off) checks
+
+# Next-Episode Prefetch
+PREFETCH_DELAY = 10                       # Seconds into an episode before preparing the next one
+PREFETCH_WARM_BYTES = 8 * 1024 * 1024     # Start of the next file to pull into the page cache
+PREFETCH_PARSE_TIMEOUT_MS = 5000          # Limit for pre-parsing the next episode
+
+# Playback Health (automatic decode degradation)
+HEALTH_SAMPLE_INTERVAL = 2        # Seconds between libvlc statistics samples
+HEALTH_WINDOW_SAMPLES = 15        # Samples in the rolling window (30 s at the default interval)
+HEALTH_LOSS_THRESHOLD = 0.10      # Share of lost pictures in the window that triggers the next level
+HEALTH_LIGHT_VARIANT_DIR = 'lite' # Season subfolder holding lighter encodes with the same file names
+# Each level adds to the ones before it
+HEALTH_DEGRADE_LEVELS = [
+    {'name': 'skip loop filter', 'options': ['avcodec-skiploopfilter=4', 'avcodec-fast']},
+    {'name': 'skip frames', 'options': ['avcodec-skip-frame=1', 'avcodec-skip-idct=1', 'avcodec-hurry-up']},
+    {'name': 'light variant', 'light_variant': True},
+]
+
+# VLC Instance & Decoder Profiles
+VLC_ARGS = ["--aout=alsa", "--quiet", "--no-video-title-show", "--no-xlib"]
+# Named sets of libvlc media options. Compare them on your board with:
+#   python3 decode_benchmark.py /path/to/sample.mkv
+DECODE_PROFILES = {
+    'default': [],
+    'threaded': ['avcodec-threads=2'],                           # Pi 3/4: more cores for the decoder
+    'hardware': ['avcodec-hw=any'],                              # Hardware decoding where libvlc supports it
+    'fast': ['avcodec-skiploopfilter=4', 'avcodec-fast', 'avcodec-threads=1'],
+    'drop': ['avcodec-skiploopfilter=4', 'avcodec-hurry-up', 'avcodec-skip-frame=1'],  # Drop frames rather than fall behind
+    'cached': ['file-caching=3000'],                             # Larger read-ahead for slow SD cards
+}
+DECODE_PROFILE = 'default'  # Profile for this device
+# Per-file overrides: (pattern matched against the path relative to MEDIA_ROOT_DIR, profile); first match wins
+DECODE_PROFILE_RULES = [
+    # ('*/HD Show/*', 'drop'),
+]
+
+# State Persistence (write-behind checkpoints)
+STATE_CHECKPOINT_INTERVAL = 15    # Seconds between playback position checkpoints
+STATE_WRITE_DELAY = 0.5           # Seconds to wait after a change so bursts become one write
+STATE_POSITION_EPSILON = 5        # Minimum position change (seconds) worth a write
+STATE_MAX_WRITES_PER_HOUR = 120   # Budget for position-only writes, spaced evenly (120 = one per 30 s; lower = less SD wear, coarser resume)
+
+# Startup Readiness Probes
+STARTUP_SPI_DEVICE = '/dev/spidev0.1'   # Display SPI device (port 0, CS 1)
+STARTUP_PROBE_TIMEOUT = 30              # Max seconds to wait for each device before continuing anyway
+STARTUP_PROBE_INITIAL_DELAY = 0.05      # First backoff step (doubles each retry)
+STARTUP_PROBE_MAX_DELAY = 2.0           # Longest backoff step
+
+# Memory Budget (/memory)
+MEMORY_RSS_BUDGET_MB = 160   # Target resident memory of the player process (check with: python3 memory_budget.py --check)
+MEMORY_PROFILING = False     # Attribute Python allocations to subsystems with tracemalloc (costs CPU and memory; for diagnosis)
+MEMORY_TRACE_FRAMES = 8      # Stack frames kept per traced allocation
+LOW_MEMORY_MODE = False      # Pi Zero: smaller caches and buffer pools; search and duplicate indexes built on first use
+
+if LOW_MEMORY_MODE:
+    REMUX_CACHE_MAX_BYTES = 8 * 1024 * 1024
+    TRACE_BUFFER_EVENTS = 500
+    LOG_RING_RECORDS = 200
+    LOG_BUFFER_RECORDS = 20
+    PRESENTER_RING_SLOTS = 3 # Fewest that never reuse the slot the presenter is still copying
+    WEB_IPC_EVENT_BACKLOG = 10
@@ -0,0 +1,107 @@
+# decode_benchmark.py
+# Plays a sample clip under each decode profile (config.DECODE_PROFILES) the way
+# the player does - decoded and scaled to 240x240 RV24 in memory - and reports
+# decoded/dropped frames and CPU use, so profiles can be chosen from numbers.
+#
+#   python3 decode_benchmark.py /path/to/sample.mkv [--seconds 30] [--profiles default,fast] [--json results.json]
+import argparse
+import ctypes
+import json
+import os
+import sys
+import time
+
+import vlc
+
+import config
+
+VIDEO_WIDTH = 240
+VIDEO_HEIGHT = 240
+video_buffer = ctypes.create_string_buffer(VIDEO_WIDTH * VIDEO_HEIGHT * 3)
+frames_shown = 0
+
+@vlc.CallbackDecorators.VideoLockCb
+def lock_cb(opaque, planes):
+    planes[0] = ctypes.cast(video_buffer, ctypes.c_void_p)
+
+@vlc.CallbackDecorators.VideoUnlockCb
+def unlock_cb(opaque, picture, planes):
+    pass
+
+@vlc.CallbackDecorators.VideoDisplayCb
+def display_cb(opaque, picture):
+    global frames_shown
+    frames_shown += 1
+
+def run_profile(clip_path, profile, seconds):
+    """Plays the clip for `seconds` under a profile and returns its measurements."""
+    global frames_shown
+    frames_shown = 0
+    # A fresh instance per profile, so nothing is shared between runs
+    instance = vlc.Instance(*config.VLC_ARGS)
+    player = instance.media_player_new()
+    player.video_set_callbacks(lock_cb, unlock_cb, display_cb, None)
+    player.video_set_format("RV24", VIDEO_WIDTH, VIDEO_HEIGHT, VIDEO_WIDTH * 3)
+    media = instance.media_new(clip_path)
+    for option in config.DECODE_PROFILES[profile]:
+        media.add_option(option)
+    player.set_media(media)
+
+    start_cpu = os.times()
+    start_time = time.monotonic()
+    player.play()
+    time.sleep(seconds)
+    stats = vlc.MediaStats()
+    has_stats = media.get_stats(stats)
+    position_s = player.get_time() / 1000.0
+    elapsed = time.monotonic() - start_time
+    end_cpu = os.times()
+    player.stop()
+    player.release()
+    instance.release()
+
+    cpu_seconds = (end_cpu.user - start_cpu.user) + (end_cpu.system - start_cpu.system)
+    return {
+        'profile': profile,
+        'options': config.DECODE_PROFILES[profile],
+        'played_s': round(position_s, 1),
+        'decoded': stats.decoded_video if has_stats else None,
+        'displayed': stats.displayed_pictures if has_stats else None,
+        'lost': stats.lost_pictures if has_stats else None,
+        'frames_shown': frames_shown,
+        'cpu_percent': round(cpu_seconds / elapsed * 100, 1),
+    }
+
+def print_results(results):
+    print(f"{'profile':<12} {'played':>7} {'decoded':>8} {'lost':>6} {'shown':>6} {'fps':>6} {'cpu%':>6}")
+    for r in results:
+        fps = r['frames_shown'] / r['played_s'] if r['played_s'] else 0
+        print(f"{r['profile']:<12} {r['played_s']:>6}s {r['decoded']!s:>8} {r['lost']!s:>6} "
+              f"{r['frames_shown']:>6} {fps:>6.1f} {r['cpu_percent']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare decode profiles on a sample clip.")
+    parser.add_argument('clip', help="Video file to play")
+    parser.add_argument('--seconds', type=float, default=30, help="How long to play under each profile")
+    parser.add_argument('--profiles', help="Comma-separated profile names (default: all)")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.clip):
+        sys.exit(f"Clip not found: {args.clip}")
+    profiles = args.profiles.split(',') if args.profiles else list(config.DECODE_PROFILES)
+    unknown = [p for p in profiles if p not in config.DECODE_PROFILES]
+    if unknown:
+        sys.exit(f"Unknown profiles: {', '.join(unknown)}")
+
+    results = []
+    for profile in profiles:
+        print(f"Playing {os.path.basename(args.clip)} with profile '{profile}' for {args.seconds:g}s...")
+        results.append(run_profile(args.clip, profile, args.seconds))
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+# decode_profiles.py
+import fnmatch
+import logging
+import os
+
+import config
+
+logger = logging.getLogger(__name__)
+
+def get_profile_name(episode_path, media_root_dir=config.MEDIA_ROOT_DIR):
+    """Returns the decode profile for a file: the first matching rule, else the device profile."""
+    relative_path = os.path.relpath(episode_path, media_root_dir)
+    for pattern, profile in config.DECODE_PROFILE_RULES:
+        if fnmatch.fnmatch(relative_path, pattern):
+            return profile
+    return config.DECODE_PROFILE
+
+def get_profile_options(profile):
+    """Returns the libvlc media options of a named profile."""
+    if profile not in config.DECODE_PROFILES:
+        logger.warning(f"Unknown decode profile '{profile}', using default settings.")
+        return []
+    return list(config.DECODE_PROFILES[profile])
+
+def get_decode_options(episode_path, media_root_dir=config.MEDIA_ROOT_DIR):
+    """Returns the media options for playing a file under its profile."""
+    return get_profile_options(get_profile_name(episode_path, media_root_dir))
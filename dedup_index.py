@@ -0,0 +1,362 @@
+# dedup_index.py
+# Content fingerprints for every file in the media root, used to spot the same
+# episode stored twice (e.g. a season uploaded into two show folders). A
+# fingerprint hashes the size plus a few sampled blocks, so indexing a large
+# library only reads a small part of each file; groups that share one can be
+# verified with a full hash before anything is changed. The index is kept in a
+# JSON file with each file's size and mtime, so only new or changed files are
+# read again.
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import config
+import metrics
+from library_batch import batch_lock
+
+logger = logging.getLogger(__name__)
+
+DEDUP_SAVED_BYTES = metrics.counter('pitv_dedup_saved_bytes_total', 'Bytes freed by hardlinking duplicate files.')
+
+_FULL_HASH_CHUNK = 1024 * 1024
+
+def fingerprint_file(f, size, blocks=config.DEDUP_SAMPLE_BLOCKS, block_bytes=config.DEDUP_SAMPLE_BLOCK_BYTES):
+    """
+    Returns the sampled fingerprint of an open binary file of `size` bytes.
+    Files no larger than the sample are hashed whole.
+    """
+    digest = hashlib.blake2b(size.to_bytes(8, 'little'), digest_size=16)
+    if size <= blocks * block_bytes:
+        f.seek(0)
+        digest.update(f.read())
+    else:
+        for i in range(blocks):
+            f.seek((size - block_bytes) * i // (blocks - 1))
+            digest.update(f.read(block_bytes))
+    return digest.hexdigest()
+
+def full_hash_file(f):
+    """Returns a hash of the whole content of an open binary file."""
+    digest = hashlib.blake2b(digest_size=32)
+    f.seek(0)
+    for chunk in iter(lambda: f.read(_FULL_HASH_CHUNK), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint_stream(stream):
+    """
+    Returns (size, fingerprint) for a seekable upload stream, leaving it at the
+    start, or None if the stream can't seek.
+    """
+    try:
+        size = stream.seek(0, os.SEEK_END)
+        fingerprint = fingerprint_file(stream, size)
+        stream.seek(0)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return size, fingerprint
+
+def same_content(stream, path):
+    """Compares a seekable upload stream with a file byte for byte."""
+    stream.seek(0)
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                a = stream.read(_FULL_HASH_CHUNK)
+                if a != f.read(len(a) or 1):
+                    return False
+                if not a:
+                    return True
+    finally:
+        stream.seek(0)
+
+class DedupIndex:
+    """
+    Fingerprint index of the media root, refreshed incrementally on a
+    background thread. Entries map a path relative to the media root to
+    [size, mtime_ns, fingerprint, full hash or None].
+    """
+    def __init__(self, media_root_dir, index_path=config.DEDUP_INDEX_PATH):
+        self.media_root_dir = os.path.abspath(media_root_dir)
+        self.index_path = index_path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.update_requested = threading.Event()
+        self.first_pass_done = threading.Event()
+        self.start_lock = threading.Lock() # First uses may race to start the thread
+        self.thread = None
+        self.last_update_seconds = None
+        self.dedupe_job = None # {'state': 'queued'|'running'|'done'|'failed', 'dry_run', 'result', 'error'}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError) as e:
+            logger.warning(f"Dedup index: Could not load {self.index_path} ({e}), rebuilding.")
+
+    def _save(self):
+        """Atomically replaces the index file."""
+        with self.lock:
+            entries = dict(self.entries)
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            temp_path = self.index_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(entries, f, separators=(',', ':'))
+            os.replace(temp_path, self.index_path)
+        except IOError as e:
+            logger.error(f"Dedup index: Error saving {self.index_path}: {e}")
+
+    # --- Background indexing ---
+    def start(self):
+        """Starts the indexing thread and queues a first pass over the library."""
+        with self.start_lock:
+            if self.thread:
+                return
+            self.thread = threading.Thread(target=self._run, name="DedupIndexThread")
+            self.thread.daemon = True
+            self.thread.start()
+        self.request_update()
+
+    def request_update(self):
+        """Asks for another pass (e.g. after a rescan); bursts of requests share one pass."""
+        self.update_requested.set()
+
+    def _run(self):
+        while True:
+            self.update_requested.wait()
+            self.update_requested.clear()
+            try:
+                self.update()
+            except Exception as e:
+                logger.error(f"Dedup index: Update failed: {e}")
+            self.first_pass_done.set()
+            self._run_dedupe_job()
+
+    def _walk(self):
+        """Yields (relative path, stat result) for every file below the media root, skipping hidden entries."""
+        for directory, dir_names, file_names in os.walk(self.media_root_dir):
+            dir_names[:] = [name for name in dir_names if not name.startswith('.')] # e.g. batch trash folders
+            for name in file_names:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield os.path.relpath(path, self.media_root_dir), st
+
+    def update(self):
+        """Fingerprints new and changed files, forgets removed ones and saves the index."""
+        update_start = time.perf_counter()
+        seen = set()
+        changed = 0
+        for rel_path, st in self._walk():
+            seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                continue
+            try:
+                with open(os.path.join(self.media_root_dir, rel_path), 'rb') as f:
+                    fingerprint = fingerprint_file(f, st.st_size)
+            except OSError as e:
+                logger.warning(f"Dedup index: Could not read {rel_path}: {e}")
+                continue
+            with self.lock:
+                self.entries[rel_path] = [st.st_size, st.st_mtime_ns, fingerprint, None]
+            changed += 1
+
+        with self.lock:
+            removed = [rel_path for rel_path in self.entries if rel_path not in seen]
+            for rel_path in removed:
+                del self.entries[rel_path]
+        if changed or removed:
+            self._save()
+        self.last_update_seconds = time.perf_counter() - update_start
+        logger.info(f"Dedup index: {len(seen)} files, {changed} fingerprinted, {len(removed)} removed "
+                    f"in {self.last_update_seconds:.1f}s")
+
+    # --- Queries ---
+    def find(self, size, fingerprint):
+        """Returns the relative paths of indexed files with this size and fingerprint."""
+        with self.lock:
+            return sorted(rel_path for rel_path, entry in self.entries.items()
+                          if entry[0] == size and entry[2] == fingerprint)
+
+    def _full_hash(self, rel_path):
+        """
+        Returns (full hash, stat result taken before reading) for an indexed
+        file, computing and caching the hash if needed.
+        """
+        path = os.path.join(self.media_root_dir, rel_path)
+        st = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(rel_path)
+            if entry and entry[3] and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                return entry[3], st
+        with open(path, 'rb') as f:
+            full_hash = full_hash_file(f)
+        with self.lock:
+            entry = self.entries.get(rel_path)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                entry[3] = full_hash
+        return full_hash, st
+
+    def find_duplicates(self, verify=False, verified_stats=None):
+        """
+        Returns groups of files with the same content, largest first. Without
+        `verify` groups are based on fingerprints alone; with it every file in a
+        candidate group is hashed in full and groups are split accordingly, and
+        `verified_stats` (if given) receives each hashed file's stat result.
+        """
+        candidates = {}
+        with self.lock:
+            for rel_path, entry in self.entries.items():
+                candidates.setdefault((entry[0], entry[2]), []).append(rel_path)
+
+        groups = []
+        for (size, _), paths in candidates.items():
+            if len(paths) < 2:
+                continue
+            if verify:
+                by_hash = {}
+                for rel_path in paths:
+                    try:
+                        full_hash, st = self._full_hash(rel_path)
+                    except OSError as e:
+                        logger.warning(f"Dedup index: Could not verify {rel_path}: {e}")
+                        continue
+                    by_hash.setdefault(full_hash, []).append(rel_path)
+                    if verified_stats is not None:
+                        verified_stats[rel_path] = st
+                subgroups = [group for group in by_hash.values() if len(group) > 1]
+            else:
+                subgroups = [paths]
+            for group in subgroups:
+                groups.append({'size': size, 'paths': sorted(group), 'verified': verify,
+                               'linked': self._linked_count(group)})
+        if verify:
+            self._save() # Keeps the full hashes for next time
+        groups.sort(key=lambda group: group['size'] * (len(group['paths']) - group['linked']), reverse=True)
+        return groups
+
+    def _linked_count(self, paths):
+        """Returns how many of `paths` are extra hardlinks of a file already in the group."""
+        inodes = set()
+        for rel_path in paths:
+            try:
+                st = os.stat(os.path.join(self.media_root_dir, rel_path))
+                inodes.add((st.st_dev, st.st_ino))
+            except OSError:
+                pass
+        return len(paths) - len(inodes)
+
+    def get_report(self, verify=False):
+        """Returns the duplicate groups and the space hardlinking them would free."""
+        groups = self.find_duplicates(verify)
+        reclaimable = sum(group['size'] * (len(group['paths']) - 1 - group['linked']) for group in groups)
+        return {'files_indexed': len(self.entries), 'groups': groups, 'reclaimable_bytes': reclaimable,
+                'last_update_seconds': self.last_update_seconds}
+
+    # --- Deduplication ---
+    def request_dedupe(self, dry_run=True):
+        """
+        Queues a hardlink pass on the indexing thread, after bringing the index
+        up to date. Returns the job status; a job already queued or running is
+        returned instead of starting another.
+        """
+        with self.lock:
+            if not self.dedupe_job or self.dedupe_job['state'] not in ('queued', 'running'):
+                self.dedupe_job = {'state': 'queued', 'dry_run': dry_run, 'result': None, 'error': None}
+            job = dict(self.dedupe_job)
+        self.request_update()
+        return job
+
+    def get_dedupe_status(self):
+        """Returns the status of the last dedupe job, with its result once done."""
+        with self.lock:
+            return dict(self.dedupe_job) if self.dedupe_job else {'state': 'idle'}
+
+    def _run_dedupe_job(self):
+        with self.lock:
+            job = self.dedupe_job
+            if not job or job['state'] != 'queued':
+                return
+            job['state'] = 'running'
+        try:
+            result = self.hardlink_duplicates(job['dry_run'])
+        except Exception as e:
+            logger.error(f"Dedup: Job failed: {e}")
+            with self.lock:
+                job.update(state='failed', error=str(e))
+            return
+        with self.lock:
+            job.update(state='done', result=result)
+
+    def _stat_if_unchanged(self, rel_path, verified_stats):
+        """Returns a file's stat result if it is still the file that was verified, else None."""
+        try:
+            st = os.stat(os.path.join(self.media_root_dir, rel_path))
+        except OSError:
+            return None
+        verified = verified_stats.get(rel_path)
+        if not verified or (st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino) != \
+                (verified.st_size, verified.st_mtime_ns, verified.st_dev, verified.st_ino):
+            return None
+        return st
+
+    def hardlink_duplicates(self, dry_run=True):
+        """
+        Replaces every verified duplicate with a hardlink to the first file of
+        its group, so the content is stored once. Files on other filesystems
+        are left alone. Returns what was (or, with `dry_run`, would be) linked.
+        Reads every candidate in full, so it runs on the indexing thread (see
+        request_dedupe).
+        """
+        linked = []
+        saved = 0
+        verified_stats = {}
+        # Hashing takes long, so it runs unlocked; files are checked again before linking
+        groups = self.find_duplicates(verify=True, verified_stats=verified_stats)
+        for group in groups:
+            keep_rel_path = group['paths'][0]
+            keep = os.path.join(self.media_root_dir, keep_rel_path)
+            with batch_lock: # Don't race a library batch moving the same files
+                for rel_path in group['paths'][1:]:
+                    # Uploads don't take batch_lock: check both files right before linking
+                    keep_stat = self._stat_if_unchanged(keep_rel_path, verified_stats)
+                    if keep_stat is None:
+                        logger.warning(f"Dedup: {keep_rel_path} changed since it was verified, skipping its group.")
+                        break
+                    st = self._stat_if_unchanged(rel_path, verified_stats)
+                    if st is None:
+                        logger.warning(f"Dedup: {rel_path} changed since it was verified, skipping it.")
+                        continue
+                    if (st.st_dev, st.st_ino) == (keep_stat.st_dev, keep_stat.st_ino) or st.st_dev != keep_stat.st_dev:
+                        continue
+                    if not dry_run:
+                        path = os.path.join(self.media_root_dir, rel_path)
+                        temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.pitv-link")
+                        try:
+                            os.link(keep, temp_path)
+                            os.replace(temp_path, path) # Atomic: the path always has the content
+                        except OSError as e:
+                            logger.error(f"Dedup: Could not link {rel_path}: {e}")
+                            if os.path.exists(temp_path):
+                                os.unlink(temp_path)
+                            continue
+                    linked.append({'path': rel_path, 'linked_to': keep_rel_path, 'size': st.st_size})
+                    saved += st.st_size
+        if not dry_run:
+            DEDUP_SAVED_BYTES.inc(saved)
+            logger.info(f"Dedup: Linked {len(linked)} duplicate files, {saved / 1e6:.1f} MB freed.")
+            self.request_update() # Replaced files have new mtimes
+        return {'dry_run': dry_run, 'linked': linked, 'saved_bytes': saved}
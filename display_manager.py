@@ -2,44 +2,65 @@
 import ST7789 # Direct import for Pirate Audio display
 from PIL import ImageFont, ImageDraw, Image 
 
+import contextlib
+import logging
 import os
 import time
 
+import config
+from mirror_manager import MirrorManager
+from spi_transfer import SpiTransferEngine
+from frame_presenter import PresenterPanel
+import metrics
+import tracer
+
+logger = logging.getLogger(__name__)
+
+FRAME_DISPLAY_SECONDS = metrics.histogram('pitv_frame_display_seconds', 'Time to present one video frame, including conversion and SPI.')
+SPI_WRITE_SECONDS = metrics.histogram('pitv_spi_write_seconds', 'Time spent pushing one full image to the panel.')
+FRAMES_SKIPPED = metrics.counter('pitv_frames_skipped_total', 'Video frames not shown because an overlay was visible.')
+
 class DisplayManager:
     def __init__(self):
         self.disp = None # Initialize to None
         self.width = 240 # Default width
         self.height = 240 # Default height
 
-        # Retry initialization in case of boot race conditions
-        max_retries = 5
-        retry_delay = 3 # seconds
-        for attempt in range(max_retries):
-            try:
-                # ST7789 display setup
-                self.disp = ST7789.ST7789(
-                    port=0,
-                    cs=1,
-                    dc=9,
-                    backlight=13,
-                    spi_speed_hz=62_500_000,
-                    rotation=0
-                )
-                self.disp.begin()
-                self.width = self.disp.width
-                self.height = self.disp.height
-                print("Display initialized successfully.")
-                break # Success
-            except FileNotFoundError as e:
-                print(f"Attempt {attempt + 1}/{max_retries}: SPI device not found. Is SPI enabled?")
-                if attempt + 1 == max_retries:
-                    raise e
-                time.sleep(retry_delay)
-            except Exception as e:
-                print(f"Attempt {attempt + 1}/{max_retries}: Could not initialize display: {e}")
-                if attempt + 1 == max_retries:
-                    raise e
-                time.sleep(retry_delay)
+        # With a presenter process, that process owns the panel and we only feed it frames
+        self.presenter = None
+        if config.FRAME_PRESENTER_PROCESS:
+            self.presenter = PresenterPanel(self.width, self.height)
+            self.disp = self.presenter
+        else:
+            # Retry initialization in case of boot race conditions
+            max_retries = 5
+            retry_delay = 3 # seconds
+            for attempt in range(max_retries):
+                try:
+                    # ST7789 display setup
+                    self.disp = ST7789.ST7789(
+                        port=0,
+                        cs=1,
+                        dc=9,
+                        backlight=13,
+                        spi_speed_hz=config.SPI_SPEED_HZ,
+                        rotation=0
+                    )
+                    self.disp.begin()
+                    self.width = self.disp.width
+                    self.height = self.disp.height
+                    logger.info("Display initialized successfully.")
+                    break # Success
+                except FileNotFoundError as e:
+                    logger.warning(f"Attempt {attempt + 1}/{max_retries}: SPI device not found. Is SPI enabled?")
+                    if attempt + 1 == max_retries:
+                        raise e
+                    time.sleep(retry_delay)
+                except Exception as e:
+                    logger.warning(f"Attempt {attempt + 1}/{max_retries}: Could not initialize display: {e}")
+                    if attempt + 1 == max_retries:
+                        raise e
+                    time.sleep(retry_delay)
 
         # Load fonts
         font_dir = os.path.join(os.path.dirname(__file__), 'fonts')
@@ -50,7 +71,7 @@ class DisplayManager:
             self.font_medium = ImageFont.truetype(self.font_path, 16)
             self.font_large = ImageFont.truetype(self.font_path, 20)
         except IOError:
-            print("Warning: PixelOperator.ttf not found. Using default font.")
+            logger.warning("PixelOperator.ttf not found. Using default font.")
             self.font_small = ImageFont.load_default()
             self.font_medium = ImageFont.load_default()
             self.font_large = ImageFont.load_default()
@@ -63,6 +84,69 @@ class DisplayManager:
         self.screen_on = True
         self.current_rotation = 0
         self.overlay_expiry_time = 0
+        self.last_frame_time = 0 # When a video frame was last presented
+        self.last_interaction_time = time.time() # When something other than video was last shown (user activity)
+        self.write_failed = False # Set when a panel write raises; the next wake re-initializes the panel
+
+        # Taps every presented image for the web screen mirror
+        self.mirror = MirrorManager()
+
+        if self.presenter:
+            metrics.gauge('pitv_presenter_frames_presented_total', 'Frames the presenter process sent to the panel.',
+                          lambda: self.presenter.get_stats()['presented'], kind='counter')
+            metrics.gauge('pitv_presenter_frames_dropped_total', 'Frames the presenter process skipped for a newer one.',
+                          lambda: self.presenter.get_stats()['dropped'], kind='counter')
+
+        # Large, allocation-free frame transfers (falls back to the driver's display())
+        self.spi_engine = None
+        if self.disp and config.SPI_FAST_TRANSFERS and not self.presenter:
+            try:
+                self.spi_engine = SpiTransferEngine(self.disp, self.width, self.height)
+                logger.info(f"Display: Sending frames in {len(self.spi_engine.chunks)} SPI transfer(s) of up to {self.spi_engine.max_transfer} bytes.")
+            except Exception as e:
+                logger.warning(f"Display: Fast SPI transfers unavailable ({e}), using the display driver.")
+
+        if self.spi_engine or self.presenter:
+            metrics.gauge('pitv_spi_frames_unchanged_total', 'Frames identical to what the panel showed, so not sent.',
+                          lambda: self.get_transfer_stats()['unchanged'], kind='counter')
+            metrics.gauge('pitv_spi_frames_partial_total', 'Frames sent as changed tile bands only.',
+                          lambda: self.get_transfer_stats()['partial'], kind='counter')
+            metrics.gauge('pitv_spi_bytes_sent_total', 'Pixel bytes sent to the panel.',
+                          lambda: self.get_transfer_stats()['bytes_sent'], kind='counter')
+
+    def get_transfer_stats(self):
+        """Returns how many frames reached the SPI engine, how many were skipped or partly sent, and the bytes sent."""
+        if self.presenter:
+            stats = self.presenter.get_stats()
+            stats = {'frames': stats['presented'], 'unchanged': stats['unchanged'],
+                     'partial': stats['partial'], 'bytes_sent': stats['bytes_sent']}
+        elif self.spi_engine:
+            stats = self.spi_engine.get_stats()
+            del stats['sent']
+        else:
+            return {'frames': 0, 'unchanged': 0, 'partial': 0, 'bytes_sent': 0, 'unchanged_rate': None, 'partial_rate': None}
+        frames = stats['frames']
+        stats['unchanged_rate'] = round(stats['unchanged'] / frames, 3) if frames else None
+        stats['partial_rate'] = round(stats['partial'] / frames, 3) if frames else None
+        full_frame_bytes = self.width * self.height * 2
+        stats['bandwidth_saved'] = round(1 - stats['bytes_sent'] / (frames * full_frame_bytes), 3) if frames else None
+        return stats
+
+    def _present(self, image, kind='redraw'):
+        """Sends an upright image to the panel, applying the current rotation."""
+        self.mirror.publish(image)
+        if self.current_rotation != 0 and not self.presenter: # The presenter process rotates itself
+            image = image.rotate(self.current_rotation)
+        with SPI_WRITE_SECONDS.time():
+            try:
+                if self.spi_engine:
+                    self.spi_engine.write(image)
+                else:
+                    self.disp.display(image)
+            except Exception:
+                self.write_failed = True
+                raise
+        tracer.screen_updated(kind)
 
     def rotate_screen(self):
         """Cycles screen rotation through 0, 90, 180, 270 degrees."""
@@ -70,12 +154,15 @@ class DisplayManager:
         
         # Cycle rotation: 0 -> 90 -> 180 -> 270 -> 0
         self.current_rotation = (self.current_rotation + 90) % 360
+        if self.presenter:
+            self.presenter.set_rotation(self.current_rotation)
         
-        print(f"Screen rotation set to {self.current_rotation} degrees")
+        logger.debug(f"Screen rotation set to {self.current_rotation} degrees")
         
         # Show a temporary confirmation on screen
         self.show_message(f"Rotation: {self.current_rotation}°")
 
+    @tracer.traced(category='display')
     def show_message(self, message):
         """Displays a temporary full-screen message."""
         if not self.disp: return
@@ -85,13 +172,10 @@ class DisplayManager:
         draw = ImageDraw.Draw(msg_img)
         self._draw_text_centered(draw, self.height / 2 - 10, message, self.font_large)
         
-        # Apply current rotation
-        if self.current_rotation != 0:
-            msg_img = msg_img.rotate(self.current_rotation)
-            
-        self.disp.display(msg_img)
+        self._present(msg_img)
         self.turn_on_backlight()
         self.overlay_expiry_time = time.time() + 3  # Keep message for 3 seconds
+        self.last_interaction_time = time.time()
 
     def _draw_text_centered(self, draw, y, text, font, fill="white"):
         """Helper to draw text centered horizontally."""
@@ -103,10 +187,15 @@ class DisplayManager:
         x = (self.width - text_width) / 2
         draw.text((x, y), text, font=font, fill=fill)
 
-    def show_playback_info(self, show_info, current_time_str="00:00", total_time_str="00:00", volume_percent=100, is_playing=True, is_shuffled=False):
-        """Displays current playback information on the screen."""
-        if not self.disp: # If display not initialized, print to console instead
-            print(f"Display not available. Now playing: {show_info['show']} - {show_info['episode']} ({current_time_str}/{total_time_str}) Vol: {volume_percent}%")
+    @tracer.traced(category='display')
+    def show_playback_info(self, show_info, current_time_str="00:00", total_time_str="00:00", volume_percent=100, is_playing=True, is_shuffled=False, refresh_only=False):
+        """
+        Displays current playback information on the screen.
+        refresh_only: redraw in place (e.g. clock update) without extending the overlay
+        or counting as activity for the inactivity timer.
+        """
+        if not self.disp: # If display not initialized, log instead
+            logger.debug(f"Display not available. Now playing: {show_info['show']} - {show_info['episode']} ({current_time_str}/{total_time_str}) Vol: {volume_percent}%")
             return
 
         if not self.screen_on: # If screen was off, turn it on
@@ -133,14 +222,12 @@ class DisplayManager:
         # Volume
         self._draw_text_centered(self.draw, 160, f"Volume: {volume_percent}%", self.font_medium)
 
-        # Apply rotation to UI if needed
-        output_image = self.image
-        if self.current_rotation != 0:
-            output_image = self.image.rotate(self.current_rotation)
-
-        self.disp.display(output_image)
+        self._present(self.image)
+        if refresh_only:
+            return
         self.overlay_expiry_time = time.time() + 3  # Keep info for 3 seconds
         self.last_update_time = time.time() # Reset inactivity timer
+        self.last_interaction_time = self.last_update_time
 
     def display_frame(self, image):
         """Displays a full-screen image (video frame)."""
@@ -148,21 +235,57 @@ class DisplayManager:
 
         # Don't overwrite status overlays (like volume, title, etc)
         if time.time() < self.overlay_expiry_time:
+            FRAMES_SKIPPED.inc()
             return
 
+        # Frames are only traced while a command waits for the screen, so they don't flood the buffer
+        span = tracer.span('video frame', 'display') if tracer.is_waiting_for_screen() else contextlib.nullcontext()
+        with FRAME_DISPLAY_SECONDS.time(), span:
+            if not self.screen_on: self.turn_on_backlight()
+            
+            # Determine if we need to resize or if it's already 240x240
+            if image.size != (self.width, self.height):
+                 image = image.resize((self.width, self.height))
+            
+            self._present(image, kind='frame')
+        self.last_update_time = time.time()
+        self.last_frame_time = self.last_update_time
+
+    def get_buffer_bytes(self):
+        """Returns the bytes held by the UI image, SPI transfer buffers and the presenter's frame ring."""
+        total = self.width * self.height * 3
+        if self.spi_engine:
+            engine = self.spi_engine
+            total += sum(array.nbytes for array in (engine.scratch, engine.channel, engine.pixels, engine.previous, engine.changed, engine.staging))
+        if self.presenter:
+            total += self.presenter.ring.shm.size
+        return total
+
+    def present_video_slot(self, slot):
+        """
+        Presenter mode counterpart of display_frame(): VLC already decoded the frame
+        into a ring slot, so only hand its number to the presenter process.
+        """
+        if time.time() < self.overlay_expiry_time:
+            FRAMES_SKIPPED.inc()
+            return
         if not self.screen_on: self.turn_on_backlight()
-        
-        # Determine if we need to resize or if it's already 240x240
-        if image.size != (self.width, self.height):
-             image = image.resize((self.width, self.height))
-        
-        # Apply rotation if needed
-        if self.current_rotation != 0:
-            image = image.rotate(self.current_rotation)
-             
-        self.disp.display(image)
+        self.presenter.publish(slot)
+        tracer.screen_updated('frame') # Handed over; the presenter's SPI write follows
         self.last_update_time = time.time()
+        self.last_frame_time = self.last_update_time
 
+    def close(self):
+        """Stops the presenter process, if there is one."""
+        if self.presenter:
+            self.presenter.shutdown()
+
+    def is_video_visible(self):
+        """Returns True while video frames (rather than the info screen) are on the panel."""
+        now = time.time()
+        return now >= self.overlay_expiry_time and now - self.last_frame_time < 1.0
+
+    @tracer.traced(category='display')
     def show_sleep_screen(self):
         """Displays a sleep message and turns off backlight."""
         if not self.disp: return # Do nothing if display not available
@@ -170,7 +293,7 @@ class DisplayManager:
         self.draw.rectangle((0, 0, self.width, self.height), fill="black")
         self._draw_text_centered(self.draw, self.height / 2 - 10, "Zzz...", self.font_large, fill="blue")
         self._draw_text_centered(self.draw, self.height / 2 + 20, "Press any button to wake", self.font_small, fill="gray")
-        self.disp.display(self.image)
+        self._present(self.image)
         self.disp.set_backlight(0) # Turn off backlight
         self.screen_on = False
 
@@ -189,11 +312,22 @@ class DisplayManager:
         self.disp.set_backlight(0) # Turn off backlight
         self.screen_on = False
 
+    def wake(self, reinit=False):
+        """Turns the screen back on after sleep, re-initializing the panel only if asked or a write failed."""
+        if not self.disp: return
+        if reinit or self.write_failed:
+            self.reinit_display()
+        else:
+            self.turn_on_backlight()
+
     def reinit_display(self):
-        """Re-initializes the display, e.g., after waking from sleep."""
+        """Re-initializes the display, e.g., after a failed write."""
         if not self.disp: return
-        print("Re-initializing display...")
+        logger.info("Re-initializing display...")
         self.disp.begin()
+        self.write_failed = False
+        if self.spi_engine:
+            self.spi_engine.invalidate() # The panel's contents are unknown after begin()
         self.turn_on_backlight() # Ensure backlight is on after re-init
 
     def clear_screen(self):
@@ -201,7 +335,7 @@ class DisplayManager:
         if not self.disp: return # Do nothing if display not available
 
         self.draw.rectangle((0, 0, self.width, self.height), fill="black")
-        self.disp.display(self.image)
+        self._present(self.image)
         self.screen_on = True # Clearing implies activity
         self.last_update_time = time.time()
 
@@ -219,6 +353,7 @@ class DisplayManager:
             # if a true dimming feature isn't available. Here, it will effectively just wait for off.
             pass
 
+    @tracer.traced(category='display')
     def draw_menu(self, title, items, selected_index):
         """Draws a vertical menu list with scrolling."""
         if not self.disp: return
@@ -265,10 +400,6 @@ class DisplayManager:
         if end_index < len(items):
              self._draw_text_centered(self.draw, self.height - 15, "v", self.font_small, fill="gray")
 
-        # Apply rotation
-        output_image = self.image
-        if self.current_rotation != 0:
-            output_image = self.image.rotate(self.current_rotation)
-
-        self.disp.display(output_image)
+        self._present(self.image)
         self.last_update_time = time.time()
+        self.last_interaction_time = self.last_update_time
@@ -0,0 +1,208 @@
+# frame_presenter.py
+# Frame presentation in a dedicated process (config.FRAME_PRESENTER_PROCESS).
+# VLC decodes straight into a ring of frame slots in shared memory, and the UI
+# copies its images into the same ring. Only sequence numbers cross the pipe;
+# the presenter process owns the panel and does RGB565 conversion and SPI
+# output on its own core, outside the player's GIL.
+import ctypes
+import logging
+import os
+import struct
+import subprocess
+import sys
+import threading
+from multiprocessing import shared_memory
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Header fields (little-endian uint64), followed by the seq -> slot table
+_WRITE_SEQ = 0   # Sequence number of the newest published frame
+_ROTATION = 8    # Degrees, applied by the presenter
+_BACKLIGHT = 16  # 0 or 1
+_REINIT = 24     # Bumped to ask for a panel re-initialization
+_PRESENTED = 32  # Frames the presenter sent to the panel
+_DROPPED = 40    # Published frames the presenter skipped because a newer one was ready
+_UNCHANGED = 48  # Presented frames identical to the panel's, so not sent
+_PARTIAL = 56    # Presented frames sent as changed bands only
+_SPI_BYTES = 64  # Pixel bytes sent to the panel
+_SLOT_TABLE = 72
+_FIELD = struct.Struct('<Q')
+
+class FrameRing:
+    """A header plus `slots` RGB888 frames in one shared memory block."""
+    def __init__(self, slots, width, height, name=None):
+        self.slots = slots
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.header_size = _SLOT_TABLE + 8 * slots
+        size = self.header_size + slots * self.frame_size
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = _attach(name)
+        self.name = self.shm.name
+
+    def get(self, field):
+        return _FIELD.unpack_from(self.shm.buf, field)[0]
+
+    def set(self, field, value):
+        _FIELD.pack_into(self.shm.buf, field, value)
+
+    def slot_offset(self, slot):
+        return self.header_size + slot * self.frame_size
+
+    def slot_view(self, slot):
+        offset = self.slot_offset(slot)
+        return self.shm.buf[offset:offset + self.frame_size]
+
+    def slot_for_seq(self, seq):
+        return self.get(_SLOT_TABLE + 8 * (seq % self.slots))
+
+def _attach(name):
+    """Attaches to an existing block without letting this process's exit remove it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class PresenterPanel:
+    """
+    Stands in for the ST7789 driver in the player process. UI images and VLC's
+    frames go into the ring; backlight, rotation and re-init requests are header
+    fields. Every change is signalled to the presenter with the current sequence
+    number.
+    """
+    def __init__(self, width=240, height=240, slots=config.PRESENTER_RING_SLOTS):
+        self.width = width
+        self.height = height
+        self.ring = FrameRing(slots, width, height)
+        self.ring.set(_BACKLIGHT, 1)
+        # Raw slot addresses for VLC's lock callback
+        self.addresses = [ctypes.addressof(ctypes.c_char.from_buffer(self.ring.shm.buf, self.ring.slot_offset(slot)))
+                          for slot in range(slots)]
+        self.lock = threading.Lock() # VLC's decoder thread and the UI both take slots
+        self.next_slot = 0
+
+        # A fresh interpreter (not a fork of the player) that inherits the read end of the signal pipe
+        reader, self.signal_fd = os.pipe()
+        os.set_blocking(self.signal_fd, False)
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), self.ring.name, str(slots), str(width), str(height), str(reader)],
+            pass_fds=(reader,))
+        os.close(reader)
+        logger.info(f"Frame presenter process started (pid {self.process.pid}).")
+
+    def acquire_slot(self):
+        """Returns the next slot to write a frame into."""
+        with self.lock:
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.ring.slots
+            return slot
+
+    def publish(self, slot):
+        """Makes a written slot the newest frame and wakes the presenter."""
+        with self.lock:
+            seq = self.ring.get(_WRITE_SEQ) + 1
+            self.ring.set(_SLOT_TABLE + 8 * (seq % self.ring.slots), slot)
+            self.ring.set(_WRITE_SEQ, seq)
+        self._signal(seq)
+
+    def _signal(self, seq):
+        try:
+            os.write(self.signal_fd, _FIELD.pack(seq)) # Smaller than PIPE_BUF, so never split
+        except BlockingIOError:
+            pass # Presenter is behind; it reads the newest sequence number from the header anyway
+        except OSError as e:
+            logger.warning(f"Frame presenter unreachable: {e}")
+
+    # --- ST7789 driver interface used by DisplayManager ---
+    def display(self, image):
+        slot = self.acquire_slot()
+        self.ring.slot_view(slot)[:] = image.convert('RGB').tobytes()
+        self.publish(slot)
+
+    def set_backlight(self, value):
+        self.ring.set(_BACKLIGHT, 1 if value else 0)
+        self._signal(self.ring.get(_WRITE_SEQ))
+
+    def begin(self):
+        self.ring.set(_REINIT, self.ring.get(_REINIT) + 1)
+        self._signal(self.ring.get(_WRITE_SEQ))
+
+    def set_rotation(self, degrees):
+        self.ring.set(_ROTATION, degrees)
+
+    def get_stats(self):
+        return {'presented': self.ring.get(_PRESENTED), 'dropped': self.ring.get(_DROPPED),
+                'published': self.ring.get(_WRITE_SEQ), 'unchanged': self.ring.get(_UNCHANGED),
+                'partial': self.ring.get(_PARTIAL), 'bytes_sent': self.ring.get(_SPI_BYTES),
+                'alive': self.process.poll() is None}
+
+    def shutdown(self):
+        """Lets the presenter apply pending requests (e.g. backlight off), then stops it."""
+        os.close(self.signal_fd) # The presenter exits when it sees the pipe close
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.terminate()
+        self.ring.shm.unlink() # Not closed: VLC's slot addresses still reference the mapping
+
+def run_presenter(ring_name, slots, width, height, signal_fd):
+    """Presenter process: waits for sequence numbers and sends the newest frame to the panel."""
+    import numpy as np
+    import ST7789
+    import logs
+    from spi_transfer import SpiTransferEngine
+
+    logs.setup('presenter')
+
+    if config.PRESENTER_CPU is not None:
+        os.sched_setaffinity(0, {config.PRESENTER_CPU})
+    ring = FrameRing(slots, width, height, name=ring_name)
+    disp = ST7789.ST7789(port=0, cs=1, dc=9, backlight=13, spi_speed_hz=config.SPI_SPEED_HZ, rotation=0)
+    disp.begin()
+    engine = SpiTransferEngine(disp, width, height)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    presented_seq = ring.get(_WRITE_SEQ)
+    backlight = 1
+    reinit = ring.get(_REINIT)
+    presented = dropped = 0
+
+    closing = False
+    while not closing:
+        # Reads every pending sequence number at once; only the newest frame matters
+        if not os.read(signal_fd, 4096):
+            closing = True # The player exited; apply its last requests, then stop
+
+        if ring.get(_REINIT) != reinit:
+            reinit = ring.get(_REINIT)
+            disp.begin()
+            engine.invalidate()
+        if ring.get(_BACKLIGHT) != backlight:
+            backlight = ring.get(_BACKLIGHT)
+            disp.set_backlight(backlight)
+
+        seq = ring.get(_WRITE_SEQ)
+        if seq != presented_seq:
+            dropped += max(0, seq - presented_seq - 1)
+            # Copy out first; the slot is only reused after `slots` newer frames
+            np.copyto(frame, np.frombuffer(ring.slot_view(ring.slot_for_seq(seq)), dtype=np.uint8).reshape(height, width, 3))
+            rotation = ring.get(_ROTATION)
+            engine.write(np.rot90(frame, rotation // 90) if rotation else frame)
+            presented += 1
+            presented_seq = seq
+            ring.set(_PRESENTED, presented)
+            ring.set(_DROPPED, dropped)
+            ring.set(_UNCHANGED, engine.frames_unchanged)
+            ring.set(_PARTIAL, engine.frames_partial)
+            ring.set(_SPI_BYTES, engine.bytes_sent)
+
+if __name__ == "__main__":
+    name, slot_count, frame_width, frame_height, fd = sys.argv[1:6]
+    run_presenter(name, int(slot_count), int(frame_width), int(frame_height), int(fd))
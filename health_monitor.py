@@ -0,0 +1,129 @@
+# health_monitor.py
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import vlc
+
+import config
+
+logger = logging.getLogger(__name__)
+
+class PlaybackHealthMonitor:
+    """
+    Samples libvlc's per-media statistics and keeps a rolling window per episode.
+    When the share of lost pictures in the window crosses the threshold, the
+    episode is moved to the next, cheaper decode level (see
+    config.HEALTH_DEGRADE_LEVELS) through the `on_degrade` callback.
+    """
+    def __init__(self, media_player, on_degrade):
+        self.media_player = media_player
+        self.on_degrade = on_degrade # Called as on_degrade(episode_path, level) from sample()
+        self.interval = config.HEALTH_SAMPLE_INTERVAL
+        self.loss_threshold = config.HEALTH_LOSS_THRESHOLD
+        self.levels = config.HEALTH_DEGRADE_LEVELS
+        self.lock = threading.Lock()
+        self.current_episode = None
+        self.windows = {} # Episode path -> deque of stat samples
+        self.episode_levels = {} # Episode path -> decode level (0 = normal)
+        self.last_change_time = 0
+
+    def track(self, episode_path):
+        """Starts a fresh window for an episode; libvlc's counters restart with each new media."""
+        with self.lock:
+            self.current_episode = episode_path
+            self.windows[episode_path] = deque(maxlen=config.HEALTH_WINDOW_SAMPLES)
+
+    def get_decode_settings(self, episode_path):
+        """Returns (path to play, media options) for an episode at its current decode level."""
+        with self.lock:
+            level = self.episode_levels.get(episode_path, 0)
+        options = []
+        play_path = episode_path
+        for settings in self.levels[:level]:
+            options += settings.get('options', [])
+            if settings.get('light_variant'):
+                play_path = self._find_light_variant(episode_path) or play_path
+        return play_path, options
+
+    def _find_light_variant(self, episode_path):
+        """Looks for a lighter encode of the episode in the season's variant folder."""
+        directory, filename = os.path.split(episode_path)
+        stem = os.path.splitext(filename)[0]
+        variant_dir = os.path.join(directory, config.HEALTH_LIGHT_VARIANT_DIR)
+        if not os.path.isdir(variant_dir):
+            return None
+        for candidate in sorted(os.listdir(variant_dir)):
+            if os.path.splitext(candidate)[0] == stem:
+                return os.path.join(variant_dir, candidate)
+        return None
+
+    def sample(self):
+        """
+        Reads the current media's statistics and degrades decoding if needed.
+        Call every `interval` seconds (the player runs it on a dispatcher timer).
+        """
+        episode = self.current_episode
+        if not episode or not self.media_player.is_playing():
+            return
+        media = self.media_player.get_media()
+        if not media:
+            return
+        stats = vlc.MediaStats()
+        if not media.get_stats(stats):
+            return
+
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(episode)
+            if window is None:
+                return
+            window.append({
+                'time': now,
+                'decoded': stats.decoded_video,
+                'displayed': stats.displayed_pictures,
+                'lost': stats.lost_pictures,
+                'corrupted': stats.demux_corrupted,
+                'bitrate': stats.input_bitrate,
+            })
+            if len(window) < window.maxlen:
+                return
+            decoded = window[-1]['decoded'] - window[0]['decoded']
+            lost = window[-1]['lost'] - window[0]['lost']
+            level = self.episode_levels.get(episode, 0)
+
+        if decoded <= 0 or level >= len(self.levels):
+            return
+        loss_ratio = lost / decoded
+        if loss_ratio < self.loss_threshold:
+            return
+        # Give each new level a full window before judging it
+        if now - self.last_change_time < self.interval * config.HEALTH_WINDOW_SAMPLES:
+            return
+
+        new_level = level + 1
+        with self.lock:
+            self.episode_levels[episode] = new_level
+            self.last_change_time = now
+        logger.warning(f"Health: {os.path.basename(episode)} lost {loss_ratio:.0%} of pictures, "
+                       f"switching to decode level {new_level} ({self.levels[new_level - 1]['name']})")
+        self.on_degrade(episode, new_level)
+
+    def get_stats(self):
+        """Returns the current episode's window summary and decode level."""
+        with self.lock:
+            episode = self.current_episode
+            window = list(self.windows.get(episode, ()))
+            level = self.episode_levels.get(episode, 0)
+        summary = {'episode': os.path.basename(episode) if episode else None, 'decode_level': level}
+        if len(window) >= 2:
+            decoded = window[-1]['decoded'] - window[0]['decoded']
+            lost = window[-1]['lost'] - window[0]['lost']
+            summary.update({
+                'loss_ratio': lost / decoded if decoded > 0 else 0,
+                'demux_corrupted': window[-1]['corrupted'] - window[0]['corrupted'],
+                'input_bitrate': window[-1]['bitrate'],
+            })
+        return summary
@@ -11,10 +11,11 @@ sudo apt-get update
 # 2. Install system dependencies
 # vlc/libvlc-dev: Required for the VLC media player
 # alsa-utils: Required for volume control (amixer)
+# ffmpeg: Required for remuxing media for in-browser playback
 # python3-pip: Required to install Python packages
 # python3-full: Required for creating virtual environments
 echo "Installing system dependencies..."
-sudo apt-get install -y vlc libvlc-dev alsa-utils python3-pip python3-full
+sudo apt-get install -y vlc libvlc-dev alsa-utils ffmpeg python3-pip python3-full
 
 # 3. Set up Virtual Environment and Install Dependencies
 echo "Setting up Python virtual environment..."
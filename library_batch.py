@@ -0,0 +1,252 @@
+# library_batch.py
+import logging
+import os
+import shutil
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Only one batch may modify the media root at a time
+batch_lock = threading.Lock()
+
+TRASH_PREFIX = '.pitv-trash-'
+
+def relocate_path(path, moved_paths):
+    """
+    Follows a list of (old, new) absolute path moves, in order, for a path or
+    anything below it. Returns the new path, or None if it was deleted.
+    """
+    for old, new in moved_paths:
+        if path is None:
+            break
+        if path == old or path.startswith(old + os.sep):
+            path = None if new is None else new + path[len(old):]
+    return path
+
+def save_upload(media_root_dir, file_stream, filename, is_safe_path, find_duplicate=None):
+    """
+    Writes an uploaded file below the media root, preserving its directory
+    structure. Returns (bytes written, seconds taken), or None if it was refused,
+    failed or was already there. With `find_duplicate(size, fingerprint)` an
+    upload identical to a library file isn't written again, only linked.
+    """
+    from werkzeug.utils import secure_filename
+
+    # Sanitize each path component to prevent traversal attacks but keep directory structure.
+    # Browsers use '/' as a separator in webkitRelativePath.
+    path_parts = filename.split('/')
+    safe_parts = [secure_filename(part) for part in path_parts]
+    safe_relative_path = os.path.join(*safe_parts)
+
+    # Double-check that the resulting path is not trying to escape the media root.
+    if not is_safe_path(safe_relative_path):
+        logger.warning(f"Unsafe path detected during upload: {safe_relative_path}")
+        return None
+
+    save_path = os.path.join(media_root_dir, safe_relative_path)
+
+    try:
+        # Create parent directories if they don't exist
+        directory = os.path.dirname(save_path)
+        os.makedirs(directory, exist_ok=True)
+
+        if find_duplicate:
+            check_start = time.perf_counter()
+            duplicate = _find_stored_copy(media_root_dir, file_stream, safe_relative_path, find_duplicate)
+            if duplicate == safe_relative_path:
+                logger.info(f"Upload skipped, {save_path} already has this content")
+                return None
+            if duplicate:
+                # Stored once; the new path is another name for the existing file
+                temp_path = os.path.join(directory, f".{os.path.basename(save_path)}.pitv-link")
+                os.link(os.path.join(media_root_dir, duplicate), temp_path)
+                os.replace(temp_path, save_path)
+                logger.info(f"Upload matches {duplicate}, linked to {save_path} instead of writing a copy")
+                return 0, time.perf_counter() - check_start
+
+        # Write the file in chunks rather than holding it all in memory. A new
+        # file replaces the path: it may be a hardlink shared with other copies.
+        write_start = time.perf_counter()
+        temp_path = os.path.join(directory, f".{os.path.basename(save_path)}.pitv-upload")
+        try:
+            with open(temp_path, 'wb') as f:
+                shutil.copyfileobj(file_stream, f, length=1024 * 1024)
+                size = f.tell()
+            os.replace(temp_path, save_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        logger.info(f"File uploaded successfully to {save_path}")
+        return size, time.perf_counter() - write_start
+    except Exception as e:
+        logger.error(f"Error saving uploaded file: {e}")
+        return None
+
+def _find_stored_copy(media_root_dir, file_stream, rel_path, find_duplicate):
+    """
+    Returns the relative path of a library file with exactly the upload's
+    content (preferring `rel_path` itself), or None. Candidates come from the
+    dedup index's sampled fingerprints and are confirmed byte for byte.
+    """
+    from dedup_index import fingerprint_stream, same_content
+
+    sampled = fingerprint_stream(file_stream)
+    if not sampled:
+        return None # Not seekable; can't look before writing
+    candidates = find_duplicate(*sampled)
+    others = [candidate for candidate in candidates if candidate != rel_path]
+    candidates = ([rel_path] if rel_path in candidates else []) + (others if config.DEDUP_LINK_UPLOADS else [])
+    for candidate in candidates:
+        try:
+            if same_content(file_stream, os.path.join(media_root_dir, candidate)):
+                return candidate
+        except OSError:
+            continue # Changed since it was indexed
+    return None
+
+class LibraryBatch:
+    """
+    Applies many move/rename/delete/mkdir operations to the media root as one
+    transaction. Operations run in order while an undo journal is kept; if any
+    operation fails, everything already done is rolled back. Deleted entries
+    are parked in a trash folder on the same filesystem and only removed once
+    the whole batch has succeeded.
+
+    Operation format (paths are relative to the media root):
+        {"op": "move", "src": "Show/Season 1/a.mkv", "dst": "Other/Season 1/a.mkv"}
+        {"op": "rename", "path": "Show/Season 1/a.mkv", "name": "b.mkv"}
+        {"op": "delete", "path": "Show/Season 2"}
+        {"op": "mkdir", "path": "New Show/Season 1"}
+    """
+    OPERATIONS = ('move', 'rename', 'delete', 'mkdir')
+
+    def __init__(self, media_root_dir, operations, is_safe_path):
+        self.media_root_dir = os.path.abspath(media_root_dir)
+        self.operations = operations
+        self.is_safe_path = is_safe_path
+        self.journal = [] # Undo entries: ('rename', from, to) or ('mkdir', path)
+        self.moved_paths = [] # (old absolute path, new absolute path or None if deleted), in order
+        # Hidden, so library scans skip it if it can't be removed
+        self.trash_dir = os.path.join(self.media_root_dir, f"{TRASH_PREFIX}{int(time.time() * 1000)}")
+
+    def _resolve(self, rel_path):
+        """Returns the absolute path for a safe path below the media root, or raises ValueError."""
+        if not isinstance(rel_path, str) or not rel_path.strip('/'):
+            raise ValueError(f"Invalid path: {rel_path!r}")
+        if not self.is_safe_path(rel_path):
+            raise ValueError(f"Access denied: {rel_path}")
+        abs_path = os.path.abspath(os.path.join(self.media_root_dir, rel_path))
+        if abs_path == self.media_root_dir:
+            raise ValueError("The media root itself cannot be changed")
+        return abs_path
+
+    def _plan(self):
+        """Validates every operation up front and returns them as absolute-path steps."""
+        if not isinstance(self.operations, list) or not self.operations:
+            raise ValueError("No operations provided")
+
+        steps = []
+        for op in self.operations:
+            kind = op.get('op') if isinstance(op, dict) else None
+            if kind not in self.OPERATIONS:
+                raise ValueError(f"Unknown operation: {op!r}")
+            if kind == 'move':
+                steps.append(('move', self._resolve(op.get('src')), self._resolve(op.get('dst'))))
+            elif kind == 'rename':
+                name = op.get('name')
+                if not name or name in ('.', '..') or '/' in name or '\\' in name:
+                    raise ValueError(f"Invalid name: {name!r}")
+                src = self._resolve(op.get('path'))
+                steps.append(('move', src, self._resolve(os.path.join(os.path.dirname(os.path.relpath(src, self.media_root_dir)), name))))
+            else:
+                steps.append((kind, self._resolve(op.get('path'))))
+        return steps
+
+    def _makedirs(self, path):
+        """Creates a directory and any missing parents, journaling each one created."""
+        missing = []
+        while not os.path.exists(path):
+            missing.append(path)
+            path = os.path.dirname(path)
+        for directory in reversed(missing):
+            os.mkdir(directory)
+            self.journal.append(('mkdir', directory))
+
+    def _rename(self, src, dst):
+        if not os.path.exists(src):
+            raise FileNotFoundError(f"Not found: {os.path.relpath(src, self.media_root_dir)}")
+        if os.path.exists(dst):
+            raise FileExistsError(f"Already exists: {os.path.relpath(dst, self.media_root_dir)}")
+        self._makedirs(os.path.dirname(dst))
+        os.rename(src, dst)
+        self.journal.append(('rename', src, dst))
+
+    def _apply_step(self, step):
+        kind = step[0]
+        if kind == 'move':
+            _, src, dst = step
+            if dst == src or dst.startswith(src + os.sep):
+                raise ValueError(f"Cannot move {os.path.relpath(src, self.media_root_dir)} into itself")
+            self._rename(src, dst)
+            self.moved_paths.append((src, dst))
+        elif kind == 'delete':
+            _, path = step
+            self._makedirs(self.trash_dir)
+            self._rename(path, os.path.join(self.trash_dir, str(len(self.journal))))
+            self.moved_paths.append((path, None))
+        elif kind == 'mkdir':
+            _, path = step
+            if os.path.exists(path):
+                raise FileExistsError(f"Already exists: {os.path.relpath(path, self.media_root_dir)}")
+            self._makedirs(path)
+
+    def _rollback(self):
+        """Undoes the journal in reverse order."""
+        for entry in reversed(self.journal):
+            try:
+                if entry[0] == 'rename':
+                    os.rename(entry[2], entry[1])
+                else:
+                    os.rmdir(entry[1])
+            except OSError as e:
+                logger.error(f"Batch rollback: could not undo {entry}: {e}")
+        self.journal = []
+        self.moved_paths = []
+
+    def _empty_old_trash(self):
+        """Removes trash folders that earlier batches could not remove completely."""
+        for name in os.listdir(self.media_root_dir):
+            if name.startswith(TRASH_PREFIX):
+                shutil.rmtree(os.path.join(self.media_root_dir, name), onerror=self._trash_error)
+
+    @staticmethod
+    def _trash_error(function, path, exc_info):
+        logger.warning(f"Batch: Could not remove {path} from the trash ({exc_info[1]}), retrying with the next batch.")
+
+    def apply(self):
+        """Runs the batch. Returns (result dict, HTTP status code)."""
+        try:
+            steps = self._plan()
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        with batch_lock:
+            self._empty_old_trash()
+            for index, step in enumerate(steps):
+                try:
+                    self._apply_step(step)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Batch operation {index} failed, rolling back: {e}")
+                    self._rollback()
+                    return {"error": str(e), "failed_index": index}, 409
+
+            # Commit: deleted entries are only removed once everything succeeded
+            if os.path.exists(self.trash_dir):
+                shutil.rmtree(self.trash_dir, onerror=self._trash_error)
+
+        logger.info(f"Batch applied: {len(steps)} operations")
+        return {"status": "ok", "applied": len(steps)}, 200
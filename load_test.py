@@ -0,0 +1,389 @@
+# load_test.py
+# Load test of the web interface with simulated playback. Serves the real Flask
+# app from this process (as the player does unless WEB_SERVER_PROCESS is on)
+# over a generated library, with a simulated VLC pushing frames through the
+# same path as display_cb (frame copy, screen mirror, SpiTransferEngine on a
+# SimulatedPanel with the bus timing of SPI_SPEED_HZ). Clients run in a separate
+# process and replay a weighted mix of requests while frame presentation is
+# timed, first idle, then under load. Runs without the display, VLC or buttons.
+#
+#   python3 load_test.py [--clients 8] [--seconds 30] [--mix status=40,browse=20,search=10,media=20,upload=10]
+#                        [--json report.json] [--compare previous.json]
+import argparse
+import ctypes
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+import numpy as np
+from PIL import Image
+
+import config
+from command_dispatcher import CommandDispatcher
+from media_manager import MediaManager
+from mirror_manager import MirrorManager
+from spi_transfer import SpiTransferEngine, SimulatedPanel, SimulatedSpiDevice
+
+WIDTH = 240
+HEIGHT = 240
+UPLOAD_DIR = 'Load_Test_Uploads' # Below the media root; removed afterwards
+DEFAULT_MIX = 'status=40,browse=20,search=10,media=20,upload=10'
+
+# --- Simulated player ---
+class SimulatedVideo:
+    """
+    Stands in for VLC and the panel. Frames are due every 1/fps seconds and
+    presented like display_cb does; a frame more than one period late is
+    dropped, as VLC would.
+    """
+    def __init__(self, fps, content='video'):
+        self.period = 1.0 / fps
+        self.buffer = ctypes.create_string_buffer(WIDTH * HEIGHT * 3)
+        self.engine = SpiTransferEngine(SimulatedPanel(WIDTH, HEIGHT, SimulatedSpiDevice(config.SPI_SPEED_HZ)), WIDTH, HEIGHT)
+        self.mirror = MirrorManager()
+        self.frames = make_frames(content)
+        self.position = 0.0
+
+    def run(self, seconds):
+        """Presents frames for `seconds` on the calling thread; returns their timing."""
+        lateness = []
+        intervals = []
+        dropped = 0
+        start = time.perf_counter()
+        last_done = None
+        due_index = 0
+        while True:
+            due = start + due_index * self.period
+            if due - start >= seconds:
+                break
+            now = time.perf_counter()
+            if now < due:
+                time.sleep(due - now)
+            elif now - due > self.period:
+                skipped = int((now - due) / self.period)
+                dropped += skipped
+                due_index += skipped
+                continue
+            self.present(self.frames[due_index % len(self.frames)])
+            done = time.perf_counter()
+            lateness.append(done - due)
+            if last_done is not None:
+                intervals.append(done - last_done)
+            last_done = done
+            due_index += 1
+            self.position += self.period
+        return summarize_frames(lateness, intervals, dropped, self.period, seconds)
+
+    def present(self, frame):
+        ctypes.memmove(self.buffer, frame, len(frame)) # VLC's decoder writing the picture
+        image = Image.frombytes("RGB", (WIDTH, HEIGHT), self.buffer.raw, "raw", "RGB")
+        self.mirror.publish(image)
+        self.engine.write(image)
+
+def make_frames(content, count=48):
+    """Returns raw RGB frames: new noise every frame ('video') or a square moving over a still ('animation')."""
+    rng = np.random.default_rng(0)
+    if content == 'video':
+        return [rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8).tobytes() for _ in range(count)]
+    background = rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = i * (WIDTH - 40) // count
+        frame[HEIGHT // 2:HEIGHT // 2 + 40, x:x + 40] = (255, 200, 0)
+        frames.append(frame.tobytes())
+    return frames
+
+class SimulatedPlayer:
+    """
+    Stands in for MainApp behind the Flask routes: the library, search index,
+    uploads and rescans are the real ones, playback is a SimulatedVideo.
+    """
+    def __init__(self, media_root_dir, video):
+        self.media_manager = MediaManager(media_root_dir)
+        self.video = video
+        self.display_manager = type('SimulatedDisplay', (), {'mirror': video.mirror})()
+        self.dispatcher = CommandDispatcher()
+        self.dispatcher.register('rescan_library', lambda count=1: self.media_manager.scan_media(), coalesce_window=0)
+        thread = threading.Thread(target=self.dispatcher.run_forever, name="DispatcherThread")
+        thread.daemon = True
+        thread.start()
+
+    def get_playback_status(self):
+        episode_path = self.media_manager.get_current_episode_path() or ''
+        return {
+            'is_playing': True,
+            'current_time': self.video.position,
+            'duration': 1320.0,
+            'episode_path': os.path.relpath(episode_path, self.media_manager.media_root_dir).replace("\\", "/") if episode_path else '',
+            'show_info': self.media_manager.get_current_episode_info(),
+            'first_frame_ms': None,
+            'transition_gap_ms': None,
+        }
+
+    def is_safe_path(self, path_to_check):
+        base_path = os.path.abspath(self.media_manager.media_root_dir)
+        check_path = os.path.abspath(os.path.join(base_path, path_to_check))
+        return os.path.commonpath([base_path]) == os.path.commonpath([base_path, check_path])
+
+    def handle_upload(self, file_stream, filename):
+        from library_batch import save_upload
+        if save_upload(self.media_manager.media_root_dir, file_stream, filename, self.is_safe_path):
+            self.dispatcher.submit('rescan_library')
+
+    def search_library(self, query, limit=None):
+        return self.media_manager.search_index.search(query, limit or config.SEARCH_MAX_RESULTS)
+
+def make_library(root, shows, seasons, episodes, episode_kb):
+    """Creates a library of sparse episode files, so it costs no disk space."""
+    for show in range(shows):
+        for season in range(seasons):
+            season_dir = os.path.join(root, f"Show {show + 1:02d}", f"Season {season + 1}")
+            os.makedirs(season_dir, exist_ok=True)
+            for episode in range(episodes):
+                with open(os.path.join(season_dir, f"S{season + 1:02d}E{episode + 1:02d}.mp4"), 'wb') as f:
+                    f.truncate(episode_kb * 1024)
+
+# --- Clients ---
+def _get(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        while response.read(64 * 1024):
+            pass
+
+def _upload(base_url, data):
+    boundary = uuid.uuid4().hex
+    filename = f"{UPLOAD_DIR}/Season 1/{uuid.uuid4().hex[:12]}.mp4"
+    body = b''.join((
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files[]"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode(),
+        data,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ))
+    request = urllib.request.Request(f"{base_url}/upload", data=body,
+                                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        response.read()
+
+def _client(base_url, mix, deadline, library, upload_bytes, seed, results):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        if name == 'status':
+            action = lambda: _get(f"{base_url}/status")
+        elif name == 'browse':
+            action = lambda: _get(f"{base_url}/browse/{urllib.parse.quote(rng.choice(library['dirs']))}")
+        elif name == 'search':
+            action = lambda: _get(f"{base_url}/search?q={urllib.parse.quote(rng.choice(library['queries']))}")
+        elif name == 'media':
+            action = lambda: _get(f"{base_url}/media/{urllib.parse.quote(rng.choice(library['files']))}")
+        else:
+            action = lambda: _upload(base_url, rng.randbytes(upload_bytes))
+        start = time.perf_counter()
+        try:
+            action()
+            results[name]['latencies'].append(time.perf_counter() - start)
+        except Exception:
+            results[name]['errors'] += 1
+
+def run_clients(base_url, mix, clients, seconds, library, upload_bytes, queue):
+    """Client process: `clients` threads replay the mix for `seconds`, then the timings go back on `queue`."""
+    results = {name: {'latencies': [], 'errors': 0} for name in mix}
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=_client, args=(base_url, mix, deadline, library, upload_bytes, i, results))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put(results)
+
+# --- Report ---
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers, or None if it's empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+def summarize_frames(lateness, intervals, dropped, period, seconds):
+    return {
+        'frames': len(lateness),
+        'fps': round(len(lateness) / seconds, 2),
+        'dropped': dropped,
+        'late_frames': sum(1 for value in lateness if value > period / 2),
+        'lateness_p50_ms': _ms(percentile(lateness, 0.5)),
+        'lateness_p95_ms': _ms(percentile(lateness, 0.95)),
+        'lateness_p99_ms': _ms(percentile(lateness, 0.99)),
+        'lateness_max_ms': _ms(max(lateness, default=None)),
+        'interval_jitter_ms': _ms(statistics.pstdev(intervals)) if len(intervals) > 1 else None,
+    }
+
+def summarize_requests(results, seconds):
+    summary = {}
+    for name, result in results.items():
+        latencies = result['latencies']
+        summary[name] = {
+            'count': len(latencies),
+            'errors': result['errors'],
+            'per_second': round(len(latencies) / seconds, 2),
+            'p50_ms': _ms(percentile(latencies, 0.5)),
+            'p95_ms': _ms(percentile(latencies, 0.95)),
+            'p99_ms': _ms(percentile(latencies, 0.99)),
+            'max_ms': _ms(max(latencies, default=None)),
+        }
+    return summary
+
+def _version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def print_report(report):
+    settings = report['settings']
+    print(f"\n{settings['clients']} clients for {settings['seconds']:g}s, mix {settings['mix']} ({report['version'] or 'unknown version'})")
+    print(f"{'request':<10} {'count':>7} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, r in report['requests'].items():
+        print(f"{name:<10} {r['count']:>7} {r['errors']:>6} {r['per_second']:>7} {r['p50_ms']!s:>8} "
+              f"{r['p95_ms']!s:>8} {r['p99_ms']!s:>8} {r['max_ms']!s:>8}")
+    print(f"\nPlayback at {settings['fps']:g} fps ({settings['content']}):")
+    print(f"{'':<11} {'fps':>6} {'dropped':>7} {'late':>5} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'jitter ms':>9}")
+    for phase, p in report['playback'].items():
+        print(f"{phase:<11} {p['fps']:>6} {p['dropped']:>7} {p['late_frames']:>5} {p['lateness_p95_ms']!s:>8} "
+              f"{p['lateness_p99_ms']!s:>8} {p['lateness_max_ms']!s:>8} {p['interval_jitter_ms']!s:>9}")
+
+def print_comparison(previous, report):
+    """Prints p95 latencies and playback under load next to an earlier report."""
+    def change(old, new):
+        if old is None or new is None:
+            return f"{old!s:>8} -> {new!s:<8}"
+        delta = f"{(new - old) / old:+.0%}" if old else ''
+        return f"{old:>8} -> {new:<8} {delta}"
+
+    print(f"\nCompared with {previous.get('version') or 'previous report'}:")
+    for name, r in report['requests'].items():
+        old = previous.get('requests', {}).get(name)
+        if old:
+            print(f"  {name + ' p95 ms':<22} {change(old['p95_ms'], r['p95_ms'])}")
+    old_load, load = previous.get('playback', {}).get('under load'), report['playback']['under load']
+    if old_load:
+        for key in ('fps', 'dropped', 'lateness_p99_ms', 'interval_jitter_ms'):
+            print(f"  {'load ' + key:<22} {change(old_load[key], load[key])}")
+
+# --- Main ---
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('status', 'browse', 'search', 'media', 'upload'):
+            sys.exit(f"Unknown request type in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the web interface and measure the effect on simulated playback.")
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent clients (phones)")
+    parser.add_argument('--seconds', type=float, default=30, help="Duration of the load phase")
+    parser.add_argument('--idle-seconds', type=float, default=10, help="Playback measured without load first")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Request weights: status, browse, search, media, upload")
+    parser.add_argument('--upload-kb', type=int, default=2048, help="Size of each upload")
+    parser.add_argument('--fps', type=float, default=24, help="Frame rate of the simulated video")
+    parser.add_argument('--content', choices=('video', 'animation'), default='video', help="Every pixel changing, or mostly static frames")
+    parser.add_argument('--media-root', help="Existing library to serve (default: a generated one)")
+    parser.add_argument('--shows', type=int, default=12, help="Shows in the generated library")
+    parser.add_argument('--episode-kb', type=int, default=4096, help="Size of each generated (sparse) episode")
+    parser.add_argument('--port', type=int, default=5099, help="Port for the test server")
+    parser.add_argument('--json', help="Write the report to this file")
+    parser.add_argument('--compare', help="Earlier report to compare with")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING) # One line per request otherwise
+    import web_server
+
+    generated = args.media_root is None
+    media_root = tempfile.mkdtemp(prefix='pitv-load-') if generated else os.path.abspath(args.media_root)
+    try:
+        if generated:
+            make_library(media_root, args.shows, 3, 10, args.episode_kb)
+        video = SimulatedVideo(args.fps, args.content)
+        player = SimulatedPlayer(media_root, video)
+        files = [os.path.relpath(path, media_root) for show in player.media_manager.shows
+                 for season in show['seasons'] for path in season['episodes']]
+        if not files:
+            sys.exit(f"No media found in {media_root}")
+        library = {
+            'dirs': sorted({os.path.dirname(path) for path in files} | {path.split(os.sep)[0] for path in files}),
+            'files': files,
+            'queries': sorted({word[:3] for show in player.media_manager.shows for word in show['name'].split()}),
+        }
+
+        server = threading.Thread(target=web_server.run_web_server, args=(player, '127.0.0.1', args.port), name="WebServerThread")
+        server.daemon = True
+        server.start()
+        base_url = f"http://127.0.0.1:{args.port}"
+        for _ in range(50):
+            try:
+                _get(f"{base_url}/health")
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        print(f"Playback without load for {args.idle_seconds:g}s...")
+        playback = {'idle': video.run(args.idle_seconds)}
+
+        print(f"{args.clients} clients for {args.seconds:g}s...")
+        context = multiprocessing.get_context('spawn') # A fresh interpreter: its GIL isn't the player's
+        queue = context.Queue()
+        clients = context.Process(target=run_clients, args=(base_url, mix, args.clients, args.seconds, library,
+                                                            args.upload_kb * 1024, queue))
+        clients.start()
+        playback['under load'] = video.run(args.seconds)
+        results = queue.get(timeout=args.seconds + 300) # Uploads still in flight finish first
+        clients.join()
+        web_server.stop_web_server()
+    finally:
+        if generated:
+            shutil.rmtree(media_root, ignore_errors=True)
+        else:
+            shutil.rmtree(os.path.join(media_root, UPLOAD_DIR), ignore_errors=True)
+
+    report = {
+        'version': _version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'settings': {'clients': args.clients, 'seconds': args.seconds, 'mix': args.mix, 'upload_kb': args.upload_kb,
+                     'fps': args.fps, 'content': args.content, 'library_files': len(files)},
+        'requests': summarize_requests(results, args.seconds),
+        'playback': playback,
+    }
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
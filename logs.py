@@ -0,0 +1,151 @@
+# logs.py
+# Logging for the player, web and presenter processes. Records are rate
+# limited per line of code, kept in an in-memory ring (served at /logs), and
+# written to stderr (the journal, under systemd) in batches: one write every
+# LOG_FLUSH_INTERVAL seconds or LOG_BUFFER_RECORDS records, instead of one per
+# message. A burst of identical errors costs at most LOG_RATE_LIMIT_BURST lines
+# per interval and a count of what was left out.
+import logging
+import sys
+import threading
+import time
+from collections import deque
+
+import config
+import memory_budget
+import metrics
+
+LOG_RECORDS = metrics.counter('pitv_log_records_total', 'Log records accepted after rate limiting.')
+LOG_SUPPRESSED = metrics.counter('pitv_log_suppressed_total', 'Log records dropped by per-line rate limiting.')
+LOG_WRITES = metrics.counter('pitv_log_writes_total', 'Batched log writes to stderr/the journal.')
+
+_ring = None
+_configured = False
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through `burst` records per `interval` seconds from each call site
+    (file and line). The first record after a quiet spell notes how many were
+    suppressed. The decision is stored on the record, so one instance can sit
+    on several handlers.
+    """
+    def __init__(self, burst=config.LOG_RATE_LIMIT_BURST, interval=config.LOG_RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sites = {} # (pathname, lineno) -> [window start, records in window, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        allowed = getattr(record, 'rate_allowed', None)
+        if allowed is not None:
+            return allowed
+        now = record.created
+        with self.lock:
+            site = self.sites.setdefault((record.pathname, record.lineno), [now, 0, 0])
+            if now - site[0] >= self.interval:
+                site[0], site[1] = now, 0
+            site[1] += 1
+            allowed = site[1] <= self.burst
+            if not allowed:
+                site[2] += 1
+            elif site[2]:
+                record.msg = f"{record.msg} ({site[2]} similar messages suppressed)"
+                site[2] = 0
+        (LOG_RECORDS if allowed else LOG_SUPPRESSED).inc()
+        record.rate_allowed = allowed
+        return allowed
+
+class RingHandler(logging.Handler):
+    """Keeps the newest records as dicts for /logs."""
+    def __init__(self, capacity=config.LOG_RING_RECORDS):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        message = record.getMessage()
+        if record.exc_info:
+            message += '\n' + logging.Formatter().formatException(record.exc_info)
+        self.records.append({'time': round(record.created, 3), 'level': record.levelname, 'logger': record.name,
+                             'thread': record.threadName, 'message': message})
+
+class BatchingHandler(logging.Handler):
+    """
+    Formats records into a buffer and writes the buffer to `stream` in one
+    call when it fills up, on a timer, for CRITICAL records and at exit.
+    """
+    def __init__(self, stream, capacity=config.LOG_BUFFER_RECORDS, flush_interval=config.LOG_FLUSH_INTERVAL):
+        super().__init__()
+        self.stream = stream
+        self.capacity = capacity
+        self.buffer = []
+        thread = threading.Thread(target=self._flush_periodically, args=(flush_interval,), name="LogFlushThread")
+        thread.daemon = True
+        thread.start()
+
+    def _flush_periodically(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.buffer) >= self.capacity or record.levelno >= logging.CRITICAL:
+            self._write()
+
+    def flush(self):
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        """Writes and clears the buffer; the caller holds the handler lock."""
+        if not self.buffer:
+            return
+        data = '\n'.join(self.buffer) + '\n'
+        self.buffer = []
+        try:
+            self.stream.write(data)
+            self.stream.flush()
+            LOG_WRITES.inc()
+        except (OSError, ValueError):
+            pass # Nowhere left to report it
+
+def setup(process_name=None):
+    """Configures the root logger for this process. Safe to call more than once."""
+    global _ring, _configured
+    if _configured:
+        return
+    _configured = True
+
+    rate_limit = RateLimitFilter()
+    _ring = RingHandler()
+    _ring.setLevel(config.LOG_RING_LEVEL)
+    _ring.addFilter(rate_limit)
+
+    # The journal adds timestamps of its own
+    prefix = f"[{process_name}] " if process_name else ""
+    journal = BatchingHandler(sys.stderr)
+    journal.setLevel(config.LOG_LEVEL)
+    journal.setFormatter(logging.Formatter(prefix + '%(levelname)s %(name)s: %(message)s'))
+    journal.addFilter(rate_limit)
+
+    root = logging.getLogger()
+    root.setLevel(min(logging.getLevelName(config.LOG_LEVEL), logging.getLevelName(config.LOG_RING_LEVEL)))
+    root.addHandler(_ring)
+    root.addHandler(journal)
+    memory_budget.register('log ring', lambda: memory_budget.deep_size(_ring.records))
+
+def get_records(level='DEBUG', limit=200, since=None):
+    """Returns up to `limit` of the newest ring records at `level` or above, newer than `since` (epoch seconds)."""
+    if _ring is None:
+        return []
+    levelno = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    if not isinstance(levelno, int):
+        levelno = logging.DEBUG
+    records = [record for record in list(_ring.records)
+               if logging.getLevelName(record['level']) >= levelno and (since is None or record['time'] > since)]
+    return records[-limit:] if limit else records
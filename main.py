@@ -1,12 +1,22 @@
 # main.py (Updated for gpiozero and stability)
+import startup_timeline # First, so the startup timeline begins at process start
+import memory_budget
+memory_budget.start_profiling() # Opt-in (MEMORY_PROFILING); early, so imports are traced too
+arenas_limited = memory_budget.apply_low_memory_mode() # Before any thread, including the log flusher below
+import logs
+logs.setup() # Before anything below logs
+if arenas_limited:
+    memory_budget.logger.info("Low-memory mode: malloc arenas limited to 2.")
 from gpiozero import Button, HoldMixin
 from signal import pause
+import logging
 import time
 import os
 import vlc
 import atexit
 import ctypes
 from PIL import Image
+import sys
 import threading
 
 import config
@@ -15,13 +25,29 @@ from display_manager import DisplayManager
 from audio_manager import AudioManager
 from state_manager import StateManager
 from menu_manager import MenuManager
-from web_server import start_web_server_thread, stop_web_server, socketio
+from command_dispatcher import CommandDispatcher
+from library_batch import LibraryBatch, relocate_path, save_upload
+from remux_manager import RemuxManager
+from prefetch_manager import PrefetchManager
+from health_monitor import PlaybackHealthMonitor
+from power_manager import PowerManager
+from dedup_index import DedupIndex
+import decode_profiles
+import metrics
+import tracer
+# The web stack (Flask, Socket.IO) is imported lazily by web_server_module()
+logger = logging.getLogger(__name__)
+startup_timeline.mark("imports done")
 
 # --- Ensure Media Directory Exists ---
 os.makedirs(config.MEDIA_ROOT_DIR, exist_ok=True)
 
+# --- Wait for Hardware ---
+# Probe for SPI, GPIO and ALSA with backoff instead of sleeping a fixed time
+startup_timeline.wait_for_hardware()
+
 # --- Global Application State & Managers ---
-vlc_instance = vlc.Instance("--aout=alsa", "--quiet", "--no-video-title-show", "--no-xlib")
+vlc_instance = vlc.Instance(*config.VLC_ARGS)
 media_player = vlc_instance.media_player_new()
 event_manager = media_player.event_manager()
 
@@ -30,10 +56,41 @@ display_manager = DisplayManager()
 audio_manager = AudioManager()
 state_manager = StateManager(config.STATE_FILE_PATH)
 menu_manager = MenuManager(media_manager, state_manager)
+prefetch_manager = PrefetchManager(vlc_instance)
+dedup_index = DedupIndex(config.MEDIA_ROOT_DIR)
+startup_timeline.mark("managers ready")
+# All player commands run on the thread that runs the dispatcher (the main thread)
+dispatcher = CommandDispatcher()
+# Degrading restarts the episode, so the sampler hands it to the dispatcher
+health_monitor = PlaybackHealthMonitor(media_player, on_degrade=lambda path, level: dispatcher.submit('apply_decode_level', path))
+power_manager = PowerManager(media_player)
 
 is_sleeping = False
 is_playing = False
-media_ended_flag = False
+
+FIRST_FRAME_SECONDS = metrics.histogram('pitv_first_frame_seconds', 'Time from a track change to its first decoded frame.')
+TRANSITION_GAP_SECONDS = metrics.histogram('pitv_transition_gap_seconds', 'Time from end-of-stream to the next episode\'s first frame.')
+WAKE_TO_FRAME_SECONDS = metrics.histogram('pitv_wake_to_first_frame_seconds', 'Time from a wake-up to the first video frame on the panel.')
+UPLOAD_BYTES = metrics.counter('pitv_upload_bytes_total', 'Bytes received through /upload.')
+UPLOAD_THROUGHPUT = metrics.histogram('pitv_upload_throughput_bytes_per_second', 'Write throughput of individual uploaded files.',
+                                      buckets=(256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6, 32e6))
+
+startup_reported = False
+
+# Set when the web server runs in its own process (config.WEB_SERVER_PROCESS)
+ipc_server = None
+web_supervisor = None
+
+# Track change -> first frame timing (set on the dispatcher thread, read on VLC's)
+track_change_time = None
+last_first_frame_ms = None
+# End-of-stream -> first frame of the next episode
+media_end_time = None
+last_transition_gap_ms = None
+# Wake-up -> first frame on the panel
+sleep_start_time = None
+wake_time = None
+last_wake_to_frame_ms = None
 
 # --- Video Buffer Setup ---
 VIDEO_WIDTH = 240
@@ -45,6 +102,12 @@ video_buffer = ctypes.create_string_buffer(VIDEO_BUFFER_SIZE)
 # --- VLC Video Callbacks ---
 @vlc.CallbackDecorators.VideoLockCb
 def lock_cb(opaque, planes):
+    presenter = display_manager.presenter
+    if presenter:
+        # Decode straight into the next shared-memory ring slot; its number identifies the picture
+        slot = presenter.acquire_slot()
+        planes[0] = presenter.addresses[slot]
+        return slot + 1
     # Tell VLC to write into our pre-allocated buffer
     planes[0] = ctypes.cast(video_buffer, ctypes.c_void_p)
 
@@ -57,8 +120,35 @@ def unlock_cb(opaque, picture, planes):
 @vlc.CallbackDecorators.VideoDisplayCb
 def display_cb(opaque, picture):
     """Called by VLC when a frame is ready to be displayed."""
+    global track_change_time, last_first_frame_ms, media_end_time, last_transition_gap_ms, wake_time, last_wake_to_frame_ms
+    if track_change_time is not None:
+        now = time.monotonic()
+        last_first_frame_ms = (now - track_change_time) * 1000
+        FIRST_FRAME_SECONDS.observe(last_first_frame_ms / 1000)
+        track_change_time = None
+        logger.info(f"First frame after {last_first_frame_ms:.0f} ms")
+        if not startup_reported:
+            report_startup()
+        if media_end_time is not None:
+            last_transition_gap_ms = (now - media_end_time) * 1000
+            TRANSITION_GAP_SECONDS.observe(last_transition_gap_ms / 1000)
+            media_end_time = None
+            logger.info(f"Episode transition gap: {last_transition_gap_ms:.0f} ms")
+
     if is_sleeping: return
     if menu_manager.active: return
+    if power_manager.audio_only: return # A frame decoded before the video track was deselected
+
+    if wake_time is not None and time.time() >= display_manager.overlay_expiry_time:
+        last_wake_to_frame_ms = (time.monotonic() - wake_time) * 1000
+        WAKE_TO_FRAME_SECONDS.observe(last_wake_to_frame_ms / 1000)
+        wake_time = None
+        logger.info(f"Wake to first frame: {last_wake_to_frame_ms:.0f} ms")
+
+    if display_manager.presenter:
+        # The presenter process converts and sends the frame; we only pass on which slot it is in
+        display_manager.present_video_slot(picture - 1)
+        return
 
     # Create a PIL Image from the raw buffer data
     # 'RV24' corresponds to RGB
@@ -67,7 +157,7 @@ def display_cb(opaque, picture):
         
         display_manager.display_frame(img)
     except Exception as e:
-        print(f"Frame error: {e}")
+        logger.error(f"Frame error: {e}")
 
 # --- Button Setup (using gpiozero) ---
 # Button with hold capability for Rewind (Long) / Volume (Short)
@@ -79,10 +169,14 @@ button_bl = Button(config.BUTTON_BL, pull_up=True, bounce_time=0.05, hold_time=c
 # Button with hold capability for fast forward
 button_br = Button(config.BUTTON_BR, pull_up=True, bounce_time=0.05, hold_time=config.LONG_PRESS_THRESHOLD)
 
+# Menu scroll button being held (A up, X down); set by button callbacks, read by the 'menu_repeat' timer
+menu_repeat = {'button': None, 'direction': 0, 'start': 0.0, 'moved': False}
+
 # --- Core Functions ---
+@tracer.traced()
 def save_current_state():
     """Saves the current playback state to a file."""
-    playback_pos = media_player.get_time() / 1000.0 if media_player.is_playing() else 0
+    playback_pos = media_player.get_time() / 1000.0 if media_player.get_state() in (vlc.State.Playing, vlc.State.Paused) else 0
     state_manager.save_state(
         current_show_idx=media_manager.current_show_idx,
         current_season_idx=media_manager.current_season_idx,
@@ -93,43 +187,109 @@ def save_current_state():
         shuffle_enabled=media_manager.shuffle_enabled,
         web_server_enabled=state_manager.get_state().get('web_server_enabled', True)
     )
-    print(f"State saved at position: {playback_pos:.2f}s")
+    logger.debug(f"State recorded at position: {playback_pos:.2f}s")
 
+@tracer.traced()
 def start_playback(episode_path, resume_position_s=0):
-    """Starts or resumes playback of a given media file."""
-    global is_playing
+    """Starts or resumes playback of a given media file. Returns without waiting for VLC."""
+    global is_playing, track_change_time, wake_time
     if not episode_path or not os.path.exists(episode_path):
-        print(f"Error: Episode not found at {episode_path}")
+        logger.error(f"Episode not found at {episode_path}")
+        wake_time = None # No frame is coming
         display_manager.show_playback_info(media_manager.get_current_episode_info(), "Error", "File Not Found", audio_manager.get_current_volume(), False)
         is_playing = False
         return
 
-    print(f"Starting playback: {os.path.basename(episode_path)}")
-    media = vlc_instance.media_new(episode_path)
+    logger.info(f"Starting playback: {os.path.basename(episode_path)}")
+    # No frames are shown in audio-only mode, so there is no first frame to time
+    track_change_time = None if power_manager.audio_only else time.monotonic()
+    # Episodes that struggled before play with cheaper decode settings (or a lighter file)
+    play_path, degrade_options = health_monitor.get_decode_settings(episode_path)
+    # The device/file decode profile comes first so degrade levels can override it
+    decode_options = decode_profiles.get_decode_options(episode_path, media_manager.media_root_dir) + degrade_options
+    # Use the prefetched media if this is the episode we prepared
+    media = prefetch_manager.take(play_path) or vlc_instance.media_new(play_path)
+    for option in decode_options:
+        media.add_option(option)
+    if resume_position_s > 0:
+        # VLC seeks while opening the input, so resume works however long parsing takes
+        media.add_option(f"start-time={resume_position_s:.3f}")
     media_player.set_media(media)
     media_player.play()
     is_playing = True
-
-    # It takes a moment for the media to be parsed; we wait briefly before setting time
-    time.sleep(0.5)
-    if resume_position_s > 0:
-        media_player.set_time(int(resume_position_s * 1000))
+    health_monitor.track(episode_path)
+    prefetch_manager.prepare(media_manager.peek_next_episode_path())
 
     update_display()
-    # Notify web clients of the new episode
-    socketio.emit('new_episode', main_app.get_playback_status())
-
+    # Notify web clients of the new episode (VLC may not report the resume position yet)
+    web_server = web_server_module(load=False)
+    if web_server or ipc_server:
+        status = main_app.get_playback_status()
+        status['current_time'] = max(status['current_time'], resume_position_s)
+        if web_server:
+            web_server.socketio.emit('new_episode', status)
+        else:
+            ipc_server.publish('new_episode', status) # Emitted by the web process
+
+def web_server_module(load=True):
+    """
+    Returns the web_server module, importing Flask and Socket.IO on first use.
+    With load=False, returns None unless the web stack was already imported.
+    """
+    if not load:
+        return sys.modules.get('web_server')
+    import web_server
+    return web_server
+
+def start_web_server(app):
+    """
+    Starts the web server: as threads in this process, or with WEB_SERVER_PROCESS
+    as a separate, niced process that reaches the player over local IPC.
+    """
+    global ipc_server, web_supervisor
+    if not config.WEB_SERVER_PROCESS:
+        web_server_module().start_web_server_thread(app)
+        return
+    from web_ipc import PlayerIpcServer, WebProcessSupervisor
+    if not ipc_server:
+        ipc_server = PlayerIpcServer(app)
+        ipc_server.start()
+        web_supervisor = WebProcessSupervisor(ipc_server)
+    web_supervisor.start()
+
+def stop_web_server():
+    """Stops the web server, whichever way it was started."""
+    if web_supervisor:
+        web_supervisor.stop()
+    else:
+        web_server_module().stop_web_server()
+
+def report_startup():
+    """Marks the first frame and prints where the startup time went."""
+    global startup_reported
+    startup_reported = True
+    startup_timeline.mark("first frame")
+    startup_timeline.print_report()
+    if config.MEMORY_PROFILING:
+        # Later growth is reported against this; the snapshot is slow, so keep it off the frame path
+        threading.Thread(target=memory_budget.mark_baseline, name="MemoryBaselineThread", daemon=True).start()
+
+@tracer.traced()
 def stop_playback():
     """Stops the VLC media player."""
     global is_playing
     if media_player.is_playing():
         media_player.stop()
     is_playing = False
-    print("Playback stopped.")
-
-def update_display():
-    """Updates the screen with the current playback info."""
-    if is_sleeping:
+    logger.info("Playback stopped.")
+
+@tracer.traced()
+def update_display(refresh_only=False):
+    """
+    Updates the screen with the current playback info.
+    refresh_only: redraw in place without counting as user activity (clock ticks).
+    """
+    if is_sleeping or power_manager.audio_only:
         return
 
     if menu_manager.active:
@@ -145,7 +305,8 @@ def update_display():
             total_time_str=format_time(total_duration_s),
             volume_percent=audio_manager.get_current_volume(),
             is_playing=media_player.is_playing(),
-            is_shuffled=media_manager.shuffle_enabled
+            is_shuffled=media_manager.shuffle_enabled,
+            refresh_only=refresh_only
         )
 
 def format_time(seconds):
@@ -154,13 +315,20 @@ def format_time(seconds):
     return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
 
 # --- Button Handlers ---
-def handle_next_episode():
+# These run on the dispatcher thread only. Handlers registered with a coalesce
+# window receive `count`, the number of identical presses merged into this call.
+def handle_next_episode(count=1):
     if is_sleeping: wake_up(); return
+    if power_manager.audio_only: exit_audio_only(); return
     
     if menu_manager.active:
-        # Menu Mode: Select / Enter
-        print("Menu: Select")
+        # Menu Mode: Select / Enter (repeated presses go deeper until something plays)
+        logger.debug("Menu: Select")
         result = menu_manager.select()
+        for _ in range(count - 1):
+            if result is not None:
+                break
+            result = menu_manager.select()
         
         if result == "TOGGLE_WEB_SERVER":
              current_state = state_manager.get_state().get('web_server_enabled', True)
@@ -172,10 +340,10 @@ def handle_next_episode():
              
              # Handle Server
              if new_state:
-                 print("Enabling Web Server...")
-                 start_web_server_thread(main_app)
+                 logger.info("Enabling Web Server...")
+                 start_web_server(main_app)
              else:
-                 print("Disabling Web Server...")
+                 logger.info("Disabling Web Server...")
                  stop_web_server()
                  
              update_display()
@@ -183,7 +351,7 @@ def handle_next_episode():
         elif result:
             # Play selection
             show_idx, season_idx, episode_idx = result
-            print(f"Menu: Playing selection {show_idx}-{season_idx}-{episode_idx}")
+            logger.debug(f"Menu: Playing selection {show_idx}-{season_idx}-{episode_idx}")
             media_manager.set_current_indices(show_idx, season_idx, episode_idx)
             menu_manager.exit_menu()
             stop_playback()
@@ -194,107 +362,166 @@ def handle_next_episode():
             update_display()
     else:
         # Playback Mode: Next Episode
-        print("Button: Next Episode")
+        logger.debug(f"Button: Next Episode (x{count})")
         stop_playback()
-        media_manager.next_episode()
+        for _ in range(count):
+            media_manager.next_episode()
         start_playback(media_manager.get_current_episode_path())
 
-def handle_prev_episode():
+def handle_prev_episode(count=1):
     if is_sleeping: wake_up(); return
+    if power_manager.audio_only: exit_audio_only(); return
     
     if menu_manager.active:
         # Menu Mode: UP
-        menu_manager.scroll_up()
+        for _ in range(count):
+            menu_manager.scroll_up()
         update_display()
     else:
         # Playback Mode: Previous Episode
-        print("Button: Previous Episode")
+        logger.debug(f"Button: Previous Episode (x{count})")
         stop_playback()
-        media_manager.prev_episode()
+        for _ in range(count):
+            media_manager.prev_episode()
         start_playback(media_manager.get_current_episode_path())
 
-def handle_next_show():
+def handle_next_show(count=1):
     if is_sleeping: wake_up(); return
+    if power_manager.audio_only: exit_audio_only(); return
     
     if menu_manager.active:
         # Menu Mode: Back
-        menu_manager.back()
+        for _ in range(count):
+            if not menu_manager.active:
+                break
+            menu_manager.back()
         # If we exited menu mode (cancelled), resume playback
         if not menu_manager.active:
              if not media_player.is_playing():
-                 print("Menu exited. Resuming playback...")
+                 logger.info("Menu exited. Resuming playback...")
                  media_player.play()
         update_display()
     else:
         # Playback Mode: Next Show
-        print("Button: Next Show")
+        logger.debug(f"Button: Next Show (x{count})")
         stop_playback()
-        media_manager.next_show()
+        for _ in range(count):
+            media_manager.next_show()
         start_playback(media_manager.get_current_episode_path())
 
-def handle_fast_forward():
+def handle_fast_forward(count=1):
     if is_sleeping: wake_up(); return
-    print("Button: Fast Forward (30s)")
+    if power_manager.audio_only: exit_audio_only(); return
+    logger.debug(f"Button: Fast Forward ({30 * count}s)")
     if media_player.is_playing():
         length = media_player.get_length()
         current_time = media_player.get_time()
-        # Skip 30 seconds (30000 ms)
-        new_time = current_time + 30000
+        # Skip 30 seconds (30000 ms) per press, as a single seek
+        new_time = current_time + 30000 * count
         
         if new_time > length:
             new_time = length - 1000 # Go to 1 second before end
         
         media_player.set_time(new_time)
-        print(f"Seeked to {new_time/1000.0}s")
+        logger.debug(f"Seeked to {new_time/1000.0}s")
 
-def handle_rewind():
+def handle_rewind(count=1):
     if is_sleeping: wake_up(); return
+    if power_manager.audio_only: exit_audio_only(); return
     
     if menu_manager.active:
         # In menu, Long Press A could duplicate UP or do nothing.
         # Let's keep it simple: UP
-        menu_manager.scroll_up()
+        for _ in range(count):
+            menu_manager.scroll_up()
         update_display()
     else:
         # Playback Mode: Rewind
-        print("Button: Rewind (30s)")
+        logger.debug(f"Button: Rewind ({30 * count}s)")
         if media_player.is_playing():
             current_time = media_player.get_time()
-            # Rewind 30 seconds (30000 ms)
-            new_time = current_time - 30000
+            # Rewind 30 seconds (30000 ms) per press, as a single seek
+            new_time = current_time - 30000 * count
             
             if new_time < 0:
                 new_time = 0
             
             media_player.set_time(new_time)
-            print(f"Seeked to {new_time/1000.0}s")
+            logger.debug(f"Seeked to {new_time/1000.0}s")
 
-def handle_cycle_volume():
+def handle_cycle_volume(count=1):
     if is_sleeping: wake_up(); return
-    print("Button: Cycle Volume")
-    new_volume = audio_manager.cycle_volume_preset()
+    if power_manager.audio_only: exit_audio_only(); return
+    logger.debug("Button: Cycle Volume")
+    for _ in range(count):
+        new_volume = audio_manager.cycle_volume_preset()
     media_player.audio_set_volume(new_volume)
     update_display()
 
-def handle_toggle_shuffle():
+def handle_step_volume(direction, count=1):
+    """Web volume up/down (direction +1/-1), one preset per request."""
+    if is_sleeping: return
+    new_volume = audio_manager.step_volume(direction * count)
+    media_player.audio_set_volume(new_volume)
+    update_display()
+
+def handle_toggle_shuffle(count=1):
     if is_sleeping: wake_up(); return
+    if power_manager.audio_only: exit_audio_only(); return
     
     if menu_manager.active:
         # Menu Mode: Down
-        menu_manager.scroll_down()
+        for _ in range(count):
+            menu_manager.scroll_down()
         update_display()
     else:
-        # Playback Mode: Toggle Shuffle
-        new_state = not media_manager.shuffle_enabled
+        # Playback Mode: Toggle Shuffle (an even number of presses cancels out)
+        new_state = media_manager.shuffle_enabled != (count % 2 == 1)
         media_manager.set_shuffle_mode(new_state)
-        print(f"Button: Toggle Shuffle -> {new_state}")
+        prefetch_manager.prepare(media_manager.peek_next_episode_path())
+        logger.debug(f"Button: Toggle Shuffle -> {new_state}")
         update_display()
 
+def handle_menu_repeat():
+    """Scrolls the menu while A or X is held, in steps that grow the longer it is held."""
+    if not menu_repeat['button'] or not menu_manager.active or is_sleeping:
+        dispatcher.cancel('menu_repeat')
+        return
+    menu_repeat['moved'] = True # The release is no longer a short press
+    step = menu_manager.repeat_step(time.monotonic() - menu_repeat['start'])
+    if menu_manager.scroll_by(menu_repeat['direction'] * step):
+        update_display()
+
+def handle_menu_jump(direction, count=1):
+    """Jumps to the next/previous letter (or season) in the menu list."""
+    if is_sleeping: wake_up(); return
+    if not menu_manager.active:
+        return
+    for _ in range(count):
+        menu_manager.jump(direction)
+    update_display()
+
+def start_menu_repeat(button, direction):
+    """Called when a menu scroll button goes down; repeats start after MENU_REPEAT_DELAY."""
+    menu_repeat.update(button=button, direction=direction, start=time.monotonic(), moved=False)
+    dispatcher.schedule('menu_repeat', config.MENU_REPEAT_INTERVAL, delay=config.MENU_REPEAT_DELAY)
+
+def stop_menu_repeat(button):
+    """Called when a button is released. Returns True if its hold already scrolled the menu."""
+    if menu_repeat['button'] != button:
+        return False
+    dispatcher.cancel('menu_repeat')
+    menu_repeat['button'] = None
+    return menu_repeat['moved']
+
 def enter_menu_mode():
+    global wake_time
     if is_sleeping: wake_up(); return
-    print("Entering Menu Mode")
+    if power_manager.audio_only: exit_audio_only(); return
+    logger.info("Entering Menu Mode")
+    wake_time = None # The menu covers the video, so there is no wake-up to time
     if media_player.is_playing():
-        print("Pausing playback for menu...")
+        logger.info("Pausing playback for menu...")
         media_player.pause()
     menu_manager.enter_menu()
     update_display()
@@ -308,27 +535,49 @@ def handle_sleep_wake():
 
 def handle_rotate_screen():
     if is_sleeping: wake_up(); return
-    print("Button: Rotate Screen")
+    if power_manager.audio_only: exit_audio_only(); return
+    logger.debug("Button: Rotate Screen")
     display_manager.rotate_screen()
     # If paused/menu, update display to show rotation immediately
     if not media_player.is_playing():
         update_display()
 
 def go_to_sleep():
-    global is_sleeping
-    print("Going to sleep...")
+    """
+    Blanks the screen and halts playback. With SLEEP_MODE 'pause' the episode
+    stays loaded, paused where it is, so wake_up() only has to resume it.
+    """
+    global is_sleeping, is_playing, sleep_start_time, wake_time
+    logger.info("Going to sleep...")
     is_sleeping = True
+    sleep_start_time = time.monotonic()
+    wake_time = None
     save_current_state()
-    stop_playback()
+    if config.SLEEP_MODE == 'pause' and media_player.get_state() in (vlc.State.Playing, vlc.State.Paused):
+        media_player.set_pause(1)
+        is_playing = False
+        power_manager.exit_audio_only() # Video comes back with the episode on wake
+    else:
+        stop_playback()
+        power_manager.exit_audio_only(restore_video=False) # The next episode starts with video anyway
+    stop_periodic_timers() # Nothing to refresh or sample while asleep
     display_manager.show_sleep_screen()
 
 def wake_up():
-    global is_sleeping
-    print("Waking up...")
+    """Resumes the paused episode if it is still loaded, otherwise reopens it from the saved state."""
+    global is_sleeping, is_playing, wake_time
+    logger.info("Waking up...")
     is_sleeping = False
-    display_manager.reinit_display()
-    # Reload state to resume correctly
-    state = state_manager.load_state()
+    wake_time = time.monotonic()
+    asleep_for = wake_time - sleep_start_time if sleep_start_time is not None else None
+    display_manager.wake(reinit=config.WAKE_REINIT_AFTER is not None and (asleep_for is None or asleep_for > config.WAKE_REINIT_AFTER))
+    start_periodic_timers()
+    if media_player.get_state() == vlc.State.Paused:
+        media_player.set_pause(0) # Resumes on the frame it stopped at; no reopen, seek or info screen
+        is_playing = True
+        return
+    # Nothing loaded (SLEEP_MODE 'stop', or asleep since startup): reopen from the in-memory state
+    state = state_manager.get_state()
     media_manager.set_current_indices(
         state['current_show_idx'],
         state['current_season_idx'],
@@ -338,14 +587,164 @@ def wake_up():
     media_player.audio_set_volume(state['volume_percent'])
     start_playback(media_manager.get_current_episode_path(), state['playback_position'])
 
+def handle_play_pause():
+    """Toggles play/pause state of the media player."""
+    if media_player.is_playing():
+        media_player.pause()
+    else:
+        media_player.play()
+
+def handle_play_media(file_path):
+    """Plays a specific media file (relative to the media root)."""
+    stop_playback()
+    
+    # Find and set indices so state is consistent
+    indices = media_manager.find_episode_indices(file_path)
+    if indices:
+        show_idx, season_idx, episode_idx = indices
+        logger.info(f"Playing media from browser: {file_path} (Indices: {indices})")
+        media_manager.set_current_indices(show_idx, season_idx, episode_idx)
+    else:
+        logger.warning(f"Could not find indices for {file_path}. State may be out of sync.")
+
+    start_playback(os.path.join(media_manager.media_root_dir, file_path))
+
+def handle_rescan_library(moved_paths=(), count=1):
+    """
+    Rescans the media library once for a burst of library changes, keeping
+    the current episode selected if it still exists (or was moved).
+    """
+    current_path = media_manager.get_current_episode_path()
+    media_manager.scan_media()
+
+    if current_path:
+        current_path = relocate_path(os.path.abspath(current_path), moved_paths)
+    indices = media_manager.find_episode_indices(current_path) if current_path else None
+    if indices:
+        media_manager.set_current_indices(*indices)
+    prefetch_manager.prepare(media_manager.peek_next_episode_path())
+    dedup_index.request_update()
+    if config.LOW_MEMORY_MODE:
+        memory_budget.release_free_memory() # The old library structures were just dropped
+
+def handle_apply_decode_level(episode_path):
+    """Restarts the current episode at its position so a new decode level takes effect."""
+    if episode_path != media_manager.get_current_episode_path() or not media_player.is_playing():
+        return
+    position_s = media_player.get_time() / 1000.0
+    stop_playback()
+    start_playback(episode_path, position_s)
+
+def handle_end_of_media():
+    """Advances to the next episode after the current one finished."""
+    logger.debug("Handling Media End...")
+    stop_playback() # Stop player before loading next
+    media_manager.next_episode()
+    # Start the (usually prefetched) next episode first, then save, to keep the gap short
+    start_playback(media_manager.get_current_episode_path())
+    save_current_state()
+
 # --- VLC Event Callback ---
 def handle_media_ended(event):
     """Called by VLC when the current media finishes playing."""
-    # We set a flag here instead of calling logic directly,
+    # We queue a command here instead of calling logic directly,
     # to avoid threading issues with VLC callbacks.
-    global media_ended_flag
-    print("VLC Event: Media Ended.")
-    media_ended_flag = True
+    global media_end_time
+    logger.debug("VLC Event: Media Ended.")
+    media_end_time = time.monotonic()
+    dispatcher.submit('media_ended')
+
+def register_commands():
+    """Registers every player command with the dispatcher."""
+    window = config.COMMAND_COALESCE_WINDOW
+    dispatcher.register('next_episode', handle_next_episode, coalesce_window=window)
+    dispatcher.register('prev_episode', handle_prev_episode, coalesce_window=window)
+    dispatcher.register('next_show', handle_next_show, coalesce_window=window)
+    dispatcher.register('fast_forward', handle_fast_forward, coalesce_window=window)
+    dispatcher.register('rewind', handle_rewind, coalesce_window=window)
+    dispatcher.register('cycle_volume', handle_cycle_volume, coalesce_window=window)
+    dispatcher.register('step_volume', handle_step_volume, coalesce_window=window)
+    dispatcher.register('toggle_shuffle', handle_toggle_shuffle, coalesce_window=window)
+    dispatcher.register('menu_jump', handle_menu_jump, coalesce_window=window)
+    dispatcher.register('rescan_library', handle_rescan_library, coalesce_window=0)
+    dispatcher.register('play_pause', handle_play_pause)
+    dispatcher.register('play_media', handle_play_media)
+    dispatcher.register('enter_menu', enter_menu_mode)
+    dispatcher.register('sleep_wake', handle_sleep_wake)
+    dispatcher.register('rotate_screen', handle_rotate_screen)
+    dispatcher.register('media_ended', handle_end_of_media)
+    dispatcher.register('apply_decode_level', handle_apply_decode_level)
+    dispatcher.register('restore_state', restore_initial_state)
+    dispatcher.register('set_audio_only', handle_set_audio_only)
+    dispatcher.register('video_track_selected', handle_video_track_selected)
+    # Timer commands, scheduled by start_periodic_timers()
+    dispatcher.register('clock_tick', handle_clock_tick)
+    dispatcher.register('check_inactivity', handle_check_inactivity)
+    dispatcher.register('checkpoint_position', handle_checkpoint_position)
+    dispatcher.register('menu_repeat', handle_menu_repeat)
+    dispatcher.register('sample_health', health_monitor.sample)
+
+# --- Periodic Work ---
+# Scheduled on the dispatcher, which sleeps until the next timer is due.
+def handle_clock_tick():
+    """Keeps the playback clock on the info screen current while no video covers it."""
+    if is_sleeping or menu_manager.active or not display_manager.screen_on:
+        return
+    if media_player.is_playing() and not display_manager.is_video_visible():
+        update_display(refresh_only=True)
+
+def handle_check_inactivity():
+    """
+    Turns the backlight off once nothing has been shown for SCREEN_OFF_TIMEOUT, and
+    switches to audio-only once video has played unattended for AUDIO_ONLY_TIMEOUT.
+    """
+    playing = not is_sleeping and media_player.is_playing()
+    power_manager.set_playing(playing) # CPU use is only compared while something plays
+    if is_sleeping or power_manager.audio_only:
+        return
+    display_manager.update_screen_inactivity(config.SCREEN_DIM_TIMEOUT, config.SCREEN_OFF_TIMEOUT)
+    idle = time.time() - display_manager.last_interaction_time
+    if config.AUDIO_ONLY_TIMEOUT and playing and not menu_manager.active and idle > config.AUDIO_ONLY_TIMEOUT:
+        enter_audio_only()
+
+def enter_audio_only():
+    """Turns the screen off and stops video decoding; audio and position tracking continue."""
+    power_manager.enter_audio_only()
+    display_manager.turn_off_backlight()
+
+def exit_audio_only():
+    """Brings video back where the episode currently is."""
+    power_manager.exit_audio_only()
+    display_manager.turn_on_backlight()
+    update_display()
+
+def handle_set_audio_only(enabled):
+    if is_sleeping: return
+    if enabled:
+        enter_audio_only()
+    elif power_manager.audio_only:
+        exit_audio_only()
+
+def handle_video_track_selected():
+    """A new episode selects its video track when it starts; keep it off in audio-only mode."""
+    if power_manager.audio_only:
+        power_manager.disable_video()
+
+def handle_checkpoint_position():
+    """Records the playback position so a power cut loses at most one interval."""
+    if media_player.is_playing():
+        state_manager.record_position(media_player.get_time() / 1000.0, media_manager.current_show_idx,
+                                      media_manager.current_season_idx, media_manager.current_episode_idx)
+
+def start_periodic_timers():
+    dispatcher.schedule('clock_tick', config.CLOCK_REFRESH_INTERVAL)
+    dispatcher.schedule('check_inactivity', config.INACTIVITY_CHECK_INTERVAL)
+    dispatcher.schedule('checkpoint_position', config.STATE_CHECKPOINT_INTERVAL)
+    dispatcher.schedule('sample_health', config.HEALTH_SAMPLE_INTERVAL)
+
+def stop_periodic_timers():
+    for name in ('clock_tick', 'check_inactivity', 'checkpoint_position', 'sample_health'):
+        dispatcher.cancel(name)
 
 # --- System Setup & Teardown ---
 def setup():
@@ -371,71 +770,119 @@ def setup():
         'tr_held': False,
         'bl_held': False,
         'br_held': False,
+        'tl_action_handled': False, # To track if A was used in a combo (menu jump)
+        'tr_action_handled': False, # To track if B was used in a combo (menu jump)
         'bl_action_handled': False, # To track if X was used in combo
         'br_used_as_modifier': False # To track if Y was used as modifier
     }
 
+    # Callbacks run on gpiozero threads; they only track button state and
+    # queue commands for the dispatcher.
+
+    # Press edges and hold detection time, for the latency trace (/trace)
+    press_times = {}
+    def traced_press(label, handler=None):
+        def on_pressed():
+            press_times[label] = time.monotonic()
+            tracer.instant(f"button {label} pressed")
+            if handler:
+                handler()
+        return on_pressed
+
+    def trace_hold(label):
+        if label in press_times:
+            tracer.record_span(f"button {label} hold detection", press_times[label], time.monotonic(), 'input')
+
+    # In the menu, Y held + A/B jumps to the previous/next letter or season
+    def menu_jump_combo(label, direction):
+        if menu_manager.active and button_br.is_pressed:
+            logger.debug(f"Combo: Y held + {label} pressed -> Menu Jump")
+            button_states['br_used_as_modifier'] = True
+            dispatcher.submit('menu_jump', direction, origin=f'button BR+{label}')
+            return True
+        return False
+
     # --- Top Left (A): Prev Episode (Short) / Menu (Long) ---
+    def on_tl_pressed():
+        button_states['tl_action_handled'] = menu_jump_combo('TL', -1)
+        if menu_manager.active and not button_states['tl_action_handled']:
+            start_menu_repeat('TL', -1) # Holding A in the menu scrolls up, accelerating
+
     def on_tl_held():
+        if button_states['tl_action_handled']: return
+        trace_hold('TL')
         button_states['tl_held'] = True
-        if menu_manager.active:
-            # If already in menu, long press acts as fast scroll up or just regular up
-            handle_prev_episode() # Maps to UP in menu
-        else:
-            enter_menu_mode() # REPLACES Rewind
+        if not menu_manager.active:
+            dispatcher.submit('enter_menu', origin='button TL hold') # REPLACES Rewind
         
     def on_tl_released():
-        if not button_states['tl_held']:
-            handle_prev_episode()
+        scrolled = stop_menu_repeat('TL')
+        if button_states['tl_action_handled']:
+            button_states['tl_action_handled'] = False
+        elif not button_states['tl_held'] and not scrolled:
+            dispatcher.submit('prev_episode', origin='button TL')
         button_states['tl_held'] = False
         
+    button_tl.when_pressed = traced_press('TL', on_tl_pressed)
     button_tl.when_held = on_tl_held
     button_tl.when_released = on_tl_released
 
     # --- Top Right (B): Next Episode (Short) / Fast Forward (Long) ---
+    def on_tr_pressed():
+        button_states['tr_action_handled'] = menu_jump_combo('TR', 1)
+
     def on_tr_held():
+        if button_states['tr_action_handled']: return
+        trace_hold('TR')
         button_states['tr_held'] = True
-        handle_fast_forward()
+        dispatcher.submit('fast_forward', origin='button TR hold')
 
     def on_tr_released():
-        if not button_states['tr_held']:
-            handle_next_episode()
+        if button_states['tr_action_handled']:
+            button_states['tr_action_handled'] = False
+        elif not button_states['tr_held']:
+            dispatcher.submit('next_episode', origin='button TR')
         button_states['tr_held'] = False
 
     button_tr.when_held = on_tr_held
     button_tr.when_released = on_tr_released
-    # Clear old simple handlers if any
-    button_tr.when_pressed = None
+    button_tr.when_pressed = traced_press('TR', on_tr_pressed)
 
     # --- Bottom Left (X): Shuffle (Short) / Sleep (Long) / Volume (If Y held) ---
     def on_bl_pressed():
         # Check if Y is held down to trigger Combo
         if button_br.is_pressed:
-            print("Combo: Y held + X pressed -> Cycle Volume")
+            logger.debug("Combo: Y held + X pressed -> Cycle Volume")
             button_states['br_used_as_modifier'] = True
-            handle_cycle_volume()
+            dispatcher.submit('cycle_volume', origin='button BR+BL')
             # Mark action as handled so release doesn't trigger shuffle
             button_states['bl_action_handled'] = True
         else:
             button_states['bl_action_handled'] = False
+            if menu_manager.active:
+                start_menu_repeat('BL', 1) # Holding X in the menu scrolls down, accelerating
 
     def on_bl_held():
         if button_states.get('bl_action_handled', False): return
+        trace_hold('BL')
         
         button_states['bl_held'] = True
-        handle_sleep_wake()
+        if menu_repeat['button'] == 'BL':
+            return # Scrolling the menu, not sleeping
+        dispatcher.submit('sleep_wake', origin='button BL hold')
 
     def on_bl_released():
+        scrolled = stop_menu_repeat('BL')
         # If action was handled (e.g. combo), reset flag and do nothing
         if button_states.get('bl_action_handled', False):
             button_states['bl_action_handled'] = False
             return
 
-        if not button_states['bl_held']:
-            handle_toggle_shuffle() # Short press is now Shuffle
+        if not button_states['bl_held'] and not scrolled:
+            dispatcher.submit('toggle_shuffle', origin='button BL') # Short press is now Shuffle
         button_states['bl_held'] = False
 
-    button_bl.when_pressed = on_bl_pressed
+    button_bl.when_pressed = traced_press('BL', on_bl_pressed)
     button_bl.when_held = on_bl_held
     button_bl.when_released = on_bl_released
     
@@ -443,22 +890,25 @@ def setup():
     def on_br_held():
         # Only trigger if we haven't already triggered for this hold press
         if not button_states['br_held']:
+            trace_hold('BR')
             button_states['br_held'] = True
-            handle_rotate_screen()
+            dispatcher.submit('rotate_screen', origin='button BR hold')
 
     def on_br_released():
         # If used as modifier, do NOT trigger Next Show
         if not button_states['br_held'] and not button_states.get('br_used_as_modifier', False):
-            handle_next_show()
+            dispatcher.submit('next_show', origin='button BR')
         
         button_states['br_held'] = False
         button_states['br_used_as_modifier'] = False # Reset modifier flag
 
+    button_br.when_pressed = traced_press('BR')
     button_br.when_held = on_br_held
     button_br.when_released = on_br_released
 
     # Attach VLC event listener
     event_manager.event_attach(vlc.EventType.MediaPlayerEndReached, handle_media_ended)
+    event_manager.event_attach(vlc.EventType.MediaPlayerESSelected, lambda event: dispatcher.submit('video_track_selected'))
     
     # --- Setup VLC Video Output to Memory ---
     # Register the callbacks
@@ -466,6 +916,13 @@ def setup():
     # Set the format (RV24 = RGB 24-bit, 240x240, Pitch = Width * 3)
     media_player.video_set_format("RV24", VIDEO_WIDTH, VIDEO_HEIGHT, VIDEO_WIDTH * 3)
 
+    # Restoring state starts playback, so it runs on the dispatcher thread too
+    dispatcher.submit('restore_state')
+    start_periodic_timers()
+    state_manager.start()
+
+def restore_initial_state():
+    """Loads the saved state and resumes playback (or sleep) from it."""
     # Load initial state
     initial_state = state_manager.get_state()
     media_manager.set_current_indices(
@@ -483,19 +940,22 @@ def setup():
     if initial_state.get('is_sleeping', False):
         go_to_sleep()
     else:
-        print("Resuming playback from last state...")
+        logger.info("Resuming playback from last state...")
         episode_path = media_manager.get_current_episode_path()
         if episode_path:
             start_playback(episode_path, initial_state['playback_position'])
         else:
-            print("No media found to play on startup.")
+            logger.info("No media found to play on startup.")
             display_manager.show_playback_info(media_manager.get_current_episode_info(), "N/A", "N/A", audio_manager.get_current_volume(), False)
 
 def cleanup():
     """A cleanup function to be called on application exit."""
-    print("Cleaning up and shutting down...")
+    logger.info("Cleaning up and shutting down...")
     if not is_sleeping:
         save_current_state()
+    state_manager.flush()
+    if web_supervisor:
+        web_supervisor.stop()
     if media_player:
         media_player.stop()
         media_player.release()
@@ -503,7 +963,8 @@ def cleanup():
         vlc_instance.release()
     display_manager.clear_screen()
     display_manager.turn_off_backlight()
-    print("Application exited.")
+    display_manager.close()
+    logger.info("Application exited.")
 
 # --- Main Application Class ---
 class MainApp:
@@ -517,87 +978,104 @@ class MainApp:
         self.audio_manager = audio_manager
         self.state_manager = state_manager
         self.menu_manager = menu_manager
+        self._remux_manager = None # Created on first browser stream
         self.is_sleeping = is_sleeping
         self.is_playing = is_playing
-        self.media_ended_flag = media_ended_flag
-        self.media_ended_flag = media_ended_flag
+        self.dispatcher = dispatcher
+        register_commands()
+        self._register_memory_accounting()
         
-        self.socketio = socketio
-        # Start hardware & server initialization in a separate thread after a delay
-        self.init_thread = threading.Thread(target=self._initialize_systems_with_delay, name="InitThread")
+        # Start hardware & server initialization in a separate thread.
+        # Hardware readiness was already probed before the managers were created.
+        self.init_thread = threading.Thread(target=self._initialize_systems, name="InitThread")
         self.init_thread.daemon = True
         self.init_thread.start()
 
-    def _initialize_systems_with_delay(self):
-        """Waits for system to be ready before starting web server and hardware."""
-        print("Delaying initialization for 15 seconds...")
-        time.sleep(15)
-        print("Initialization started.")
-        
+    def _register_memory_accounting(self):
+        """Subsystems reported at /memory."""
+        deep_size = memory_budget.deep_size
+        search_index = media_manager.search_index
+        memory_budget.register('library', lambda: deep_size(media_manager.shows) + deep_size(media_manager.all_episodes))
+        memory_budget.register('search index', lambda: deep_size((search_index.entries, search_index.ids, search_index.tokens)))
+        memory_budget.register('dedup index', lambda: deep_size(dedup_index.entries))
+        memory_budget.register('frame buffers', lambda: VIDEO_BUFFER_SIZE + display_manager.get_buffer_bytes())
+        memory_budget.register('mirror', lambda: len(display_manager.mirror.frame_jpeg or b''))
+        memory_budget.register('remux cache', lambda: self._remux_manager.cache_bytes if self._remux_manager else 0)
+
+    def _initialize_systems(self):
+        """Sets up buttons and playback first, then the (lazily imported) web server."""
+        logger.info("Attempting to initialize hardware...")
+        try:
+            setup()
+            startup_timeline.mark("hardware setup complete")
+        except Exception as e:
+            logger.critical(f"Failed to initialize hardware: {e}")
+        if not config.LOW_MEMORY_MODE: # Otherwise indexed on first use (see ensure_dedup_index)
+            dedup_index.start() # Fingerprints new or changed files in the background
+
         # Check if web server should be enabled
         if self.state_manager.get_state().get('web_server_enabled', True):
-            print("Attempting to start web server...")
+            logger.info("Attempting to start web server...")
             try:
-                start_web_server_thread(self)
-                print("Web server thread started.")
+                start_web_server(self)
+                startup_timeline.mark("web server started")
             except Exception as e:
-                print(f"CRITICAL: Failed to start web server thread: {e}")
+                logger.critical(f"Failed to start web server thread: {e}")
         else:
-            print("Web server is disabled in settings. Skipping startup.")
+            logger.info("Web server is disabled in settings. Skipping startup.")
 
-        print("Attempting to initialize hardware...")
-        try:
-            setup()
-            print("Hardware setup complete.")
-        except Exception as e:
-            print(f"CRITICAL: Failed to initialize hardware: {e}")
+    @property
+    def remux_manager(self):
+        if self._remux_manager is None:
+            self._remux_manager = RemuxManager(self.media_manager.media_root_dir)
+        return self._remux_manager
+
+    def get_startup_timeline(self):
+        """Returns the startup stages and how long each took."""
+        return startup_timeline.get_timeline()
 
+    # Web requests run on Werkzeug threads, so player actions are queued for the dispatcher.
     def play_pause(self):
         """Toggles play/pause state of the media player."""
-        if self.media_player.is_playing():
-            self.media_player.pause()
-        else:
-            self.media_player.play()
+        dispatcher.submit('play_pause', origin='web')
 
     def next_episode(self):
         """Handles the logic for playing the next episode."""
-        handle_next_episode()
+        dispatcher.submit('next_episode', origin='web')
 
     def prev_episode(self):
         """Handles the logic for playing the previous episode."""
-        handle_prev_episode()
+        dispatcher.submit('prev_episode', origin='web')
 
     def next_show(self):
         """Handles the logic for playing the next show."""
-        handle_next_show()
+        dispatcher.submit('next_show', origin='web')
 
     def rewind(self):
         """Handles the logic for rewinding."""
-        handle_rewind()
+        dispatcher.submit('rewind', origin='web')
 
     def fast_forward(self):
         """Handles the logic for fast forwarding."""
-        handle_fast_forward()
+        dispatcher.submit('fast_forward', origin='web')
 
     def toggle_shuffle(self):
         """Handles the logic for toggling shuffle."""
-        handle_toggle_shuffle()
+        dispatcher.submit('toggle_shuffle', origin='web')
 
     def rotate_screen(self):
         """Handles the logic for rotating the screen."""
-        handle_rotate_screen()
+        dispatcher.submit('rotate_screen', origin='web')
 
     def volume_up(self):
-        """Increases the volume."""
-        new_volume = self.audio_manager.volume_up()
-        self.media_player.audio_set_volume(new_volume)
-        return new_volume
+        """Raises the volume one preset. Returns the volume it will be set to."""
+        dispatcher.submit('step_volume', 1, origin='web')
+        return self.audio_manager.preset_after(1)
 
     def volume_down(self):
-        """Decreases the volume."""
-        new_volume = self.audio_manager.volume_down()
-        self.media_player.audio_set_volume(new_volume)
-        return new_volume
+        """Lowers the volume one preset. Returns the volume it will be set to."""
+        dispatcher.submit('step_volume', -1, origin='web')
+        return self.audio_manager.preset_after(-1)
 
     def get_current_video_path(self):
         """Returns the path and filename of the current video for streaming."""
@@ -615,51 +1093,106 @@ class MainApp:
 
     def play_media(self, file_path):
         """Plays a specific media file."""
-        # This assumes the file_path is a full, safe path to a media file
-        stop_playback()
-        
-        # Find and set indices so state is consistent
-        indices = self.media_manager.find_episode_indices(file_path)
-        if indices:
-            show_idx, season_idx, episode_idx = indices
-            print(f"Playing media from browser: {file_path} (Indices: {indices})")
-            self.media_manager.set_current_indices(show_idx, season_idx, episode_idx)
-        else:
-            print(f"Warning: Could not find indices for {file_path}. State may be out of sync.")
-
-        start_playback(os.path.join(self.media_manager.media_root_dir, file_path))
+        # This assumes the file_path is a safe path relative to the media root
+        dispatcher.submit('play_media', file_path, origin='web')
 
     def handle_upload(self, file_stream, filename):
         """Handles file uploads from the web interface, preserving directory structure."""
-        from werkzeug.utils import secure_filename
-
-        # Sanitize each path component to prevent traversal attacks but keep directory structure.
-        # Browsers use '/' as a separator in webkitRelativePath.
-        path_parts = filename.split('/')
-        safe_parts = [secure_filename(part) for part in path_parts]
-        safe_relative_path = os.path.join(*safe_parts)
+        result = save_upload(self.media_manager.media_root_dir, file_stream, filename, self.is_safe_path, self.find_duplicate)
+        if result:
+            self.record_upload(*result)
+
+    def search_library(self, query, limit=None):
+        """Returns shows, seasons and episodes with a name starting with each word of the query."""
+        limit = config.SEARCH_MAX_RESULTS if limit is None else min(max(limit, 1), config.SEARCH_MAX_RESULTS)
+        return self.media_manager.search_index.search(query, limit)
+
+    def ensure_dedup_index(self, timeout=config.DEDUP_FIRST_USE_WAIT):
+        """
+        In low-memory mode the duplicate index is brought up to date on first
+        use. Starts the indexing thread if needed and waits up to `timeout`
+        seconds for its first pass; returns whether it has finished.
+        """
+        dedup_index.start()
+        return dedup_index.first_pass_done.wait(timeout)
+
+    def find_duplicate(self, size, fingerprint):
+        """Returns library files (relative paths) whose size and sampled fingerprint match an upload."""
+        self.ensure_dedup_index() # Still indexing: the upload is simply stored as a copy
+        return dedup_index.find(size, fingerprint)
+
+    def record_upload(self, size, elapsed):
+        """Counts a saved upload and rescans the library (bursts of uploads share one rescan)."""
+        UPLOAD_BYTES.inc(size)
+        if size and elapsed > 0: # Linked duplicates write nothing
+            UPLOAD_THROUGHPUT.observe(size / elapsed)
+        dispatcher.submit('rescan_library')
+
+    def apply_library_batch(self, operations):
+        """
+        Applies a batch of library operations as one transaction, then rebuilds
+        the library index once. Returns (result dict, HTTP status code).
+        """
+        batch = LibraryBatch(self.media_manager.media_root_dir, operations, self.is_safe_path)
+        result, status_code = batch.apply()
+        if status_code == 200:
+            dispatcher.submit('rescan_library', batch.moved_paths)
+        return result, status_code
+
+    def get_duplicates(self, verify=False):
+        """Returns groups of identical files in the library (verified by full hashes if asked)."""
+        if not self.ensure_dedup_index():
+            return {'status': 'indexing', 'files_indexed': len(dedup_index.entries)}
+        return dedup_index.get_report(verify)
+
+    def dedupe_library(self, dry_run=True):
+        """Starts hardlinking verified duplicates in the background. Returns the job status."""
+        self.ensure_dedup_index(timeout=0) # The job runs after the first pass
+        return dedup_index.request_dedupe(dry_run)
+
+    def get_dedupe_status(self):
+        """Returns the status of the last dedupe job, with what it linked once done."""
+        return dedup_index.get_dedupe_status()
+
+    def set_audio_only(self, enabled):
+        """Turns audio-only mode (screen and video decoding off) on or off."""
+        dispatcher.submit('set_audio_only', bool(enabled), origin='web')
+
+    def get_power_stats(self):
+        """Returns whether audio-only mode is on and the CPU use with and without video."""
+        return power_manager.get_stats()
+
+    def get_display_stats(self):
+        """Returns how many frames were skipped as unchanged or sent as changed tiles only."""
+        return display_manager.get_transfer_stats()
+
+    def get_trace(self):
+        """Returns recent latency spans as Chrome trace-event JSON."""
+        return tracer.get_chrome_trace()
+
+    def get_logs(self, level='DEBUG', limit=200, since=None):
+        """Returns recent log records from the in-memory ring, newest last."""
+        return logs.get_records(level, limit, since)
+
+    def get_memory_report(self, top=15):
+        """Returns RSS against the budget, memory held per subsystem and, when profiling, tracemalloc attribution."""
+        processes = {
+            'web': web_supervisor.process.pid if web_supervisor and web_supervisor.process else None,
+            'presenter': display_manager.presenter.process.pid if display_manager.presenter else None,
+        }
+        return memory_budget.get_report(top, processes)
 
-        # Double-check that the resulting path is not trying to escape the media root.
-        if not self.is_safe_path(safe_relative_path):
-            print(f"Error: Unsafe path detected during upload: {safe_relative_path}")
-            return
+    def get_metrics_text(self):
+        """Returns the player's metrics in Prometheus text format."""
+        return metrics.render_prometheus()
 
-        save_path = os.path.join(self.media_manager.media_root_dir, safe_relative_path)
+    def get_health_stats(self):
+        """Returns decode health for the current episode."""
+        return health_monitor.get_stats()
 
-        try:
-            # Create parent directories if they don't exist
-            directory = os.path.dirname(save_path)
-            os.makedirs(directory, exist_ok=True)
-            
-            # Write the file
-            with open(save_path, 'wb') as f:
-                f.write(file_stream.read())
-            print(f"File uploaded successfully to {save_path}")
-            
-            # After upload, rescan the media library
-            self.media_manager.scan_media()
-        except Exception as e:
-            print(f"Error saving uploaded file: {e}")
+    def get_dispatcher_stats(self):
+        """Returns command queue depth and latency measurements."""
+        return dispatcher.get_stats()
 
     def get_playback_status(self):
         """Returns a dictionary with the current playback status."""
@@ -673,29 +1206,22 @@ class MainApp:
             'current_time': self.media_player.get_time() / 1000.0,
             'duration': self.media_player.get_length() / 1000.0,
             'episode_path': relative_path.replace("\\", "/"), # Use forward slashes for web
-            'show_info': self.media_manager.get_current_episode_info()
+            'show_info': self.media_manager.get_current_episode_info(),
+            'first_frame_ms': last_first_frame_ms,
+            'transition_gap_ms': last_transition_gap_ms,
+            'wake_to_frame_ms': last_wake_to_frame_ms
         }
 
 # --- Main Loop ---
 if __name__ == "__main__":
     try:
         main_app = MainApp()
-        # The main loop now just keeps the script alive and periodically updates the display
-        while True:
-            # Check if media finished playing (signaled by callback)
-            if media_ended_flag:
-                print("Main Loop: Handling Media End...")
-                media_ended_flag = False
-                stop_playback() # Stop player before loading next
-                media_manager.next_episode()
-                save_current_state()
-                start_playback(media_manager.get_current_episode_path())
-
-            time.sleep(0.1) # Update interval
+        # The main thread owns the player: it runs every queued command
+        dispatcher.run_forever()
     except KeyboardInterrupt:
-        print("\nCtrl+C pressed. Exiting.")
+        logger.info("Ctrl+C pressed. Exiting.")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error(f"An unexpected error occurred: {e}")
         import traceback
         traceback.print_exc()
     finally:
@@ -1,7 +1,17 @@
 # media_manager.py
 import os
 import glob
+import logging
 import random
+import time
+
+import config
+import metrics
+from search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+SCAN_SECONDS = metrics.histogram('pitv_library_scan_seconds', 'Duration of a full media library scan.')
 
 class MediaManager:
     def __init__(self, media_root_dir):
@@ -11,18 +21,24 @@ class MediaManager:
         self.current_season_idx = 0
         self.current_episode_idx = 0
         self.shuffle_enabled = False
+        self.shuffle_next = None # Pre-chosen next random episode, so it can be prefetched
         self.all_episodes = []
+        self.search_index = SearchIndex(media_root_dir, deferred=config.LOW_MEMORY_MODE) # Updated by every scan
         self.scan_media()
 
     def scan_media(self):
         """Scans the media_root_dir for shows, seasons, and episodes."""
+        scan_start = time.perf_counter()
         self.shows = []
-        show_dirs = sorted([d for d in os.listdir(self.media_root_dir) if os.path.isdir(os.path.join(self.media_root_dir, d))])
+        # Hidden folders (e.g. a library batch's trash) are not part of the library
+        show_dirs = sorted([d for d in os.listdir(self.media_root_dir)
+                            if not d.startswith('.') and os.path.isdir(os.path.join(self.media_root_dir, d))])
 
         for show_name in show_dirs:
             show_path = os.path.join(self.media_root_dir, show_name)
             seasons = []
-            season_dirs = sorted([d for d in os.listdir(show_path) if os.path.isdir(os.path.join(show_path, d))])
+            season_dirs = sorted([d for d in os.listdir(show_path)
+                                  if not d.startswith('.') and os.path.isdir(os.path.join(show_path, d))])
 
             for season_name in season_dirs:
                 season_path = os.path.join(show_path, season_name)
@@ -36,27 +52,32 @@ class MediaManager:
                 self.shows.append({'name': show_name, 'seasons': seasons})
 
         if not self.shows:
-            print(f"Warning: No media found in {self.media_root_dir}")
+            logger.warning(f"No media found in {self.media_root_dir}")
 
         # Flatten library for shuffle
+        self.shuffle_next = None
         self.all_episodes = []
         for show_idx, show in enumerate(self.shows):
             for season_idx, season in enumerate(show['seasons']):
                 for episode_idx, _ in enumerate(season['episodes']):
                     self.all_episodes.append((show_idx, season_idx, episode_idx))
+        self.search_index.update(self.shows)
+        SCAN_SECONDS.observe(time.perf_counter() - scan_start)
 
     def set_shuffle_mode(self, enabled):
         """Enables or disables shuffle mode."""
         self.shuffle_enabled = enabled
-        print(f"Shuffle mode set to: {enabled}")
+        self.shuffle_next = None
+        logger.debug(f"Shuffle mode set to: {enabled}")
 
     def get_random_episode(self):
         """Selects a random episode from the flattened library."""
         if not self.all_episodes: return
         
-        show_idx, season_idx, episode_idx = random.choice(self.all_episodes)
+        show_idx, season_idx, episode_idx = self.shuffle_next or random.choice(self.all_episodes)
+        self.shuffle_next = None
         self.set_current_indices(show_idx, season_idx, episode_idx)
-        print(f"Random episode selected: {self.get_current_episode_info()}")
+        logger.debug(f"Random episode selected: {self.get_current_episode_info()}")
 
     def get_current_episode_path(self):
         """Returns the full path to the current episode."""
@@ -84,6 +105,39 @@ class MediaManager:
                 'episode': "No Episode"
             }
 
+    def _sequential_next_indices(self):
+        """Returns the indices after the current episode, moving on to the next season/show at the end."""
+        show_idx, season_idx, episode_idx = self.current_show_idx, self.current_season_idx, self.current_episode_idx
+
+        episode_idx += 1
+        if episode_idx >= len(self.shows[show_idx]['seasons'][season_idx]['episodes']):
+            episode_idx = 0
+            season_idx += 1
+            
+            if season_idx >= len(self.shows[show_idx]['seasons']):
+                season_idx = 0
+                show_idx += 1
+                
+                if show_idx >= len(self.shows):
+                    show_idx = 0 # Loop back to first show
+        return show_idx, season_idx, episode_idx
+
+    def peek_next_episode_path(self):
+        """Returns the path next_episode() will move to, without moving."""
+        if not self.shows: return None
+
+        try:
+            if self.shuffle_enabled:
+                # Choose the random episode now so next_episode() picks the same one
+                if self.shuffle_next is None:
+                    self.shuffle_next = random.choice(self.all_episodes)
+                show_idx, season_idx, episode_idx = self.shuffle_next
+            else:
+                show_idx, season_idx, episode_idx = self._sequential_next_indices()
+            return self.shows[show_idx]['seasons'][season_idx]['episodes'][episode_idx]
+        except IndexError:
+            return None
+
     def next_episode(self):
         """Advances to the next episode, or next season/show if at end."""
         if not self.shows: return
@@ -92,20 +146,8 @@ class MediaManager:
             self.get_random_episode()
             return
 
-        self.current_episode_idx += 1
-        current_season_episodes = self.shows[self.current_show_idx]['seasons'][self.current_season_idx]['episodes']
-        
-        if self.current_episode_idx >= len(current_season_episodes):
-            self.current_episode_idx = 0
-            self.current_season_idx += 1
-            
-            if self.current_season_idx >= len(self.shows[self.current_show_idx]['seasons']):
-                self.current_season_idx = 0
-                self.current_show_idx += 1
-                
-                if self.current_show_idx >= len(self.shows):
-                    self.current_show_idx = 0 # Loop back to first show
-        print(f"Next episode: {self.get_current_episode_info()}")
+        self.current_show_idx, self.current_season_idx, self.current_episode_idx = self._sequential_next_indices()
+        logger.debug(f"Next episode: {self.get_current_episode_info()}")
 
     def prev_episode(self):
         """Goes back to the previous episode, or previous season/show if at beginning."""
@@ -120,7 +162,7 @@ class MediaManager:
                     self.current_show_idx = len(self.shows) - 1 # Loop back to last show
                 self.current_season_idx = len(self.shows[self.current_show_idx]['seasons']) - 1 # Last season of current show
             self.current_episode_idx = len(self.shows[self.current_show_idx]['seasons'][self.current_season_idx]['episodes']) - 1
-        print(f"Previous episode: {self.get_current_episode_info()}")
+        logger.debug(f"Previous episode: {self.get_current_episode_info()}")
 
     def next_show(self):
         """Advances to the next show, looping if at end."""
@@ -131,7 +173,7 @@ class MediaManager:
             self.current_show_idx = 0
         self.current_season_idx = 0
         self.current_episode_idx = 0
-        print(f"Next show: {self.get_current_episode_info()}")
+        logger.debug(f"Next show: {self.get_current_episode_info()}")
 
     def find_episode_indices(self, file_path):
         """
@@ -170,7 +212,7 @@ class MediaManager:
             self.current_show_idx = 0
             self.current_season_idx = 0
             self.current_episode_idx = 0
-        print(f"Set indices to: {self.get_current_episode_info()}")
+        logger.debug(f"Set indices to: {self.get_current_episode_info()}")
 
     def list_directory(self, sub_path=''):
         """Lists the contents of a directory within the media root."""
@@ -0,0 +1,211 @@
+# memory_budget.py
+# Where the player's memory goes. Subsystems register a function returning
+# the bytes they hold (library, caches, frame buffers...); /memory reports
+# those next to the process RSS and config.MEMORY_RSS_BUDGET_MB. With
+# config.MEMORY_PROFILING on, tracemalloc also attributes every live Python
+# allocation to a subsystem by the files on its stack, and shows what grew
+# since startup finished.
+#
+# Check a running player against the budget (exit status 1 if over):
+#   python3 memory_budget.py --check [--url http://127.0.0.1:5000]
+import ctypes
+import ctypes.util
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_M_ARENA_MAX = -8 # mallopt() parameter, glibc
+
+# Files (path fragments) whose allocations belong to a subsystem; checked innermost frame first
+SUBSYSTEM_PATHS = (
+    ('web', ('flask', 'werkzeug', 'socketio', 'engineio', 'jinja2', 'web_server.py', 'web_ipc.py', 'remux_manager.py')),
+    ('library', ('media_manager.py', 'search_index.py', 'dedup_index.py', 'menu_manager.py', 'library_batch.py')),
+    ('frame buffers', ('spi_transfer.py', 'frame_presenter.py', 'mirror_manager.py', 'numpy')),
+    ('imaging', ('PIL', 'display_manager.py')),
+    ('vlc', ('vlc.py', 'prefetch_manager.py', 'health_monitor.py', 'decode_profiles.py')),
+    ('instrumentation', ('metrics.py', 'tracer.py', 'logs.py', 'memory_budget.py', 'startup_timeline.py')),
+    ('player', ('main.py', 'command_dispatcher.py', 'state_manager.py', 'power_manager.py', 'audio_manager.py')),
+)
+
+_subsystems = {} # name -> callable returning bytes
+_baseline = None
+_lock = threading.Lock()
+
+# --- Setup ---
+def start_profiling():
+    """Starts tracemalloc if config.MEMORY_PROFILING is on. Call as early as possible."""
+    if config.MEMORY_PROFILING and not tracemalloc.is_tracing():
+        tracemalloc.start(config.MEMORY_TRACE_FRAMES)
+
+def apply_low_memory_mode():
+    """
+    Process-wide settings for config.LOW_MEMORY_MODE (the smaller caches are
+    set in config.py itself). Limits glibc to two malloc arenas, which keeps
+    each thread from growing its own heap. Call before starting threads, and
+    so before logging is set up; returns whether the limit was applied.
+    """
+    if not config.LOW_MEMORY_MODE:
+        return False
+    libc = _libc()
+    return bool(libc and hasattr(libc, 'mallopt') and libc.mallopt(_M_ARENA_MAX, 2))
+
+def release_free_memory():
+    """Returns freed heap pages to the kernel (glibc), e.g. after a rescan dropped the old library."""
+    libc = _libc()
+    if libc and hasattr(libc, 'malloc_trim'):
+        libc.malloc_trim(0)
+
+def _libc():
+    name = ctypes.util.find_library('c')
+    try:
+        return ctypes.CDLL(name) if name else None
+    except OSError:
+        return None
+
+# --- Accounting ---
+def register(name, size_fn):
+    """Adds a subsystem to the report; size_fn() returns the bytes it currently holds."""
+    _subsystems[name] = size_fn
+
+def deep_size(obj, seen=None):
+    """Approximate bytes held by a structure of containers, strings and numbers (numpy arrays by nbytes)."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)) or type(obj).__name__ == 'deque':
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, 'nbytes') and hasattr(obj, 'dtype'):
+        size += obj.nbytes
+    return size
+
+def read_proc_status(pid='self'):
+    """Returns VmRSS and VmHWM (peak RSS) of a process in bytes (Linux)."""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    key, amount = line.split(':')
+                    values[key] = int(amount.split()[0]) * 1024
+    except OSError:
+        pass
+    return values.get('VmRSS'), values.get('VmHWM')
+
+def account():
+    """Returns {subsystem: bytes} for every registered subsystem."""
+    sizes = {}
+    for name, size_fn in list(_subsystems.items()):
+        try:
+            sizes[name] = int(size_fn())
+        except Exception as e:
+            logger.warning(f"Memory: Could not measure {name}: {e}")
+    return sizes
+
+# --- tracemalloc ---
+def mark_baseline():
+    """Remembers the current allocations (e.g. once startup is done) to report growth against."""
+    global _baseline
+    if tracemalloc.is_tracing():
+        with _lock:
+            _baseline = tracemalloc.take_snapshot()
+
+def _subsystem_of(traceback):
+    for frame in traceback:
+        for name, fragments in SUBSYSTEM_PATHS:
+            if any(fragment in frame.filename for fragment in fragments):
+                return name
+    return 'other'
+
+def _traced_report(top):
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ))
+    by_subsystem = {}
+    for stat in snapshot.statistics('traceback'):
+        name = _subsystem_of(stat.traceback)
+        by_subsystem[name] = by_subsystem.get(name, 0) + stat.size
+
+    def lines(stats):
+        return [{'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 'size_bytes': stat.size, 'count': stat.count,
+                 'size_diff_bytes': getattr(stat, 'size_diff', None)} for stat in stats[:top]]
+
+    report = {
+        'traced_bytes': tracemalloc.get_traced_memory()[0],
+        'by_subsystem': dict(sorted(by_subsystem.items(), key=lambda item: -item[1])),
+        'top': lines(snapshot.statistics('lineno')),
+    }
+    with _lock:
+        baseline = _baseline
+    if baseline is not None:
+        report['growth_since_baseline'] = lines(snapshot.compare_to(baseline, 'lineno'))
+    return report
+
+def get_report(top=15, extra_processes=None):
+    """
+    Returns RSS against the budget, per-subsystem accounting and, when
+    profiling, tracemalloc attribution. extra_processes: {name: pid} of helper
+    processes (web server, frame presenter) whose RSS to include.
+    """
+    rss, peak_rss = read_proc_status()
+    budget = config.MEMORY_RSS_BUDGET_MB * 1024 * 1024
+    report = {
+        'rss_bytes': rss,
+        'peak_rss_bytes': peak_rss,
+        'budget_bytes': budget,
+        'within_budget': rss is not None and rss <= budget,
+        'low_memory_mode': config.LOW_MEMORY_MODE,
+        'accounted': account(),
+        'profiling': tracemalloc.is_tracing(),
+    }
+    if extra_processes:
+        report['processes'] = {name: read_proc_status(pid)[0] for name, pid in extra_processes.items() if pid}
+    if tracemalloc.is_tracing():
+        report['traced'] = _traced_report(top)
+    return report
+
+# --- Budget check ---
+def check(url, budget_mb=None):
+    """Fetches /memory from a running player and prints it. Returns True if RSS is within the budget."""
+    import json
+    import urllib.request
+
+    with urllib.request.urlopen(f"{url.rstrip('/')}/memory", timeout=30) as response:
+        report = json.load(response)
+    budget = (budget_mb * 1024 * 1024) if budget_mb else report['budget_bytes']
+    mb = lambda value: f"{value / 1048576:7.1f} MB" if value is not None else "      n/a"
+    print(f"RSS      {mb(report['rss_bytes'])}  (peak {mb(report['peak_rss_bytes']).strip()}, budget {mb(budget).strip()}, "
+          f"low-memory mode {'on' if report['low_memory_mode'] else 'off'})")
+    for name, size in sorted(report['accounted'].items(), key=lambda item: -item[1]):
+        print(f"  {name:<16} {mb(size)}")
+    for name, size in report.get('processes', {}).items():
+        print(f"  {name + ' process':<16} {mb(size)} RSS")
+    for name, size in report.get('traced', {}).get('by_subsystem', {}).items():
+        print(f"  traced {name:<9} {mb(size)}")
+    ok = report['rss_bytes'] is not None and report['rss_bytes'] <= budget
+    print("Within budget." if ok else "OVER BUDGET.")
+    return ok
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check the running player's memory against its RSS budget.")
+    parser.add_argument('--check', action='store_true', help="Fetch /memory and compare RSS with the budget")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Web interface of the player")
+    parser.add_argument('--budget-mb', type=float, help="Budget to check against (default: MEMORY_RSS_BUDGET_MB of the player)")
+    args = parser.parse_args()
+    if not args.check:
+        parser.print_help()
+        sys.exit(2)
+    sys.exit(0 if check(args.url, args.budget_mb) else 1)
@@ -1,6 +1,26 @@
+import logging
 import os
+import re
 import socket
 
+import config
+
+logger = logging.getLogger(__name__)
+
+# Episode names like "S03E12" or "3x12": long episode lists jump between seasons
+_SEASON_EPISODE_RE = re.compile(r'(?i)\bs(\d{1,3})\s*e\d{1,4}|\b(\d{1,2})x\d{2,3}\b')
+
+def jump_key(item, level):
+    """Returns the jump bucket of a menu item: its season for episodes that name one, else its first letter."""
+    if level == 2:
+        match = _SEASON_EPISODE_RE.search(item)
+        if match:
+            return f"S{int(match.group(1) or match.group(2))}"
+    for ch in item:
+        if ch.isalnum():
+            return '#' if ch.isdigit() else ch.upper()
+    return '#'
+
 class MenuManager:
     def __init__(self, media_manager, state_manager):
         self.media_manager = media_manager
@@ -19,18 +39,22 @@ class MenuManager:
         # Stack stores cursor positions of previous levels
         self.cursor_stack = []
 
+        # Start index and label of each jump bucket in the current list, rebuilt when the list changes
+        self.jump_index = []
+        self.jump_index_key = None
+
     def enter_menu(self):
         """Activates menu mode."""
         self.active = True
         self.level = 0
         self.cursor = 0
         self.cursor_stack = []
-        print("Menu Mode: Entered")
+        logger.debug("Menu Mode: Entered")
 
     def exit_menu(self):
         """Deactivates menu mode."""
         self.active = False
-        print("Menu Mode: Exited")
+        logger.debug("Menu Mode: Exited")
         
     def get_current_view(self):
         """Returns the title and list of items for the current menu state."""
@@ -82,14 +106,64 @@ class MenuManager:
         """Moves the cursor up."""
         if self.cursor > 0:
             self.cursor -= 1
-            print(f"Menu Up: {self.cursor}")
+            logger.debug(f"Menu Up: {self.cursor}")
             
     def scroll_down(self):
         """Moves the cursor down."""
         _, items = self.get_current_view()
         if self.cursor < len(items) - 1:
             self.cursor += 1
-            print(f"Menu Down: {self.cursor}")
+            logger.debug(f"Menu Down: {self.cursor}")
+
+    def scroll_by(self, delta):
+        """Moves the cursor by `delta` items, stopping at either end. Returns True if it moved."""
+        _, items = self.get_current_view()
+        cursor = min(max(self.cursor + delta, 0), max(len(items) - 1, 0))
+        if cursor == self.cursor:
+            return False
+        self.cursor = cursor
+        logger.debug(f"Menu Scroll: {self.cursor + 1}/{len(items)}")
+        return True
+
+    @staticmethod
+    def repeat_step(held_seconds):
+        """Items to move per repeat while a scroll button has been held this long."""
+        step = 1
+        for min_held, items in config.MENU_SCROLL_ACCELERATION:
+            if held_seconds >= min_held:
+                step = items
+        return step
+
+    def _get_jump_index(self, items):
+        """Returns [(start index, label)] for the current list, computing it once per list."""
+        key = (self.level, self.selected_show_index, self.selected_season_index, id(self.media_manager.shows), len(items))
+        if key != self.jump_index_key:
+            self.jump_index = []
+            for index, item in enumerate(items):
+                label = jump_key(item, self.level)
+                if not self.jump_index or self.jump_index[-1][1] != label:
+                    self.jump_index.append((index, label))
+            self.jump_index_key = key
+        return self.jump_index
+
+    def jump(self, direction):
+        """
+        Moves the cursor to the start of the next (direction 1) or previous
+        (direction -1) letter or season bucket, wrapping around the list.
+        Returns the bucket's label, or None if the list has only one bucket.
+        """
+        _, items = self.get_current_view()
+        buckets = self._get_jump_index(items)
+        if len(buckets) < 2:
+            return None
+        if direction > 0:
+            target = next(((index, label) for index, label in buckets if index > self.cursor), buckets[0])
+        else:
+            # From inside a bucket, go to its start first
+            target = next(((index, label) for index, label in reversed(buckets) if index < self.cursor), buckets[-1])
+        self.cursor = target[0]
+        logger.debug(f"Menu Jump: {target[1]} ({self.cursor + 1}/{len(items)})")
+        return target[1]
             
     def select(self):
         """
@@ -106,7 +180,7 @@ class MenuManager:
             if self.cursor == len(items) - 1:
                  return "TOGGLE_WEB_SERVER"
 
-            print(f"Selected Show: {items[self.cursor]}")
+            logger.debug(f"Selected Show: {items[self.cursor]}")
             self.selected_show_index = self.cursor
             self.cursor_stack.append(self.cursor)
             self.level = 1
@@ -114,7 +188,7 @@ class MenuManager:
             return None
             
         elif self.level == 1:
-            print(f"Selected Season: {items[self.cursor]}")
+            logger.debug(f"Selected Season: {items[self.cursor]}")
             self.selected_season_index = self.cursor
             self.cursor_stack.append(self.cursor)
             self.level = 2
@@ -122,7 +196,7 @@ class MenuManager:
             return None
             
         elif self.level == 2:
-            print(f"Selected Episode: {items[self.cursor]}")
+            logger.debug(f"Selected Episode: {items[self.cursor]}")
             # Play selection!
             return (self.selected_show_index, self.selected_season_index, self.cursor)
 
@@ -134,6 +208,6 @@ class MenuManager:
                 self.cursor = self.cursor_stack.pop()
             else:
                 self.cursor = 0
-            print("Menu Back")
+            logger.debug("Menu Back")
         else:
             self.exit_menu()
\ No newline at end of file
@@ -0,0 +1,139 @@
+# metrics.py
+# Minimal in-process metrics shared by all modules, rendered in the Prometheus
+# text format at /metrics. Recording is a lock plus a few integer operations,
+# cheap enough for the per-frame path.
+import bisect
+import os
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond frame work up to slow rescans
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = [] # Metrics in registration order
+_registry_lock = threading.Lock()
+
+class Counter:
+    """A value that only goes up."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self):
+        return [f"{self.name} {self.value}"]
+
+class Gauge:
+    """A value read from a callback when metrics are rendered."""
+    def __init__(self, name, help_text, read_value, kind='gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.read_value = read_value
+        self.kind = kind # 'counter' for callback values that only go up
+
+    def render(self):
+        try:
+            return [f"{self.name} {self.read_value()}"]
+        except Exception:
+            return []
+
+class Histogram:
+    """Counts observations into fixed buckets and keeps their sum."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager that observes the duration of its block."""
+        return _Timer(self)
+
+    def render(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+def counter(name, help_text):
+    """Creates and registers a Counter."""
+    return _register(Counter(name, help_text))
+
+def gauge(name, help_text, read_value, kind='gauge'):
+    """Creates and registers a Gauge backed by `read_value()`."""
+    return _register(Gauge(name, help_text, read_value, kind))
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    """Creates and registers a Histogram."""
+    return _register(Histogram(name, help_text, buckets))
+
+def render_prometheus():
+    """Returns every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+# --- Process metrics ---
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def read_rss_bytes():
+    """Returns the resident set size of this process (Linux)."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+def read_cpu_seconds():
+    """Returns user + system CPU time used by this process."""
+    times = os.times()
+    return times.user + times.system
+
+gauge('process_resident_memory_bytes', 'Resident memory size in bytes.', read_rss_bytes)
+gauge('process_cpu_seconds_total', 'Total user and system CPU time spent in seconds.', read_cpu_seconds, kind='counter')
@@ -0,0 +1,115 @@
+# mirror_manager.py
+import io
+import logging
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+class MirrorManager:
+    """
+    Mirrors what the panel shows to web viewers as an MJPEG stream.
+    Frames are encoded once at a reduced rate and shared by every viewer.
+    While nobody is subscribed, publish() returns straight away, so the
+    mirror adds no per-frame cost in normal operation. An image arriving too
+    soon after the last encode is kept pending, and a waiting viewer encodes
+    the latest one once the interval has passed, so the last redraw of a
+    burst always reaches the viewers.
+    """
+    def __init__(self, max_fps=config.MIRROR_MAX_FPS, jpeg_quality=config.MIRROR_JPEG_QUALITY):
+        self.min_interval = 1.0 / max_fps
+        self.jpeg_quality = jpeg_quality
+        self.subscribers = 0
+        self.last_image = None # Most recent image, kept so new viewers see the current screen
+        self.frame_jpeg = None
+        self.frame_seq = 0
+        self.last_encode_time = 0
+        self.pending = False # last_image is newer than frame_jpeg and waits for the interval
+        self.condition = threading.Condition()
+
+    def publish(self, image):
+        """Tap for every image sent to the panel. Encodes only while someone is watching."""
+        self.last_image = image
+        if not self.subscribers:
+            return
+
+        with self.condition:
+            now = time.monotonic()
+            if now - self.last_encode_time < self.min_interval:
+                if not self.pending:
+                    self.pending = True
+                    self.condition.notify_all() # Viewers now wait until it is due
+                return
+            self.pending = False
+            self.last_encode_time = now
+        self._encode(image)
+
+    def _encode(self, image):
+        """Encodes an image to JPEG and wakes all waiting viewers."""
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=self.jpeg_quality)
+        with self.condition:
+            self.frame_jpeg = buffer.getvalue()
+            self.frame_seq += 1
+            self.condition.notify_all()
+
+    def subscribe(self):
+        """Registers a viewer, so frames start being encoded."""
+        with self.condition:
+            self.subscribers += 1
+            first_viewer = self.subscribers == 1
+        logger.info(f"Mirror: viewer connected ({self.subscribers} watching)")
+        # The encoded frame is stale if nobody was watching; refresh it from the last image
+        if first_viewer and self.last_image is not None:
+            self._encode(self.last_image)
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+        logger.info(f"Mirror: viewer disconnected ({self.subscribers} watching)")
+
+    def wait_for_frame(self, last_seq, timeout=5):
+        """
+        Waits for a frame newer than `last_seq`, encoding a pending image once
+        it is due. Returns (seq, jpeg); after the timeout the current frame is
+        returned again.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.frame_seq == last_seq:
+                now = time.monotonic()
+                if self.pending and now - self.last_encode_time >= self.min_interval:
+                    self.pending = False
+                    self.last_encode_time = now
+                    image = self.last_image
+                    break
+                if now >= deadline:
+                    return self.frame_seq, self.frame_jpeg
+                wake = min(self.last_encode_time + self.min_interval, deadline) if self.pending else deadline
+                self.condition.wait(wake - now)
+            else:
+                return self.frame_seq, self.frame_jpeg
+        self._encode(image)
+        with self.condition:
+            return self.frame_seq, self.frame_jpeg
+
+    def stream(self):
+        """Generator yielding multipart MJPEG parts for a single viewer."""
+        self.subscribe()
+        try:
+            yield from mjpeg_parts(self.wait_for_frame)
+        finally:
+            self.unsubscribe()
+
+def mjpeg_parts(wait_for_frame):
+    """Yields multipart MJPEG parts from wait_for_frame(last_seq) -> (seq, jpeg)."""
+    last_seq = 0
+    while True:
+        # Wakes up periodically to resend the frame, which also detects dropped viewers
+        last_seq, jpeg = wait_for_frame(last_seq)
+        if jpeg is None:
+            continue
+        yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ' +
+               str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
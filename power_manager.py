@@ -0,0 +1,100 @@
+# power_manager.py
+import logging
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class PowerManager:
+    """
+    Audio-only mode: while the screen is off, the video track is deselected so
+    VLC stops decoding and scaling frames, but audio keeps playing and the
+    position keeps advancing. Re-selecting the track resumes video in place.
+
+    Process CPU time is accounted separately for each mode so the saving can be
+    read from get_stats(). Only time spent playing counts, so paused, menu and
+    idle time don't water down the video figure.
+    """
+    def __init__(self, media_player):
+        self.media_player = media_player
+        self.audio_only = False
+        self.playing = False # Sampled by the player (see set_playing)
+        self.saved_video_track = None # Track id to restore when video comes back
+        self.lock = threading.Lock() # Accounting is read from web threads
+        self.mode_start_time = time.monotonic()
+        self.mode_start_cpu = metrics.read_cpu_seconds()
+        self.totals = {False: [0.0, 0.0], True: [0.0, 0.0]} # audio_only -> [cpu seconds, wall seconds]
+        metrics.gauge('pitv_audio_only', '1 while video decoding is turned off.', lambda: int(self.audio_only))
+
+    def _account(self):
+        """Adds the CPU and wall time since the last call to the current mode, if something was playing."""
+        with self.lock:
+            now, cpu = time.monotonic(), metrics.read_cpu_seconds()
+            if self.playing:
+                totals = self.totals[self.audio_only]
+                totals[0] += cpu - self.mode_start_cpu
+                totals[1] += now - self.mode_start_time
+            self.mode_start_time, self.mode_start_cpu = now, cpu
+
+    def set_playing(self, playing):
+        """Records whether media is playing; called periodically from the dispatcher."""
+        if playing != self.playing:
+            self._account()
+            self.playing = playing
+
+    def enter_audio_only(self):
+        """Stops video decoding; audio continues."""
+        if self.audio_only:
+            return
+        self._account()
+        self.audio_only = True
+        self.disable_video()
+        logger.info("Power: Audio-only mode on, video decoding stopped.")
+
+    def disable_video(self):
+        """Deselects the video track (again, e.g. after a new episode selected one)."""
+        track = self.media_player.video_get_track()
+        if track != -1:
+            self.saved_video_track = track
+            self.media_player.video_set_track(-1)
+
+    def exit_audio_only(self, restore_video=True):
+        """
+        Leaves audio-only mode. With restore_video, the video track is selected
+        again without restarting the episode.
+        """
+        if not self.audio_only:
+            return
+        self._account()
+        self.audio_only = False
+        if restore_video:
+            track = self._pick_video_track()
+            if track is not None:
+                self.media_player.video_set_track(track)
+        stats = self.get_stats()
+        if stats['cpu_percent_video'] is not None and stats['cpu_percent_audio_only'] is not None:
+            logger.info(f"Power: Audio-only mode off. CPU {stats['cpu_percent_audio_only']:.1f}% audio-only "
+                        f"vs {stats['cpu_percent_video']:.1f}% with video.")
+
+    def _pick_video_track(self):
+        """Returns the saved track id if the current media still has it, else its first video track."""
+        tracks = [track_id for track_id, _ in (self.media_player.video_get_track_description() or []) if track_id != -1]
+        if self.saved_video_track in tracks:
+            return self.saved_video_track
+        return tracks[0] if tracks else None
+
+    def get_stats(self):
+        """Returns the current mode and the average process CPU use in each mode."""
+        self._account()
+        def percent(mode):
+            cpu, wall = self.totals[mode]
+            return cpu / wall * 100 if wall > 0 else None
+        video, audio_only = percent(False), percent(True)
+        return {
+            'audio_only': self.audio_only,
+            'cpu_percent_video': video,
+            'cpu_percent_audio_only': audio_only,
+            'cpu_percent_saved': video - audio_only if video is not None and audio_only is not None else None,
+        }
@@ -0,0 +1,76 @@
+# prefetch_manager.py
+import logging
+import os
+import threading
+
+import vlc
+
+import config
+
+logger = logging.getLogger(__name__)
+
+class PrefetchManager:
+    """
+    Prepares the upcoming episode in the background so the switch at
+    end-of-stream doesn't start cold from the SD card: the first few MB are
+    pulled into the page cache and the media is pre-parsed by libvlc.
+    """
+    def __init__(self, vlc_instance, delay=config.PREFETCH_DELAY, warm_bytes=config.PREFETCH_WARM_BYTES):
+        self.vlc_instance = vlc_instance
+        self.delay = delay
+        self.warm_bytes = warm_bytes
+        self.lock = threading.Lock()
+        self.timer = None
+        self.prepared_path = None
+        self.prepared_media = None
+
+    def prepare(self, path):
+        """Schedules preparation of `path`, replacing any earlier request."""
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if not path or path == self.prepared_path:
+                return
+            # Wait a little so preparing doesn't compete with starting the current episode
+            self.timer = threading.Timer(self.delay, self._prepare, args=(path,))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _warm_page_cache(self, path):
+        """Asks the kernel to read ahead the start of the file."""
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, self.warm_bytes, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+    def _prepare(self, path):
+        try:
+            self._warm_page_cache(path)
+            media = self.vlc_instance.media_new(path)
+            # Parsing runs asynchronously on libvlc's own thread
+            media.parse_with_options(vlc.MediaParseFlag.local, config.PREFETCH_PARSE_TIMEOUT_MS)
+        except Exception as e:
+            logger.warning(f"Prefetch: Could not prepare {os.path.basename(path)}: {e}")
+            return
+
+        with self.lock:
+            old_media = self.prepared_media
+            self.prepared_path = path
+            self.prepared_media = media
+        if old_media:
+            old_media.release()
+        logger.debug(f"Prefetch: Prepared {os.path.basename(path)}")
+
+    def take(self, path):
+        """Returns the prepared media for `path` (handing over ownership), or None."""
+        with self.lock:
+            if path != self.prepared_path:
+                return None
+            media = self.prepared_media
+            self.prepared_path = None
+            self.prepared_media = None
+            return media
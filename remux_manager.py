@@ -0,0 +1,186 @@
+# remux_manager.py
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+
+import config
+
+# Codecs that browsers can play from MPEG-TS HLS segments without re-encoding
+BROWSER_VIDEO_CODECS = {'h264'}
+BROWSER_AUDIO_CODECS = {'aac', 'mp3'}
+
+class RemuxManager:
+    """
+    Serves media files to the browser as HLS, generating each segment on demand.
+    Streams are copied when the codecs allow it and only re-encoded otherwise.
+    Generated segments live in a size-bounded LRU cache, so seeking only
+    produces the segments the browser actually asks for.
+    """
+    def __init__(self, media_root_dir, segment_seconds=config.REMUX_SEGMENT_SECONDS,
+                 cache_max_bytes=config.REMUX_CACHE_MAX_BYTES):
+        self.media_root_dir = media_root_dir
+        self.segment_seconds = segment_seconds
+        self.cache_max_bytes = cache_max_bytes
+        self.segments = OrderedDict() # (path, mtime, index) -> segment bytes, oldest first
+        self.cache_bytes = 0
+        self.layouts = OrderedDict() # (path, mtime) -> probe info and segment boundaries, oldest first
+        self.lock = threading.Lock()
+        self.inflight = {} # Segment key -> Event, so concurrent requests share one ffmpeg run
+        # Only one ffmpeg at a time; the player needs the rest of the CPU
+        self.encoder_slot = threading.Semaphore(1)
+
+    def _abs_path(self, rel_path):
+        return os.path.join(self.media_root_dir, rel_path)
+
+    def _run_low_priority(self, cmd):
+        """Runs a command at reduced CPU priority and returns its stdout."""
+        # nice(1) rather than preexec_fn, which can deadlock the child of a threaded process before exec
+        return subprocess.run(['nice', '-n', str(config.REMUX_NICE)] + cmd,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+
+    def _probe(self, abs_path):
+        """Reads duration and codecs with ffprobe."""
+        output = self._run_low_priority([
+            'ffprobe', '-v', 'error', '-of', 'json',
+            '-show_entries', 'format=duration:stream=codec_type,codec_name',
+            abs_path
+        ])
+        data = json.loads(output)
+        info = {'duration': float(data.get('format', {}).get('duration', 0)), 'video': None, 'audio': None}
+        for stream in data.get('streams', []):
+            kind = stream.get('codec_type')
+            if kind in ('video', 'audio') and info[kind] is None:
+                info[kind] = stream.get('codec_name')
+        info['copy_video'] = info['video'] in BROWSER_VIDEO_CODECS
+        info['copy_audio'] = info['audio'] in BROWSER_AUDIO_CODECS
+        return info
+
+    def _keyframe_times(self, abs_path, cut_times):
+        """
+        Returns the video keyframe at or before each cut time. ffprobe seeks to
+        each cut through the container index and reads a single packet there,
+        so the file is never read end to end.
+        """
+        intervals = ','.join(f'{t:.3f}%+#1' for t in cut_times)
+        output = self._run_low_priority([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-of', 'csv=p=0',
+            '-read_intervals', intervals, '-show_entries', 'packet=pts_time,flags', abs_path
+        ])
+        times = set()
+        for line in output.decode(errors='ignore').splitlines():
+            parts = line.split(',')
+            if len(parts) >= 2 and 'K' in parts[1]:
+                try:
+                    times.add(float(parts[0]))
+                except ValueError:
+                    continue
+        return sorted(times)
+
+    def _get_layout(self, rel_path):
+        """Returns probe info and segment boundaries for a file, cached per mtime."""
+        abs_path = self._abs_path(rel_path)
+        key = (rel_path, os.path.getmtime(abs_path))
+        with self.lock:
+            layout = self.layouts.get(key)
+            if layout:
+                self.layouts.move_to_end(key)
+                return layout
+
+        info = self._probe(abs_path)
+        duration = info['duration']
+        boundaries = [i * self.segment_seconds for i in range(int(duration // self.segment_seconds) + 1)]
+        if info['copy_video']:
+            # Copied video can only be cut on keyframes: each cut moves back to the one before it
+            boundaries = self._keyframe_times(abs_path, boundaries) or boundaries
+        boundaries = [t for t in boundaries if t < duration] or [0.0]
+        boundaries.append(duration)
+
+        layout = {'info': info, 'boundaries': boundaries}
+        with self.lock:
+            self.layouts[key] = layout
+            while len(self.layouts) > config.REMUX_LAYOUT_CACHE_ENTRIES:
+                self.layouts.popitem(last=False)
+        return layout
+
+    def get_playlist(self, rel_path):
+        """Builds a VOD HLS playlist whose segment URIs are relative to the playlist."""
+        boundaries = self._get_layout(rel_path)['boundaries']
+        durations = [end - start for start, end in zip(boundaries, boundaries[1:])]
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{int(max(durations, default=self.segment_seconds)) + 1}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+        ]
+        for index, duration in enumerate(durations):
+            lines.append(f'#EXTINF:{duration:.3f},')
+            lines.append(f'{index}.ts')
+        lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    def get_segment(self, rel_path, index):
+        """Returns the bytes of one MPEG-TS segment, generating it if it isn't cached."""
+        abs_path = self._abs_path(rel_path)
+        layout = self._get_layout(rel_path)
+        boundaries = layout['boundaries']
+        if not 0 <= index < len(boundaries) - 1:
+            return None
+        key = (rel_path, os.path.getmtime(abs_path), index)
+
+        while True:
+            with self.lock:
+                data = self.segments.get(key)
+                if data is not None:
+                    self.segments.move_to_end(key)
+                    return data
+                pending = self.inflight.get(key)
+                if pending is None:
+                    pending = self.inflight[key] = threading.Event()
+                    break
+            # Someone else is generating this segment; wait for it and check the cache again
+            pending.wait()
+
+        try:
+            start, end = boundaries[index], boundaries[index + 1]
+            with self.encoder_slot:
+                data = self._generate_segment(abs_path, layout['info'], start, end)
+            self._cache_segment(key, data)
+            return data
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            pending.set()
+
+    def _generate_segment(self, abs_path, info, start, end):
+        """Cuts [start, end) into MPEG-TS, keeping the original timestamps so segments join up."""
+        cmd = ['ffmpeg', '-v', 'error', '-ss', f'{start:.3f}', '-i', abs_path, '-t', f'{end - start:.3f}',
+               '-copyts', '-map', '0:v:0?', '-map', '0:a:0?']
+        if info['copy_video']:
+            cmd += ['-c:v', 'copy']
+        else:
+            cmd += ['-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '28']
+        if info['copy_audio']:
+            cmd += ['-c:a', 'copy']
+        else:
+            cmd += ['-c:a', 'aac', '-b:a', '128k']
+        cmd += ['-muxdelay', '0', '-f', 'mpegts', 'pipe:1']
+        return self._run_low_priority(cmd)
+
+    def _cache_segment(self, key, data):
+        """Stores a segment, evicting the least recently used ones to stay within budget."""
+        if len(data) > self.cache_max_bytes:
+            return
+        with self.lock:
+            self.segments[key] = data
+            self.cache_bytes += len(data)
+            while self.cache_bytes > self.cache_max_bytes:
+                _, evicted = self.segments.popitem(last=False)
+                self.cache_bytes -= len(evicted)
+
+    def get_cache_info(self):
+        """Returns the segment cache usage."""
+        with self.lock:
+            return {'segments': len(self.segments), 'bytes': self.cache_bytes, 'max_bytes': self.cache_max_bytes}
@@ -0,0 +1,177 @@
+# search_index.py
+# Prefix search over show, season and episode names. Names are split into
+# normalized tokens (case and accents folded, letters and numbers separated,
+# leading zeros dropped, so "S02E03" matches "season 2 e3"); every
+# (token, entry) pair sits in one sorted list, and a query token's matches are
+# the contiguous range found with two binary searches. Rescans update the list
+# in place by diffing paths, so only changed entries cost anything.
+import functools
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SECONDS = metrics.histogram('pitv_search_seconds', 'Duration of library search queries.')
+
+_TOKEN_RE = re.compile(r'[^\W\d_]+|\d+')
+_REBUILD_FRACTION = 0.25 # Rebuild instead of patching when this share of entries changed
+
+def normalize_tokens(text):
+    """Splits text into lowercase, accent-free word and number tokens."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return [token.lstrip('0') or '0' if token.isdigit() else token for token in _TOKEN_RE.findall(text)]
+
+@functools.lru_cache(maxsize=4096)
+def _name_tokens(name):
+    """Tokens of one show/season/episode name; show and season names repeat for every episode."""
+    return frozenset(normalize_tokens(name))
+
+class SearchIndex:
+    """
+    Search entries for every show, season and episode of a MediaManager
+    library, keyed by their path relative to the media root.
+    """
+    TYPE_ORDER = {'show': 0, 'season': 1, 'episode': 2}
+
+    def __init__(self, media_root_dir, deferred=False):
+        self.media_root_dir = media_root_dir
+        self.deferred = deferred # Low-memory mode: nothing is built until the first search
+        self.pending_shows = None
+        self.entries = {}   # Entry id -> entry dict
+        self.ids = {}       # Relative path -> entry id
+        self.tokens = []    # Sorted (token, entry id) pairs
+        self.next_id = 0
+        self.lock = threading.Lock() # Rescans run on the dispatcher, searches on web threads
+
+    def _library_entries(self, shows):
+        """Returns {relative path: entry} for a scanned library."""
+        entries = {}
+        for show in shows:
+            entries[show['name']] = {'type': 'show', 'show': show['name'], 'path': show['name']}
+            for season in show['seasons']:
+                season_path = f"{show['name']}/{season['name']}"
+                entries[season_path] = {'type': 'season', 'show': show['name'], 'season': season['name'], 'path': season_path}
+                for episode_path in season['episodes']:
+                    rel_path = f"{season_path}/{os.path.basename(episode_path)}"
+                    entries[rel_path] = {'type': 'episode', 'show': show['name'], 'season': season['name'],
+                                         'episode': os.path.splitext(os.path.basename(episode_path))[0], 'path': rel_path}
+        return entries
+
+    def _entry_tokens(self, entry):
+        tokens = _name_tokens(entry['show'])
+        if 'season' in entry:
+            tokens = tokens | _name_tokens(entry['season'])
+        if 'episode' in entry:
+            tokens = tokens | frozenset(normalize_tokens(entry['episode']))
+        return tokens
+
+    def update(self, shows):
+        """Brings the index in line with a freshly scanned library."""
+        with self.lock:
+            if self.deferred:
+                self.pending_shows = shows
+                return
+        update_start = time.perf_counter()
+        library = self._library_entries(shows)
+        with self.lock:
+            added, removed = self._apply(library)
+        logger.info(f"Search index: {len(self.entries)} entries ({len(added)} added, {len(removed)} removed) "
+                    f"in {(time.perf_counter() - update_start) * 1000:.1f} ms")
+
+    def _build_deferred(self):
+        """Builds a deferred index from the last scan; concurrent first searches build it once."""
+        with self.lock:
+            if not self.deferred:
+                return
+            build_start = time.perf_counter()
+            self._apply(self._library_entries(self.pending_shows or []))
+            self.deferred = False
+            self.pending_shows = None
+        logger.info(f"Search index: Built {len(self.entries)} entries on first search "
+                    f"in {(time.perf_counter() - build_start) * 1000:.1f} ms")
+
+    def _apply(self, library):
+        removed = [path for path in self.ids if path not in library]
+        added = [path for path in library if path not in self.ids]
+
+        if len(removed) + len(added) > _REBUILD_FRACTION * max(len(self.ids), 1):
+            self.entries, self.ids, self.next_id = {}, {}, 0
+            pairs = []
+            for path, entry in library.items():
+                entry_id = self._add_entry(path, entry)
+                pairs.extend((token, entry_id) for token in entry['tokens'])
+            pairs.sort()
+            self.tokens = pairs
+        else:
+            for path in removed:
+                entry_id = self.ids.pop(path)
+                for token in self.entries.pop(entry_id)['tokens']:
+                    del self.tokens[bisect_left(self.tokens, (token, entry_id))]
+            for path in added:
+                entry_id = self._add_entry(path, library[path])
+                for token in library[path]['tokens']:
+                    insort(self.tokens, (token, entry_id))
+        return added, removed
+
+    def _add_entry(self, path, entry):
+        entry['tokens'] = self._entry_tokens(entry)
+        entry['text'] = ' ' + ' '.join(entry['tokens']) # Lets a prefix be checked with one substring search
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = entry
+        self.ids[path] = entry_id
+        return entry_id
+
+    def _token_range(self, prefix):
+        """Returns the (start, end) positions of tokens starting with `prefix`."""
+        return (bisect_left(self.tokens, (prefix,)),
+                bisect_left(self.tokens, (prefix + '\U0010ffff',)))
+
+    def search(self, query, limit=50):
+        """
+        Returns entries having a token that starts with each query token,
+        shows first, then seasons, then episodes; at most `limit` (at least 1)
+        are returned. The rarest query token picks the candidates; the others
+        are checked against each candidate.
+        """
+        limit = max(limit, 1)
+        if self.deferred:
+            self._build_deferred()
+        with SEARCH_SECONDS.time(), self.lock:
+            query_tokens = normalize_tokens(query)
+            if not query_tokens:
+                return {'results': [], 'truncated': False}
+            ranges = sorted((self._token_range(token), token) for token in set(query_tokens))
+            (start, end), rarest = min(ranges, key=lambda r: r[0][1] - r[0][0])
+            others = [' ' + token for _, token in ranges if token != rarest]
+
+            # Each type is collected separately, so episodes can't crowd out shows before the cut
+            by_type = {entry_type: [] for entry_type in self.TYPE_ORDER}
+            seen = set()
+            truncated = False
+            for position in range(start, end):
+                entry_id = self.tokens[position][1]
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                entry = self.entries[entry_id]
+                if all(prefix in entry['text'] for prefix in others):
+                    matches = by_type[entry['type']]
+                    if len(matches) == limit:
+                        truncated = True
+                    else:
+                        matches.append(entry)
+            matches = [entry for entry_type in self.TYPE_ORDER
+                       for entry in sorted(by_type[entry_type], key=lambda entry: entry['path'])]
+            if len(matches) > limit:
+                matches, truncated = matches[:limit], True
+            return {'results': [{key: value for key, value in entry.items() if key not in ('tokens', 'text')} for entry in matches],
+                    'truncated': truncated}
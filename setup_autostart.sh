@@ -40,7 +40,7 @@ if [ -d "$MEDIA_APP_DIR" ]; then
 fi
 
 # Create the systemd service file
-# We add a 10-second delay to ensure the desktop/audio system is fully up.
+# The app itself waits for SPI, GPIO and ALSA to be ready, so no fixed delay is needed.
 # We also set PYTHONUNBUFFERED so logs show up in journalctl immediately.
 cat > $SERVICE_NAME <<EOF
 [Unit]
@@ -55,8 +55,6 @@ User=$CURRENT_USER
 WorkingDirectory=$APP_DIR
 Environment="HOME=${USER_HOME}"
 Environment=PYTHONUNBUFFERED=1
-# Add a longer delay to ensure hardware is fully ready
-ExecStartPre=/bin/sleep 15
 ExecStart=$APP_DIR/run.sh
 Restart=always
 RestartSec=10
@@ -0,0 +1,73 @@
+# spi_benchmark.py
+# Measures full-frame throughput to the panel with the st7789 package's display()
+# and with SpiTransferEngine, against the theoretical frame rate of the SPI clock,
+# plus SpiTransferEngine on mostly static frames, where only changed tiles are sent.
+# Stop the player service first; use --simulate to run without the display.
+#
+#   python3 spi_benchmark.py [--frames 200] [--simulate] [--max-transfer 65536]
+import argparse
+import time
+
+from PIL import Image
+
+import config
+from spi_transfer import SpiTransferEngine, SimulatedPanel, SimulatedSpiDevice, read_spidev_bufsiz
+
+def make_frames(width, height, count=2):
+    """Returns noise frames, so nothing about the content can be cached."""
+    return [Image.effect_noise((width, height), 64).convert('RGB') for _ in range(count)]
+
+def make_moving_frames(width, height, count=30, size=40):
+    """Returns frames where only a small square moves over a static background, like much of animation."""
+    background = Image.effect_noise((width, height), 64).convert('RGB')
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = i * (width - size) // count
+        frame.paste((255, 200, 0), (x, height // 2, x + size, height // 2 + size))
+        frames.append(frame)
+    return frames
+
+def measure(send, frames, count):
+    """Returns frames per second for `count` calls of send(frame)."""
+    start = time.perf_counter()
+    for i in range(count):
+        send(frames[i % len(frames)])
+    return count / (time.perf_counter() - start)
+
+def open_panel(simulate):
+    if simulate:
+        return SimulatedPanel(spi=SimulatedSpiDevice(config.SPI_SPEED_HZ))
+    import ST7789
+    panel = ST7789.ST7789(port=0, cs=1, dc=9, backlight=13, spi_speed_hz=config.SPI_SPEED_HZ, rotation=0)
+    panel.begin()
+    return panel
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full-frame SPI transfers to the display.")
+    parser.add_argument('--frames', type=int, default=200, help="Frames to send with each method")
+    parser.add_argument('--simulate', action='store_true', help="Use a simulated SPI device with the bus timing of SPI_SPEED_HZ")
+    parser.add_argument('--max-transfer', type=int, help="Bytes per transfer (default: spidev bufsiz)")
+    args = parser.parse_args()
+
+    panel = open_panel(args.simulate)
+    width, height = panel.width, panel.height
+    frames = make_frames(width, height)
+    moving_frames = make_moving_frames(width, height)
+    engine = SpiTransferEngine(panel, width, height, max_transfer=args.max_transfer)
+
+    theoretical_fps = config.SPI_SPEED_HZ / (width * height * 16)
+    print(f"Panel {width}x{height} RGB565 at {config.SPI_SPEED_HZ / 1e6:g} MHz: theoretical {theoretical_fps:.1f} fps")
+    print(f"spidev bufsiz {read_spidev_bufsiz()} bytes; engine sends {len(engine.chunks)} transfer(s) of up to {engine.max_transfer} bytes")
+
+    for name, send, content in (("st7789 display()", panel.display, frames), ("SpiTransferEngine", engine.write, frames),
+                                ("  mostly static", engine.write, moving_frames)):
+        bytes_before = engine.bytes_sent
+        fps = measure(send, content, args.frames)
+        megabytes = fps * width * height * 2 / 1e6
+        print(f"  {name:<18} {fps:6.1f} fps  {megabytes:5.2f} MB/s  {fps / theoretical_fps:6.1%} of theoretical")
+    sent = (engine.bytes_sent - bytes_before) / (args.frames * width * height * 2)
+    print(f"  (mostly static: {sent:.1%} of the full-frame bytes sent; MB/s counts full frames)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# spi_transfer.py
+import time
+
+import numpy as np
+
+import config
+
+SPIDEV_BUFSIZ_PATH = '/sys/module/spidev/parameters/bufsiz'
+DEFAULT_SPIDEV_BUFSIZ = 4096 # Kernel default when the parameter can't be read
+
+def read_spidev_bufsiz(path=SPIDEV_BUFSIZ_PATH):
+    """Returns the largest single transfer the spidev driver accepts, in bytes."""
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return DEFAULT_SPIDEV_BUFSIZ
+
+class SpiTransferEngine:
+    """
+    Pushes frames to an ST7789 panel with as few, as large SPI transfers as
+    the kernel allows. RGB565 conversion runs into preallocated numpy buffers and
+    the frame is sent as memoryview slices of one byte buffer, so a frame costs
+    no Python-level allocations per chunk (the st7789 package builds a Python
+    list of every pixel byte and writes it 4 KB at a time).
+
+    Each frame is compared with the one on the panel in tiles of `tile_size`
+    pixels. Identical frames are not sent at all; otherwise only the bands of
+    tile rows that changed are sent, each in an address window cut to its
+    changed columns, unless they cover most of the frame anyway.
+
+    `disp` is the ST7789 driver (or a SimulatedPanel); it is only used to set
+    the address window and the data/command line.
+    """
+    def __init__(self, disp, width, height, max_transfer=None, tile_size=config.SPI_TILE_SIZE):
+        self.disp = disp
+        self.spi = disp._spi
+        self.width = width
+        self.height = height
+        self.max_transfer = max_transfer or min(read_spidev_bufsiz(), config.SPI_MAX_TRANSFER_BYTES)
+
+        # Conversion scratch space and the big-endian RGB565 frame the panel expects
+        self.scratch = np.empty((height, width), dtype=np.uint16)
+        self.channel = np.empty((height, width), dtype=np.uint16)
+        self.pixels = np.empty((height, width), dtype='>u2')
+        frame = memoryview(self.pixels.view(np.uint8).reshape(-1))
+        self.chunks = [frame[start:start + self.max_transfer] for start in range(0, len(frame), self.max_transfer)]
+        # Older spidev builds lack writebytes2 and need lists, which is what we avoid
+        self.write_chunk = getattr(self.spi, 'writebytes2', None) or (lambda chunk: self.spi.writebytes(list(chunk)))
+
+        # What the panel shows, for partial updates (tile_size 0 sends every frame in full)
+        self.tile_size = tile_size
+        self.previous = np.empty_like(self.pixels)
+        self.previous_valid = False
+        self.changed = np.empty((height, width), dtype=bool)
+        self.tile_rows = np.arange(0, height, tile_size or height)
+        self.tile_cols = np.arange(0, width, tile_size or width)
+        self.staging = np.empty(height * width, dtype='>u2') # Bands narrower than the frame are gathered here
+        self.full_frame_limit = config.SPI_PARTIAL_MAX_FRACTION * width * height
+
+        self.frames_sent = 0
+        self.frames_unchanged = 0
+        self.frames_partial = 0
+        self.bytes_sent = 0
+
+    def convert(self, image):
+        """Converts an RGB image (or an HxWx3 uint8 array) to RGB565 in self.pixels."""
+        rgb = np.asarray(image)
+        scratch, channel = self.scratch, self.channel
+        # scratch = (R & 0xF8) << 8 | (G & 0xFC) << 3 | B >> 3, without temporaries
+        np.copyto(scratch, rgb[:, :, 0])
+        np.bitwise_and(scratch, 0xF8, out=scratch)
+        np.left_shift(scratch, 8, out=scratch)
+        np.copyto(channel, rgb[:, :, 1])
+        np.bitwise_and(channel, 0xFC, out=channel)
+        np.left_shift(channel, 3, out=channel)
+        np.bitwise_or(scratch, channel, out=scratch)
+        np.copyto(channel, rgb[:, :, 2])
+        np.right_shift(channel, 3, out=channel)
+        np.bitwise_or(scratch, channel, out=scratch)
+        np.copyto(self.pixels, scratch) # Byte-swaps into the panel's order
+
+    def invalidate(self):
+        """Sends the next frame in full, e.g. after the panel was re-initialized."""
+        self.previous_valid = False
+
+    def changed_bands(self):
+        """
+        Returns (y0, y1, x0, x1) pixel rectangles (end exclusive) covering the
+        tiles where self.pixels differs from the panel: one per run of changed
+        tile rows, cut to the columns that changed in it.
+        """
+        np.not_equal(self.pixels, self.previous, out=self.changed)
+        tiles = np.logical_or.reduceat(np.logical_or.reduceat(self.changed, self.tile_rows, axis=0), self.tile_cols, axis=1)
+        changed_rows = np.flatnonzero(tiles.any(axis=1))
+        bands = []
+        start = 0
+        for i in range(1, len(changed_rows) + 1):
+            if i < len(changed_rows) and changed_rows[i] == changed_rows[i - 1] + 1:
+                continue
+            first, last = changed_rows[start], changed_rows[i - 1]
+            columns = np.flatnonzero(tiles[first:last + 1].any(axis=0))
+            bands.append((int(self.tile_rows[first]), int(min(self.tile_rows[last] + self.tile_size, self.height)),
+                          int(self.tile_cols[columns[0]]), int(min(self.tile_cols[columns[-1]] + self.tile_size, self.width))))
+            start = i
+        return bands
+
+    def write(self, image):
+        """Converts one frame and sends what changed since the last one."""
+        self.convert(image)
+        bands = None
+        if self.tile_size and self.previous_valid:
+            bands = self.changed_bands()
+            if not bands:
+                self.frames_unchanged += 1
+                return
+            if sum((y1 - y0) * (x1 - x0) for y0, y1, x0, x1 in bands) > self.full_frame_limit:
+                bands = None # Fewer, larger transfers win
+
+        if bands is None:
+            self.disp.set_window()
+            self.disp.send([], True) # Data/command line high: pixel data follows
+            for chunk in self.chunks:
+                self.write_chunk(chunk)
+            self.bytes_sent += self.pixels.nbytes
+        else:
+            for band in bands:
+                self._write_band(*band)
+            self.frames_partial += 1
+        self.frames_sent += 1
+        np.copyto(self.previous, self.pixels)
+        self.previous_valid = True
+
+    def _write_band(self, y0, y1, x0, x1):
+        """Sends the rectangle rows y0..y1, columns x0..x1 (end exclusive) of self.pixels."""
+        if x0 == 0 and x1 == self.width:
+            data = self.pixels[y0:y1].view(np.uint8).reshape(-1) # Whole rows are contiguous already
+        else:
+            count = (y1 - y0) * (x1 - x0)
+            np.copyto(self.staging[:count].reshape(y1 - y0, x1 - x0), self.pixels[y0:y1, x0:x1])
+            data = self.staging[:count].view(np.uint8)
+        data = memoryview(data)
+        self.disp.set_window(x0, y0, x1 - 1, y1 - 1)
+        self.disp.send([], True)
+        for start in range(0, len(data), self.max_transfer):
+            self.write_chunk(data[start:start + self.max_transfer])
+        self.bytes_sent += len(data)
+
+    def get_stats(self):
+        return {'frames': self.frames_sent + self.frames_unchanged, 'sent': self.frames_sent,
+                'unchanged': self.frames_unchanged, 'partial': self.frames_partial, 'bytes_sent': self.bytes_sent}
+
+class SimulatedSpiDevice:
+    """
+    Stands in for spidev.SpiDev: counts transfers and, with `simulate_timing`,
+    sleeps as long as the bus would take at `max_speed_hz`.
+    """
+    def __init__(self, max_speed_hz=config.SPI_SPEED_HZ, simulate_timing=True):
+        self.max_speed_hz = max_speed_hz
+        self.simulate_timing = simulate_timing
+        self.transfers = 0
+        self.bytes_written = 0
+
+    def writebytes2(self, data):
+        size = len(data)
+        self.transfers += 1
+        self.bytes_written += size
+        if self.simulate_timing:
+            time.sleep(size * 8 / self.max_speed_hz)
+
+    def writebytes(self, data):
+        self.writebytes2(data)
+
+    def xfer3(self, data):
+        self.writebytes2(data)
+
+class SimulatedPanel:
+    """Stands in for the ST7789 driver, for testing without the display."""
+    def __init__(self, width=240, height=240, spi=None):
+        self.width = width
+        self.height = height
+        self._spi = spi or SimulatedSpiDevice()
+
+    def set_window(self, x0=0, y0=0, x1=None, y1=None):
+        self._spi.writebytes2(bytes(11)) # CASET/RASET/RAMWR commands and coordinates
+
+    def send(self, data, is_data=True, chunk_size=4096):
+        if len(data):
+            self._spi.writebytes2(bytes(data))
+
+    def display(self, image):
+        """Sends a frame the way the st7789 package does: a list of bytes, 4 KB per transfer."""
+        self.set_window()
+        pb = np.asarray(image.convert('RGB')).astype('uint16')
+        color = ((pb[:, :, 0] & 0xF8) << 8) | ((pb[:, :, 1] & 0xFC) << 3) | (pb[:, :, 2] >> 3)
+        data = np.dstack(((color >> 8) & 0xFF, color & 0xFF)).flatten().tolist()
+        for start in range(0, len(data), 4096):
+            self._spi.xfer3(data[start:start + 4096])
@@ -0,0 +1,73 @@
+# startup_timeline.py
+import glob
+import logging
+import os
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Import this module first so the timeline starts as close to process start as possible
+_start_time = time.monotonic()
+_marks = [] # (stage name, seconds since start)
+
+def mark(stage):
+    """Records that a startup stage was reached."""
+    elapsed = time.monotonic() - _start_time
+    _marks.append((stage, elapsed))
+    logger.info(f"Startup: {stage} at {elapsed:.2f}s")
+
+def get_timeline():
+    """Returns the recorded stages with the time each one took since the previous stage."""
+    timeline = []
+    previous = 0.0
+    for stage, elapsed in _marks:
+        timeline.append({'stage': stage, 'at_s': round(elapsed, 3), 'took_s': round(elapsed - previous, 3)})
+        previous = elapsed
+    return timeline
+
+def print_report():
+    """Logs where the time to first frame went, as one record."""
+    lines = [f"  {entry['at_s']:7.2f}s  (+{entry['took_s']:.2f}s)  {entry['stage']}" for entry in get_timeline()]
+    logger.info("Startup timeline:\n" + "\n".join(lines))
+
+def wait_for(name, probe, timeout):
+    """
+    Polls `probe()` with exponential backoff until it returns True or the timeout
+    passes. Returns whether the resource became ready.
+    """
+    deadline = time.monotonic() + timeout
+    delay = config.STARTUP_PROBE_INITIAL_DELAY
+    while not probe():
+        if time.monotonic() >= deadline:
+            logger.warning(f"Startup: {name} not ready after {timeout}s, continuing anyway.")
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, config.STARTUP_PROBE_MAX_DELAY)
+    mark(f"{name} ready")
+    return True
+
+# --- Readiness Probes ---
+def spi_ready():
+    """The SPI device node used by the display exists."""
+    return os.path.exists(config.STARTUP_SPI_DEVICE)
+
+def gpio_ready():
+    """A GPIO character device is available for the buttons."""
+    return bool(glob.glob('/dev/gpiochip*'))
+
+def alsa_ready():
+    """ALSA has registered at least one sound card."""
+    try:
+        with open('/proc/asound/cards') as f:
+            return 'no soundcards' not in f.read()
+    except OSError:
+        return False
+
+def wait_for_hardware():
+    """Waits only as long as needed for SPI, GPIO and ALSA to come up."""
+    timeout = config.STARTUP_PROBE_TIMEOUT
+    wait_for("SPI", spi_ready, timeout)
+    wait_for("GPIO", gpio_ready, timeout)
+    wait_for("ALSA", alsa_ready, timeout)
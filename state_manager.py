@@ -1,9 +1,31 @@
 # state_manager.py
 import json
+import logging
 import os
+import threading
+import time
+from collections import deque
+
 import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+STATE_SAVE_SECONDS = metrics.histogram('pitv_state_save_seconds', 'Time to write the state file.')
+STATE_WRITES = metrics.counter('pitv_state_writes_total', 'State file writes.')
+STATE_WRITES_SKIPPED = metrics.counter('pitv_state_writes_skipped_total', 'Checkpoints skipped because nothing changed meaningfully or the write budget was used up.')
 
 class StateManager:
+    """
+    Keeps the player state in memory and writes it to disk in the background.
+    save_state() and record_position() only record the state; a writer thread
+    coalesces updates and replaces the file atomically. The player calls
+    record_position() on a timer to checkpoint the playback position.
+    Position-only changes are written when they moved at least
+    STATE_POSITION_EPSILON seconds, spaced evenly so there are at most
+    STATE_MAX_WRITES_PER_HOUR of them, trading resume accuracy against SD card
+    wear. Structural changes are always written and don't use up that budget.
+    """
     def __init__(self, state_file_path):
         self.state_file_path = state_file_path
         self.default_state = {
@@ -16,10 +38,21 @@ class StateManager:
             'shuffle_enabled': False,
             'web_server_enabled': True
         }
+        self.lock = threading.RLock() # Guards the in-memory state; never held during disk I/O
+        self.write_lock = threading.Lock() # One file write at a time (writer thread, flush on exit)
+        self.wake = threading.Event()
+        self.write_times = deque() # Monotonic times of writes within the last hour
+        self.last_position_write = None # Monotonic time of the last position-only write
+        self.writer_thread = None
         self.state = self.load_state()
+        self.saved_state = dict(self.state) # What is on disk
+        metrics.gauge('pitv_state_writes_per_hour', 'State file writes during the last hour.', self.get_writes_per_hour)
 
     def load_state(self):
         """Loads the player state from the JSON file."""
+        # Make sure anything still waiting to be written is on disk first
+        if self.writer_thread:
+            self.flush()
         if os.path.exists(self.state_file_path):
             try:
                 with open(self.state_file_path, 'r') as f:
@@ -27,35 +60,136 @@ class StateManager:
                     # Merge with default state to handle new fields in future
                     return {**self.default_state, **loaded_state}
             except json.JSONDecodeError:
-                print(f"Error decoding state file '{self.state_file_path}', starting with default state.")
-                return self.default_state
+                logger.warning(f"Error decoding state file '{self.state_file_path}', starting with default state.")
+                return dict(self.default_state)
             except IOError as e:
-                print(f"Error reading state file '{self.state_file_path}': {e}, starting with default state.")
-                return self.default_state
-        print("No state file found, starting with default state.")
-        return self.default_state
+                logger.warning(f"Error reading state file '{self.state_file_path}': {e}, starting with default state.")
+                return dict(self.default_state)
+        logger.info("No state file found, starting with default state.")
+        return dict(self.default_state)
 
     def save_state(self, current_show_idx, current_season_idx, current_episode_idx,
                    playback_position, volume_percent, is_sleeping, shuffle_enabled, web_server_enabled):
-        """Saves the current player state to the JSON file."""
-        self.state = {
-            'current_show_idx': current_show_idx,
-            'current_season_idx': current_season_idx,
-            'current_episode_idx': current_episode_idx,
-            'playback_position': playback_position,
-            'volume_percent': volume_percent,
-            'is_sleeping': is_sleeping,
-            'shuffle_enabled': shuffle_enabled,
-            'web_server_enabled': web_server_enabled
-        }
+        """Records the current player state. It is written to disk shortly after, in the background."""
+        with self.lock:
+            self.state = {
+                'current_show_idx': current_show_idx,
+                'current_season_idx': current_season_idx,
+                'current_episode_idx': current_episode_idx,
+                'playback_position': playback_position,
+                'volume_percent': volume_percent,
+                'is_sleeping': is_sleeping,
+                'shuffle_enabled': shuffle_enabled,
+                'web_server_enabled': web_server_enabled
+            }
+        self.wake.set()
+
+    def record_position(self, position, show_idx, season_idx, episode_idx):
+        """
+        Records a playback position checkpoint (seconds) with the episode it
+        belongs to, so the file never pairs a position with another episode.
+        """
+        with self.lock:
+            self.state['current_show_idx'] = show_idx
+            self.state['current_season_idx'] = season_idx
+            self.state['current_episode_idx'] = episode_idx
+            self.state['playback_position'] = position
+        self.wake.set()
+
+    def start(self):
+        """Starts the background writer thread."""
+        if self.writer_thread and self.writer_thread.is_alive():
+            return
+        self.writer_thread = threading.Thread(target=self._run, name="StateWriterThread")
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    def _run(self):
+        while True:
+            # Sleeps until something was recorded, so an idle player causes no wake-ups
+            self.wake.wait()
+            time.sleep(config.STATE_WRITE_DELAY) # Let a burst of updates collapse into one write
+            self.wake.clear()
+            self.checkpoint()
+
+    def _changes(self):
+        """Returns (anything other than the position changed, position moved meaningfully)."""
+        with self.lock:
+            state, saved = dict(self.state), self.saved_state
+        structural = any(state.get(key) != saved.get(key) for key in state if key != 'playback_position')
+        moved = abs(state.get('playback_position', 0) - saved.get('playback_position', 0)) >= config.STATE_POSITION_EPSILON
+        return structural, moved
+
+    def _within_budget(self):
+        """True once a position-only write is due: they are spaced 3600 / STATE_MAX_WRITES_PER_HOUR seconds apart."""
+        return (self.last_position_write is None or
+                time.monotonic() - self.last_position_write >= 3600 / config.STATE_MAX_WRITES_PER_HOUR)
+
+    def checkpoint(self):
+        """Writes the state if it changed meaningfully and the write budget allows it."""
+        with self.write_lock:
+            with self.lock:
+                structural, moved = self._changes()
+                # Episode, volume, sleep etc. always get written; position-only updates are budgeted
+                if not structural and not (moved and self._within_budget()):
+                    if moved:
+                        STATE_WRITES_SKIPPED.inc()
+                    return False
+                state = dict(self.state)
+            if not self._write(state):
+                return False
+            if not structural:
+                self.last_position_write = time.monotonic()
+            return True
+
+    def flush(self):
+        """Writes any unsaved change right away (e.g. on exit)."""
+        with self.write_lock:
+            with self.lock:
+                if self.state == self.saved_state:
+                    return
+                state = dict(self.state)
+            self._write(state)
+
+    def _write(self, state):
+        """
+        Atomically replaces the state file with a snapshot of the state and
+        returns whether it worked. Runs without self.lock, so recording state
+        never waits for the SD card.
+        """
         try:
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(self.state_file_path), exist_ok=True)
-            with open(self.state_file_path, 'w') as f:
-                json.dump(self.state, f, indent=4)
-            print("State saved.")
+            with STATE_SAVE_SECONDS.time():
+                # Ensure the directory exists
+                os.makedirs(os.path.dirname(self.state_file_path), exist_ok=True)
+                temp_path = self.state_file_path + '.tmp'
+                with open(temp_path, 'w') as f:
+                    json.dump(state, f, separators=(',', ':'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.state_file_path)
+                # The rename is only durable once the directory is synced too
+                dir_fd = os.open(os.path.dirname(self.state_file_path), os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
         except IOError as e:
-            print(f"Error saving state file '{self.state_file_path}': {e}")
+            logger.error(f"Error saving state file '{self.state_file_path}': {e}")
+            return False
+        with self.lock:
+            self.saved_state = state
+            self.write_times.append(time.monotonic())
+        STATE_WRITES.inc()
+        logger.debug("State saved.")
+        return True
+
+    def get_writes_per_hour(self):
+        """Returns how many times the state file was written during the last hour."""
+        with self.lock:
+            cutoff = time.monotonic() - 3600
+            while self.write_times and self.write_times[0] < cutoff:
+                self.write_times.popleft()
+            return len(self.write_times)
 
     def get_state(self):
         """Returns the current loaded state."""
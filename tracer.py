@@ -0,0 +1,141 @@
+# tracer.py
+# Lightweight span tracer for input latency. Spans go into an in-memory ring
+# buffer and are exported as Chrome trace-event JSON (open /trace in
+# chrome://tracing or https://ui.perfetto.dev). An "interaction" runs from a
+# button or web command being issued to the first screen update that can show
+# its result: a redraw made by its handler, or any frame or redraw after the
+# handler returned. Its duration feeds pitv_input_to_screen_seconds.
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+import config
+import memory_budget
+import metrics
+
+INPUT_TO_SCREEN_SECONDS = metrics.histogram('pitv_input_to_screen_seconds', 'Time from a button/web command to the next frame or screen redraw after its handler ran.')
+
+_start = time.monotonic()
+_events = deque(maxlen=config.TRACE_BUFFER_EVENTS) # (name, category, start, duration, thread id, args)
+_thread_names = {}
+_lock = threading.Lock()
+_interactions = [] # Open interactions: [origin, command, start time, handled, id of the thread running its handler]
+_INTERACTION_TIMEOUT = 10 # Seconds; e.g. commands issued while asleep never reach the screen
+memory_budget.register('trace buffer', lambda: memory_budget.deep_size(_events))
+
+def _now():
+    return time.monotonic()
+
+def _record(name, category, start, duration, args=None):
+    if not config.TRACE_ENABLED:
+        return
+    thread = threading.current_thread()
+    _thread_names[thread.ident] = thread.name
+    _events.append((name, category, start, duration, thread.ident, args))
+
+class _Span:
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self.name, self.category, self.start, _now() - self.start, self.args)
+        return False
+
+def span(name, category='player', **args):
+    """Context manager recording how long its block took."""
+    return _Span(name, category, args or None)
+
+def traced(name=None, category='player'):
+    """Decorator recording a span for every call of the function."""
+    def decorate(func):
+        span_name = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(span_name, category, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def record_span(name, start, end, category='player', **args):
+    """Records a span whose start and end (time.monotonic()) were measured elsewhere."""
+    _record(name, category, start, end - start, args or None)
+
+def instant(name, category='input', **args):
+    """Records a point in time, e.g. a button edge."""
+    _record(name, category, _now(), 0, args or None)
+
+# --- Interactions (input -> screen) ---
+def start_interaction(origin, command):
+    """Opens an interaction when a command is issued from a button or the web."""
+    now = _now()
+    with _lock:
+        _interactions[:] = [interaction for interaction in _interactions if now - interaction[2] < _INTERACTION_TIMEOUT]
+        _interactions.append([origin, command, now, False, None])
+
+def command_started(command):
+    """Called by the dispatcher before running a command's handler."""
+    if not _interactions:
+        return
+    runner = threading.get_ident()
+    with _lock:
+        for interaction in _interactions:
+            if interaction[1] == command and interaction[4] is None:
+                interaction[4] = runner
+
+def command_finished(command):
+    """Called by the dispatcher after a command's handler returned: its interactions now wait for the screen."""
+    if not _interactions:
+        return
+    runner = threading.get_ident()
+    with _lock:
+        for interaction in _interactions:
+            if interaction[1] == command and interaction[4] == runner:
+                interaction[3] = True
+
+def is_waiting_for_screen():
+    """True while an interaction's handler ran but the screen hasn't updated yet."""
+    return any(interaction[3] for interaction in _interactions)
+
+def screen_updated(kind):
+    """
+    Called after a frame or redraw reached the panel; closes the interactions it
+    answers. While a handler runs, only a redraw from the handler itself counts:
+    a video frame arriving meanwhile predates the command's effect.
+    """
+    if not _interactions:
+        return
+    now = _now()
+    caller = threading.get_ident()
+    with _lock:
+        done = [interaction for interaction in _interactions if interaction[3] or interaction[4] == caller]
+        _interactions[:] = [interaction for interaction in _interactions if not (interaction[3] or interaction[4] == caller)]
+    for origin, command, start, _, _ in done:
+        INPUT_TO_SCREEN_SECONDS.observe(now - start)
+        _record(f"{origin}: {command}", 'interaction', start, now - start, {'answered_by': kind})
+
+# --- Export ---
+def get_chrome_trace():
+    """Returns the buffered spans as a Chrome trace-event document."""
+    pid = os.getpid()
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}}
+              for tid, thread_name in list(_thread_names.items())]
+    for name, category, start, duration, tid, args in list(_events):
+        event = {'name': name, 'cat': category, 'pid': pid, 'tid': tid, 'ts': round((start - _start) * 1e6, 1)}
+        if duration:
+            event.update({'ph': 'X', 'dur': round(duration * 1e6, 1)})
+        else:
+            event.update({'ph': 'i', 's': 't'})
+        if args:
+            event['args'] = args
+        events.append(event)
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
@@ -0,0 +1,267 @@
+# web_ipc.py
+# Local IPC between the player and a web server running in its own process
+# (config.WEB_SERVER_PROCESS). The player serves a small set of calls over a
+# Unix socket; the web process uses PlayerProxy in place of MainApp, so the
+# Flask routes work unchanged in either mode.
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+import config
+
+logger = logging.getLogger(__name__)
+
+AUTHKEY_ENV = 'PITV_IPC_AUTHKEY'
+
+# MainApp methods the web process may call
+PLAYER_CALLS = (
+    'play_pause', 'next_episode', 'prev_episode', 'next_show', 'rewind', 'fast_forward',
+    'toggle_shuffle', 'rotate_screen', 'volume_up', 'volume_down', 'play_media', 'set_audio_only',
+    'is_safe_path', 'get_current_video_path', 'apply_library_batch', 'record_upload',
+    'find_duplicate', 'get_duplicates', 'dedupe_library', 'get_dedupe_status', 'search_library',
+    'get_playback_status', 'get_dispatcher_stats', 'get_health_stats', 'get_power_stats', 'get_display_stats',
+    'get_startup_timeline', 'get_metrics_text', 'get_trace', 'get_logs', 'get_memory_report',
+)
+
+class PlayerIpcServer:
+    """
+    Answers calls from the web process on a Unix socket, one thread per
+    connection. Each request is (call name, args); each reply is ('ok', result)
+    or ('error', message). Events for Socket.IO clients are queued by publish()
+    and collected by the web process with a blocking 'wait_events' call.
+    """
+    def __init__(self, main_app, address=config.WEB_IPC_ADDRESS):
+        self.address = address
+        self.authkey = os.urandom(16) # Handed to the web process through its environment
+        self.calls = {name: getattr(main_app, name) for name in PLAYER_CALLS}
+        mirror = main_app.display_manager.mirror
+        self.calls.update({
+            'list_directory': main_app.media_manager.list_directory,
+            'get_media_root_dir': lambda: main_app.media_manager.media_root_dir,
+            'mirror_subscribe': mirror.subscribe,
+            'mirror_unsubscribe': mirror.unsubscribe,
+            'mirror_wait_for_frame': mirror.wait_for_frame,
+            'wait_events': self.wait_events,
+        })
+        self.events = deque(maxlen=config.WEB_IPC_EVENT_BACKLOG) # (id, name, data)
+        self.event_id = 0
+        self.event_condition = threading.Condition()
+        self.listener = None
+
+    def start(self):
+        """Starts accepting connections in a daemon thread."""
+        if self.listener:
+            return
+        if os.path.exists(self.address):
+            os.unlink(self.address) # Left over from an earlier run
+        self.listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        thread = threading.Thread(target=self._accept, name="PlayerIpcThread")
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except Exception as e:
+                logger.warning(f"IPC: Rejected connection: {e}")
+                continue
+            thread = threading.Thread(target=self._serve, args=(conn,), name="PlayerIpcConnThread")
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        mirror_viewers = 0 # Released if the web process goes away mid-stream
+        try:
+            with conn:
+                while True:
+                    try:
+                        name, args = conn.recv()
+                    except (EOFError, OSError):
+                        return
+                    handler = self.calls.get(name)
+                    if handler is None:
+                        conn.send(('error', f"Unknown call '{name}'"))
+                        continue
+                    try:
+                        conn.send(('ok', handler(*args)))
+                    except Exception as e:
+                        conn.send(('error', str(e)))
+                        continue
+                    if name == 'mirror_subscribe':
+                        mirror_viewers += 1
+                    elif name == 'mirror_unsubscribe':
+                        mirror_viewers -= 1
+        finally:
+            for _ in range(mirror_viewers):
+                self.calls['mirror_unsubscribe']()
+
+    def publish(self, name, data):
+        """Queues a Socket.IO event for the web process."""
+        with self.event_condition:
+            self.event_id += 1
+            self.events.append((self.event_id, name, data))
+            self.event_condition.notify_all()
+
+    def wait_events(self, after_id, timeout=10):
+        """Returns events newer than `after_id`, waiting up to `timeout` seconds for one."""
+        with self.event_condition:
+            self.event_condition.wait_for(lambda: self.event_id > after_id, timeout=timeout)
+            if after_id > self.event_id:
+                after_id = 0 # The player restarted; resend what we have
+            return [event for event in self.events if event[0] > after_id]
+
+class PlayerClient:
+    """Calls into the player; each thread keeps its own connection."""
+    def __init__(self, address=config.WEB_IPC_ADDRESS, authkey=None):
+        self.address = address
+        self.authkey = authkey if authkey is not None else bytes.fromhex(os.environ[AUTHKEY_ENV])
+        self.local = threading.local()
+
+    def call(self, name, *args):
+        for attempt in range(2):
+            conn = getattr(self.local, 'conn', None)
+            try:
+                if conn is None:
+                    conn = self.local.conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+                conn.send((name, args))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                # The connection broke (e.g. the player restarted); retry once on a fresh one
+                self.local.conn = None
+                if attempt:
+                    raise
+        if status == 'error':
+            raise RuntimeError(result)
+        return result
+
+class _RemoteMediaManager:
+    def __init__(self, client):
+        self.client = client
+        self.media_root_dir = client.call('get_media_root_dir')
+
+    def list_directory(self, sub_path=''):
+        return self.client.call('list_directory', sub_path)
+
+class _RemoteMirror:
+    def __init__(self, client):
+        self.client = client
+
+    def stream(self):
+        from mirror_manager import mjpeg_parts
+        self.client.call('mirror_subscribe')
+        try:
+            yield from mjpeg_parts(lambda last_seq: self.client.call('mirror_wait_for_frame', last_seq))
+        finally:
+            self.client.call('mirror_unsubscribe')
+
+class _RemoteDisplayManager:
+    def __init__(self, client):
+        self.mirror = _RemoteMirror(client)
+
+class PlayerProxy:
+    """
+    Stands in for MainApp inside the web process. Player calls go over IPC;
+    remuxing and upload writes happen here, away from the player's GIL.
+    """
+    def __init__(self, client):
+        from remux_manager import RemuxManager
+        self.client = client
+        self.media_manager = _RemoteMediaManager(client)
+        self.display_manager = _RemoteDisplayManager(client)
+        self.remux_manager = RemuxManager(self.media_manager.media_root_dir)
+
+    def __getattr__(self, name):
+        if name not in PLAYER_CALLS:
+            raise AttributeError(name)
+        return lambda *args: self.client.call(name, *args)
+
+    def handle_upload(self, file_stream, filename):
+        """Writes the upload in the web process, then lets the player count it and rescan."""
+        from library_batch import save_upload
+        result = save_upload(self.media_manager.media_root_dir, file_stream, filename, self.is_safe_path, self.find_duplicate)
+        if result:
+            self.client.call('record_upload', *result)
+
+    def relay_events(self, emit):
+        """Forwards player events to emit(name, data) from a daemon thread."""
+        def run():
+            last_id = 0
+            while True:
+                try:
+                    for event_id, name, data in self.client.call('wait_events', last_id):
+                        last_id = event_id
+                        emit(name, data)
+                except Exception as e:
+                    logger.warning(f"Web process: Lost player events ({e}), retrying...")
+                    time.sleep(config.WEB_PROCESS_RESTART_DELAY)
+        thread = threading.Thread(target=run, name="PlayerEventRelayThread")
+        thread.daemon = True
+        thread.start()
+
+class WebProcessSupervisor:
+    """Runs web_process.py as a child process and restarts it if it exits."""
+    def __init__(self, ipc_server):
+        self.ipc_server = ipc_server
+        self.process = None
+        self.running = False
+        self.stopped = None # Event of the current run; each start() gets a new one
+        self.thread = None
+        self.restarts = 0
+
+    def start(self):
+        if self.running:
+            logger.warning("Web server process is already running.")
+            return
+        self.running = True
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(self.stopped,), name="WebSupervisorThread")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self, stopped):
+        """Supervises one run; a later start() never revives it, since it only watches its own `stopped`."""
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web_process.py')
+        env = dict(os.environ, **{AUTHKEY_ENV: self.ipc_server.authkey.hex()})
+        while not stopped.is_set():
+            process = subprocess.Popen([sys.executable, script], env=env)
+            self.process = process
+            if stopped.is_set(): # stop() ran while it was being spawned
+                process.terminate()
+                process.wait()
+                break
+            logger.info(f"Web server process started (pid {process.pid}).")
+            code = process.wait()
+            if stopped.is_set():
+                break
+            self.restarts += 1
+            logger.warning(f"Web server process exited with code {code}, restarting in {config.WEB_PROCESS_RESTART_DELAY}s...")
+            stopped.wait(config.WEB_PROCESS_RESTART_DELAY)
+
+    def restart(self):
+        """Restarts the web process without touching the player."""
+        if self.process and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+
+    def stop(self):
+        self.running = False
+        if self.stopped:
+            self.stopped.set()
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        # The old supervisor thread must be gone before a start() spawns another process
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=10)
+        logger.info("Web server process stopped.")
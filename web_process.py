@@ -0,0 +1,24 @@
+# web_process.py
+# Entry point of the web server when config.WEB_SERVER_PROCESS is on. Started
+# (and restarted) by the player's WebProcessSupervisor, which passes the IPC
+# key in the environment.
+import os
+
+import config
+
+def main():
+    # Lower our priority first, so everything below (Flask included) runs niced
+    os.nice(config.WEB_PROCESS_NICE)
+
+    import logs
+    logs.setup('web')
+
+    from web_ipc import PlayerClient, PlayerProxy
+    import web_server
+
+    proxy = PlayerProxy(PlayerClient())
+    proxy.relay_events(web_server.socketio.emit)
+    web_server.run_web_server(proxy)
+
+if __name__ == "__main__":
+    main()
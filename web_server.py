@@ -1,9 +1,14 @@
 from flask import Flask, jsonify, request, render_template, Response, send_from_directory
 from flask_socketio import SocketIO
 from werkzeug.serving import make_server
+import logging
+import os
+import subprocess
 import threading
 import time
 
+logger = logging.getLogger(__name__)
+
 # --- Globals ---
 app = Flask(__name__)
 socketio = SocketIO(app)
@@ -20,6 +25,63 @@ def index():
 def health_check():
     return jsonify({"status": "ok"}), 200
 
+@app.route('/stats/dispatcher', methods=['GET'])
+def dispatcher_stats():
+    """Route to get command queue depth and latency."""
+    return jsonify(main_app.get_dispatcher_stats()), 200
+
+@app.route('/stats/health', methods=['GET'])
+def health_stats():
+    """Route to get decode health and the current decode level."""
+    return jsonify(main_app.get_health_stats()), 200
+
+@app.route('/stats/power', methods=['GET'])
+def power_stats():
+    """Route to see whether audio-only mode is on and how much CPU it saves."""
+    return jsonify(main_app.get_power_stats()), 200
+
+@app.route('/stats/display', methods=['GET'])
+def display_stats():
+    """Route to see how many frames were skipped as unchanged or sent as changed tiles, and the SPI bytes saved."""
+    return jsonify(main_app.get_display_stats()), 200
+
+@app.route('/audio_only', methods=['POST'])
+def audio_only():
+    """Route to turn audio-only mode on or off, e.g. {"enabled": true}."""
+    data = request.get_json(silent=True) or {}
+    main_app.set_audio_only(data.get('enabled', True))
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Route to expose internal counters and histograms in Prometheus text format."""
+    return Response(main_app.get_metrics_text(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/logs', methods=['GET'])
+def recent_logs():
+    """Route to read the in-memory log ring, e.g. /logs?level=WARNING&limit=50&since=<epoch seconds>."""
+    level = request.args.get('level', 'DEBUG')
+    limit = request.args.get('limit', 200, type=int)
+    since = request.args.get('since', type=float)
+    return jsonify(main_app.get_logs(level, limit, since)), 200
+
+@app.route('/memory', methods=['GET'])
+def memory_report():
+    """Route to see RSS against the budget and memory per subsystem; ?top=N sets tracemalloc lines shown when profiling."""
+    return jsonify(main_app.get_memory_report(request.args.get('top', 15, type=int))), 200
+
+@app.route('/startup', methods=['GET'])
+def startup_timeline():
+    """Route to see where the time between process start and first frame went."""
+    return jsonify(main_app.get_startup_timeline()), 200
+
+@app.route('/trace', methods=['GET'])
+def latency_trace():
+    """Route to download recent latency spans; open the file in chrome://tracing or ui.perfetto.dev."""
+    response = jsonify(main_app.get_trace())
+    response.headers['Content-Disposition'] = 'attachment; filename=pitv-trace.json'
+    return response, 200
+
 @app.route('/status', methods=['GET'])
 def get_status():
     """Route to get the current playback status."""
@@ -77,6 +139,12 @@ def browse(sub_path):
     contents, status_code = main_app.media_manager.list_directory(sub_path)
     return jsonify(contents), status_code
 
+@app.route('/search', methods=['GET'])
+def search():
+    """Route to find shows, seasons and episodes by name prefixes, e.g. /search?q=simp s2."""
+    query = request.args.get('q', '')
+    return jsonify(main_app.search_library(query, request.args.get('limit', type=int))), 200
+
 @app.route('/play_media', methods=['POST'])
 def play_media():
     """Route to play a specific media file."""
@@ -92,6 +160,30 @@ def play_media():
     main_app.play_media(file_path)
     return jsonify({"status": "ok"}), 200
 
+@app.route('/library/batch', methods=['POST'])
+def library_batch():
+    """Route to move, rename, delete and create many library entries in one request."""
+    data = request.get_json(silent=True) or {}
+    result, status_code = main_app.apply_library_batch(data.get('operations'))
+    return jsonify(result), status_code
+
+@app.route('/library/duplicates', methods=['GET'])
+def library_duplicates():
+    """Route to list files stored more than once; ?verify=1 confirms each group with full hashes."""
+    verify = request.args.get('verify', '0') in ('1', 'true')
+    return jsonify(main_app.get_duplicates(verify)), 200
+
+@app.route('/library/dedupe', methods=['POST'])
+def library_dedupe():
+    """Route to start replacing verified duplicates with hardlinks, e.g. {"dry_run": false}."""
+    data = request.get_json(silent=True) or {}
+    return jsonify(main_app.dedupe_library(bool(data.get('dry_run', True)))), 202
+
+@app.route('/library/dedupe', methods=['GET'])
+def library_dedupe_status():
+    """Route to poll the last dedupe job; its result is included once it is done."""
+    return jsonify(main_app.get_dedupe_status()), 200
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     files = request.files.getlist('files[]') # Changed to handle multiple files
@@ -126,6 +218,12 @@ def current_video():
         return send_from_directory(video_path, filename)
     return "No video selected", 404
 
+@app.route('/mirror')
+def mirror_stream():
+    """Route to stream the device screen as MJPEG."""
+    return Response(main_app.display_manager.mirror.stream(),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
 @app.route('/media/<path:filename>')
 def serve_media(filename):
     """Route to serve media files for the browser player."""
@@ -133,21 +231,47 @@ def serve_media(filename):
         return send_from_directory(main_app.media_manager.media_root_dir, filename)
     return "Not Found", 404
 
+@app.route('/stream/<path:filename>/index.m3u8')
+def stream_playlist(filename):
+    """Route to serve an HLS playlist that remuxes a media file for the browser."""
+    if not main_app.is_safe_path(filename) or not os.path.isfile(os.path.join(main_app.media_manager.media_root_dir, filename)):
+        return "Not Found", 404
+    try:
+        playlist = main_app.remux_manager.get_playlist(filename)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logger.error(f"Error probing {filename} for streaming: {e}")
+        return "Could not read media", 500
+    return Response(playlist, mimetype='application/vnd.apple.mpegurl')
+
+@app.route('/stream/<path:filename>/<int:index>.ts')
+def stream_segment(filename, index):
+    """Route to serve a single HLS segment, generated on demand."""
+    if not main_app.is_safe_path(filename) or not os.path.isfile(os.path.join(main_app.media_manager.media_root_dir, filename)):
+        return "Not Found", 404
+    try:
+        segment = main_app.remux_manager.get_segment(filename, index)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logger.error(f"Error remuxing segment {index} of {filename}: {e}")
+        return "Could not remux media", 500
+    if segment is None:
+        return "Not Found", 404
+    return Response(segment, mimetype='video/mp2t')
+
 # --- Web Server Control ---
-def run_web_server(main_instance):
+def run_web_server(main_instance, host='0.0.0.0', port=5000):
     """
     Runs the Flask web server in a separate thread.
     """
     global main_app, server_instance
     main_app = main_instance
     
-    print("Starting Web Server (Threaded)...")
+    logger.info("Starting Web Server (Threaded)...")
     try:
         # Create a threaded Werkzeug server that we can control
-        server_instance = make_server('0.0.0.0', 5000, app, threaded=True)
+        server_instance = make_server(host, port, app, threaded=True)
         server_instance.serve_forever()
     except Exception as e:
-        print(f"Web server stopped with error: {e}")
+        logger.error(f"Web server stopped with error: {e}")
 
 def start_web_server_thread(main_instance):
     """
@@ -155,13 +279,13 @@ def start_web_server_thread(main_instance):
     """
     global server_thread
     if server_thread and server_thread.is_alive():
-        print("Web server is already running.")
+        logger.warning("Web server is already running.")
         return server_thread
 
     server_thread = threading.Thread(target=run_web_server, args=(main_instance,), name="WebServerThread")
     server_thread.daemon = True  # Allows main app to exit even if this thread is running
     server_thread.start()
-    print("Web server started on http://0.0.0.0:5000")
+    logger.info("Web server started on http://0.0.0.0:5000")
     return server_thread
 
 def stop_web_server():
@@ -171,12 +295,12 @@ def stop_web_server():
     global server_instance
     try:
         if server_instance:
-            print("Stopping web server...")
+            logger.info("Stopping web server...")
             server_instance.shutdown()
             server_instance = None
         
         if server_thread:
             server_thread.join(timeout=2)
-            print("Web server thread stopped.")
+            logger.info("Web server thread stopped.")
     except Exception as e:
-        print(f"Error stopping web server: {e}")
\ No newline at end of file
+        logger.error(f"Error stopping web server: {e}")
\ No newline at end of file